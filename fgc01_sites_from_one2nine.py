@@ -9,6 +9,11 @@ Purpose: This script reads a set of sample site IDs and their associated coordin
          in the eight cardinal directions.  For the additional points the id is tagged with a suffix with structure
          "--ne" where "ne" indicates the newly created point is to the north east of the original point.
         
+        The size of the neighbourhood can be changed with "intNeighbourhood" (3 for 3x3, 5 for 5x5 and so on).  Points
+        further than one cell away repeat the direction letters, e.g. "--nnee" is two cells north and two cells east.
+        The coordinate transformation is set up once and the sites are read, transformed and written in batches of
+        "intChunkSites", so very large sample frames can be processed with bounded memory.
+
         The script is designed to help users who want to extract data from raster data sets of the same "cell size".
         
         This script will not work through ArcGIS so run in QGIS or other Python install with osgeo Package installed.
@@ -22,8 +27,9 @@ This script is in development and care should be taken when using.
 No guarentees are given and users should do their own validation.
 """
 #Import necessary packages
-from osgeo import gdal
-from osgeo import ogr
+import itertools
+
+import numpy as np
 from osgeo import osr
 
 ##################################################################################################################
@@ -39,50 +45,76 @@ path_out = r"C:\Projects\Remote_Sensing_Resource_Condition\Field_Validation_2020
 ## MODIS = 500
 ## Sentinel 2 = 10
 cw = 25 # width of a cell.
+#Width in cells of the square neighbourhood created around each site.  Must be odd, 3 = the site and its 8 neighbours.
+intNeighbourhood = 3
+#Number of sites read, transformed and written at a time.  Larger batches are faster but use more memory.
+intChunkSites = 100000
 ##################################################################################################################
 
+if intNeighbourhood < 1 or intNeighbourhood % 2 == 0:
+    raise Exception("The neighbourhood size {} must be an odd number of cells (1, 3, 5 ...)".format(intNeighbourhood))
+
+#Set input and output spatial references and build the transformation once for all of the sites.
+source = osr.SpatialReference()
+source.ImportFromEPSG(4326)
+target = osr.SpatialReference()
+target.ImportFromEPSG(3577)
+#GDAL 3 and later default to latitude/longitude order for EPSG:4326 so keep longitude/latitude order
+if hasattr(osr, "OAMS_TRADITIONAL_GIS_ORDER"):
+    source.SetAxisMappingStrategy(osr.OAMS_TRADITIONAL_GIS_ORDER)
+    target.SetAxisMappingStrategy(osr.OAMS_TRADITIONAL_GIS_ORDER)
+transform = osr.CoordinateTransformation(source, target)
+
+#Offsets of the neighbourhood in cells, e.g. -1, 0, 1 for 3x3.  The site itself is first, then each ring of
+#neighbours outwards.  For 3x3 the order is the site, w, e, s, n, ne, nw, sw, se.
+lsSignOrder = [(-1, 0), (1, 0), (0, -1), (0, 1), (1, 1), (-1, 1), (-1, -1), (1, -1)]
+intHalf = intNeighbourhood // 2
+arrDX, arrDY = np.meshgrid(np.arange(-intHalf, intHalf + 1), np.arange(-intHalf, intHalf + 1))
+lsOffsets = sorted(zip(arrDX.ravel().tolist(), arrDY.ravel().tolist()),
+                   key=lambda o: (max(abs(o[0]), abs(o[1])), abs(o[0]) + abs(o[1]),
+                                  lsSignOrder.index(((o[0] > 0) - (o[0] < 0), (o[1] > 0) - (o[1] < 0))) if o != (0, 0) else -1, abs(o[0])))
+arrOffX = np.array([o[0] for o in lsOffsets], dtype=np.float64) * cw
+arrOffY = np.array([o[1] for o in lsOffsets], dtype=np.float64) * cw
+#Suffix for each offset with structure "--ne".  The site itself has no suffix.
+lsSuffix = ["" if o == (0, 0) else "--" + ("n" * o[1] if o[1] > 0 else "s" * -o[1]) + ("e" * o[0] if o[0] > 0 else "w" * -o[0])
+            for o in lsOffsets]
+
 #Open the input fiel for reading and ouput file for writting.
 fin = open(path_in, "r")
 fout = open(path_out, "w")
 
-#Read all the lines of the input file into a single object "lines"
-lines = fin.readlines()
-#Set a counter to help identify if the line is the first of the input file
-counter = 0
-for line in lines:
-    #If first line of the intput file write out the following header
-    if counter == 0:
-        fout.write("id, x, y,\n")
-        counter = counter + 1
-    #For all other lines calculate new coordinates and write out id, x, y
-    else:
+#The first line of the input file is a header
+fin.readline()
+fout.write("id, x, y,\n")
+intSites = 0
+#Read and process the sites in batches of intChunkSites lines so memory use stays bounded.
+while True:
+    lines = list(itertools.islice(fin, intChunkSites))
+    if len(lines) == 0:
+        break
+    lsIdent = []
+    lsLonLat = []
+    for line in lines:
+        if line.strip() == "":
+            continue
         #Split input line into componenet variables
         in_vars = line.split(",")
-        ident = in_vars[0]
-        longitude = float(in_vars[1])
-        latitude = float(in_vars[2])
-        
-        #Set input and output spatial references to allow osr and ogr to perfrom transformation.
-        source = osr.SpatialReference()
-        source.ImportFromEPSG(4326)
-        target = osr.SpatialReference()
-        target.ImportFromEPSG(3577)
-        #Transfrom the coordinates from longitude and latitude to x and y in Australain Albers metres
-        transform = osr.CoordinateTransformation(source, target)
-        point = ogr.CreateGeometryFromWkt("POINT ({} {})".format(longitude, latitude))
-        point.Transform(transform)
-        x = point.GetX()
-        y = point.GetY()
-        #Write the ids and coordinates out to the text file.
-        fout.write("{}, {}, {}\n".format(str(ident), x, y))
-        fout.write("{}, {}, {}\n".format(ident + '--w', x-cw, y))
-        fout.write("{}, {}, {}\n".format(ident + '--e', x+cw, y))
-        fout.write("{}, {}, {}\n".format(ident + '--s', x, y-cw))
-        fout.write("{}, {}, {}\n".format(ident + '--n', x, y+cw))
-        fout.write("{}, {}, {}\n".format(ident + '--ne', x+cw, y+cw))
-        fout.write("{}, {}, {}\n".format(ident + '--nw', x-cw, y+cw))
-        fout.write("{}, {}, {}\n".format(ident + '--sw', x-cw, y-cw))
-        fout.write("{}, {}, {}\n".format(ident + '--se', x+cw, y-cw))
+        lsIdent.append(in_vars[0])
+        lsLonLat.append((float(in_vars[1]), float(in_vars[2])))
+    if len(lsLonLat) == 0:
+        continue
+
+    #Transfrom the batch of coordinates from longitude and latitude to x and y in Australain Albers metres
+    arrXY = np.array(transform.TransformPoints(lsLonLat))[:, :2]
+    #Coordinates of every point in the neighbourhood of every site (one row per site)
+    arrXOut = arrXY[:, 0:1] + arrOffX[np.newaxis, :]
+    arrYOut = arrXY[:, 1:2] + arrOffY[np.newaxis, :]
+    #Write the ids and coordinates of the whole batch out to the text file in one write.
+    fout.write("".join(["{}, {}, {}\n".format(ident + strSuffix, x, y)
+                        for ident, lsX, lsY in zip(lsIdent, arrXOut.tolist(), arrYOut.tolist())
+                        for strSuffix, x, y in zip(lsSuffix, lsX, lsY)]))
+    intSites += len(lsIdent)
+    print("Processed", intSites, "sites")
 #CLose the input and output files.
 fout.close()
 fin.close()
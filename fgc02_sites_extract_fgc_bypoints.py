@@ -11,6 +11,12 @@ Purpose:
 
        The out put of the script is CSV text file with the structure:
        time,id,sensor,BS,PV,NPV,UE,pixelquality
+
+       In "cluster" mode (strMode) nearby points are grouped into square cells of intClusterSize metres and a single
+       bounding box is loaded for each cluster and product.  The pixel for every point in the cluster is then taken
+       from the loaded array with vectorised (nearest pixel) indexing, rather than calling dc.load for each point.
+       Fractional Cover and Pixel Quality are loaded on the same grid and aligned as one xarray dataset, and only
+       the sampled pixels are converted to a table.  All points, sensors and times are written as one long table.
 NOTE:
 This script is in development and care should be taken when using.
 
@@ -29,7 +35,9 @@ The"$" simply indicates the command is to entered in the terminal.
 #
 #Import necessary packages and modules
 import datacube
+import numpy
 import pandas
+import xarray
 
 #Connect to the Data Cube
 dc = datacube.Datacube(app='test_fgc')
@@ -45,6 +53,12 @@ date_end = '2019-05-31'
 path_in = "/home/570/nm3598/dea_njm/fgc_sites_one2nine.csv"
 #Ouput csv file
 path_out = "/home/570/nm3598/dea_njm/fgc_sites_one2nine_deaextract.csv"
+#Extraction mode.  "cluster" = one load per cluster of nearby points and product, "point" = one load per point and product
+strMode = "cluster"
+#Width in metres of the square cells used to group nearby points into clusters ("cluster" mode only)
+intClusterSize = 5000
+#Pixel size in metres of the Data Cube products
+intRes = 25
 ##################################################################################################################
 
 #Open files and set counters
@@ -54,136 +68,216 @@ fout = open(path_out, "w")
 linecount = 0
 outcount = 0
 
-#Iterate through input csv file
-for line in lines:
-    #Don't read header row
-    if linecount == 0:
-        linecount = linecount + 1
-    #Avoid rows of the iput csv with no data.
-    elif line == '\n':
-        print ("Reached end of file")
-    #Process a real record from input csv
-    else:
-        #Split line of the input csv by ',' to access values
-        lstVars = line.split(',')
-        #Get value for id
-        ident = lstVars[0]
-        #Get value for x coordinate in crs=3577
-        x3577 = float(lstVars[1])
-        #Get value for y coordinate in crs=3577
-        y3577 = float(lstVars[2])
+if strMode == "point":
+    #Iterate through input csv file
+    for line in lines:
+        #Don't read header row
+        if linecount == 0:
+            linecount = linecount + 1
+        #Avoid rows of the iput csv with no data.
+        elif line == '\n':
+            print ("Reached end of file")
+        #Process a real record from input csv
+        else:
+            #Split line of the input csv by ',' to access values
+            lstVars = line.split(',')
+            #Get value for id
+            ident = lstVars[0]
+            #Get value for x coordinate in crs=3577
+            x3577 = float(lstVars[1])
+            #Get value for y coordinate in crs=3577
+            y3577 = float(lstVars[2])
         
-        #Access Fractional Cover for Landsat 8
-        ds_fgc8 = dc.load(product='ls8_fc_albers',
-        					x=(x3577), 
-        					y=(y3577),
-        					crs='epsg:3577',
-        					time=(date_start, date_end), 
-        					measurements = ['BS', 'PV', 'NPV', 'UE'],
-        					resolution = (-25,25))
-        #Test if there are any scenes for Landsat 8
-        if len(ds_fgc8) > 0:
-            #If there are scenes the access Pixel Quality for those Landsat 8 scenes
-            dffgc8 = ds_fgc8.to_dataframe()
-            del ds_fgc8
-            ds_pq8 = dc.load(product='ls8_pq_albers',
+            #Access Fractional Cover for Landsat 8
+            ds_fgc8 = dc.load(product='ls8_fc_albers',
             					x=(x3577), 
             					y=(y3577),
             					crs='epsg:3577',
             					time=(date_start, date_end), 
+            					measurements = ['BS', 'PV', 'NPV', 'UE'],
             					resolution = (-25,25))
-            dfpq8 = ds_pq8.to_dataframe()
-            #Merge data frames for Fractional Cover and Pixel Quality for Landsat 8
-            dfinner8 = pandas.merge(dffgc8, dfpq8, on='time', how='inner')
-            del dffgc8, dfpq8
-            dfinner8.insert(0, 'sensor', 'ls8')
-            dfinner8.insert(0, 'id', ident)
-            #Append dataframe to output csv
-            if outcount == 0:
-                dfinner8.to_csv(fout, header=True)
-                outcount = outcount + 1
-                del dfinner8
+            #Test if there are any scenes for Landsat 8
+            if len(ds_fgc8) > 0:
+                #If there are scenes the access Pixel Quality for those Landsat 8 scenes
+                dffgc8 = ds_fgc8.to_dataframe()
+                del ds_fgc8
+                ds_pq8 = dc.load(product='ls8_pq_albers',
+                					x=(x3577), 
+                					y=(y3577),
+                					crs='epsg:3577',
+                					time=(date_start, date_end), 
+                					resolution = (-25,25))
+                dfpq8 = ds_pq8.to_dataframe()
+                #Merge data frames for Fractional Cover and Pixel Quality for Landsat 8
+                dfinner8 = pandas.merge(dffgc8, dfpq8, on='time', how='inner')
+                del dffgc8, dfpq8
+                dfinner8.insert(0, 'sensor', 'ls8')
+                dfinner8.insert(0, 'id', ident)
+                #Append dataframe to output csv
+                if outcount == 0:
+                    dfinner8.to_csv(fout, header=True)
+                    outcount = outcount + 1
+                    del dfinner8
+                else:
+                    dfinner8.to_csv(fout, header=False)
+                    del dfinner8
             else:
-                dfinner8.to_csv(fout, header=False)
-                del dfinner8
-        else:
-            del ds_fgc8
+                del ds_fgc8
                 
         
-        #Access Fractional Cover for Landsat 7
-        ds_fgc7 = dc.load(product='ls7_fc_albers',
-        					x=(x3577), 
-        					y=(y3577),
-        					crs='epsg:3577',
-        					time=(date_start, date_end), 
-        					measurements = ['BS', 'PV', 'NPV', 'UE'],
-        					resolution = (-25,25))
-        #Test if there are any scenes for Landsat 7
-        if len(ds_fgc7) > 0:
-            #If there are scenes the access Pixel Quality for those Landsat 7 scenes
-            dffgc7 = ds_fgc7.to_dataframe()
-            del ds_fgc7
-            ds_pq7 = dc.load(product='ls7_pq_albers',
+            #Access Fractional Cover for Landsat 7
+            ds_fgc7 = dc.load(product='ls7_fc_albers',
             					x=(x3577), 
             					y=(y3577),
             					crs='epsg:3577',
             					time=(date_start, date_end), 
+            					measurements = ['BS', 'PV', 'NPV', 'UE'],
             					resolution = (-25,25))
-            dfpq7 = ds_pq7.to_dataframe()
-            del ds_pq7
-            #Merge data frames for Fractional Cover and Pixel Quality for Landsat 7
-            dfinner7 = pandas.merge(dffgc7, dfpq7, on='time', how='inner')
-            del dffgc7, dfpq7
-            dfinner7.insert(0, 'sensor', 'ls7')
-            dfinner7.insert(0, 'id', ident)
-            #Append dataframe to output csv
-            if outcount == 0:
-                dfinner7.to_csv(fout, header=True)
-                outcount = outcount + 1
-                del dfinner7
+            #Test if there are any scenes for Landsat 7
+            if len(ds_fgc7) > 0:
+                #If there are scenes the access Pixel Quality for those Landsat 7 scenes
+                dffgc7 = ds_fgc7.to_dataframe()
+                del ds_fgc7
+                ds_pq7 = dc.load(product='ls7_pq_albers',
+                					x=(x3577), 
+                					y=(y3577),
+                					crs='epsg:3577',
+                					time=(date_start, date_end), 
+                					resolution = (-25,25))
+                dfpq7 = ds_pq7.to_dataframe()
+                del ds_pq7
+                #Merge data frames for Fractional Cover and Pixel Quality for Landsat 7
+                dfinner7 = pandas.merge(dffgc7, dfpq7, on='time', how='inner')
+                del dffgc7, dfpq7
+                dfinner7.insert(0, 'sensor', 'ls7')
+                dfinner7.insert(0, 'id', ident)
+                #Append dataframe to output csv
+                if outcount == 0:
+                    dfinner7.to_csv(fout, header=True)
+                    outcount = outcount + 1
+                    del dfinner7
+                else:
+                    dfinner7.to_csv(fout, header=False)
+                    del dfinner7
             else:
-                dfinner7.to_csv(fout, header=False)
-                del dfinner7
-        else:
-            del ds_fgc7
+                del ds_fgc7
         
 
-        #Access Fractional Cover for Landsat 5
-        ds_fgc5 = dc.load(product='ls5_fc_albers',
-        					x=(x3577), 
-        					y=(y3577),
-        					crs='epsg:3577',
-        					time=(date_start, date_end), 
-        					measurements = ['BS', 'PV', 'NPV', 'UE'],
-        					resolution = (-25,25))
-        #Test if there are any scenes for Landsat 5
-        if len(ds_fgc5) > 0:
-            #If there are scenes the access Pixel Quality for those Landsat 5 scenes
-            dffgc5 = ds_fgc5.to_dataframe()
-            ds_pq5 = dc.load(product='ls5_pq_albers',
+            #Access Fractional Cover for Landsat 5
+            ds_fgc5 = dc.load(product='ls5_fc_albers',
             					x=(x3577), 
             					y=(y3577),
             					crs='epsg:3577',
             					time=(date_start, date_end), 
+            					measurements = ['BS', 'PV', 'NPV', 'UE'],
             					resolution = (-25,25))
-            dfpq5 = ds_pq5.to_dataframe()
-            del ds_pq5
-            #Merge data frames for Fractional Cover and Pixel Quality for Landsat 5
-            dfinner5 = pandas.merge(dffgc5, dfpq5, on='time', how='inner')
-            del dffgc5, dfpq5
-            dfinner5.insert(0, 'sensor', 'ls5')
-            dfinner5.insert(0, 'id', ident)
-            #Append dataframe to output csv
-            if outcount == 0:
-                dfinner5.to_csv(fout, header=True)
-                outcount = outcount + 1
-                del dfinner5
+            #Test if there are any scenes for Landsat 5
+            if len(ds_fgc5) > 0:
+                #If there are scenes the access Pixel Quality for those Landsat 5 scenes
+                dffgc5 = ds_fgc5.to_dataframe()
+                ds_pq5 = dc.load(product='ls5_pq_albers',
+                					x=(x3577), 
+                					y=(y3577),
+                					crs='epsg:3577',
+                					time=(date_start, date_end), 
+                					resolution = (-25,25))
+                dfpq5 = ds_pq5.to_dataframe()
+                del ds_pq5
+                #Merge data frames for Fractional Cover and Pixel Quality for Landsat 5
+                dfinner5 = pandas.merge(dffgc5, dfpq5, on='time', how='inner')
+                del dffgc5, dfpq5
+                dfinner5.insert(0, 'sensor', 'ls5')
+                dfinner5.insert(0, 'id', ident)
+                #Append dataframe to output csv
+                if outcount == 0:
+                    dfinner5.to_csv(fout, header=True)
+                    outcount = outcount + 1
+                    del dfinner5
+                else:
+                    dfinner5.to_csv(fout, header=False)
+                    del dfinner5
             else:
-                dfinner5.to_csv(fout, header=False)
-                del dfinner5
-        else:
-            del ds_fgc5
-del line, lines, x3577, y3577, path_out, path_in, outcount, lstVars, linecount, ident, date_end, date_start
+                del ds_fgc5
+    del line, x3577, y3577, lstVars, ident
+else:
+    #Read all the points from the input csv (skipping the header row and empty rows)
+    lsIds = []
+    lsX = []
+    lsY = []
+    for line in lines[1:]:
+        if line.strip() == '':
+            continue
+        lstVars = line.split(',')
+        lsIds.append(lstVars[0])
+        lsX.append(float(lstVars[1]))
+        lsY.append(float(lstVars[2]))
+    arrIds = numpy.array(lsIds)
+    arrX = numpy.array(lsX)
+    arrY = numpy.array(lsY)
+
+    #Group the points by the cluster cell they fall in.  arrCluster holds the cluster number of each point.
+    arrCells = numpy.stack([numpy.floor(arrX / intClusterSize), numpy.floor(arrY / intClusterSize)], axis=1)
+    arrCellKeys, arrCluster = numpy.unique(arrCells, axis=0, return_inverse=True)
+    arrCluster = arrCluster.ravel()
+    print("Extracting", len(arrIds), "points in", len(arrCellKeys), "clusters")
+    #Sampled tables for every cluster and sensor, combined at the end
+    lsColumns = ['time', 'id', 'sensor', 'BS', 'PV', 'NPV', 'UE', 'pixelquality']
+    lsTables = []
+
+    for intCluster in range(len(arrCellKeys)):
+        arrIdx = numpy.flatnonzero(arrCluster == intCluster)
+        #Bounding box of the points in the cluster, buffered by a pixel so edge points are inside the load
+        tupX = (arrX[arrIdx].min() - intRes, arrX[arrIdx].max() + intRes)
+        tupY = (arrY[arrIdx].min() - intRes, arrY[arrIdx].max() + intRes)
+        #Coordinates of the points as indexers along a new "point" dimension for vectorised selection
+        selX = xarray.DataArray(arrX[arrIdx], dims='point')
+        selY = xarray.DataArray(arrY[arrIdx], dims='point')
+        selId = ('point', arrIds[arrIdx])
+
+        for strSensor in ('ls8', 'ls7', 'ls5'):
+            #Access Fractional Cover for the cluster
+            ds_fgc = dc.load(product=strSensor + '_fc_albers',
+                             x=tupX,
+                             y=tupY,
+                             crs='epsg:3577',
+                             time=(date_start, date_end),
+                             measurements = ['BS', 'PV', 'NPV', 'UE'],
+                             resolution = (-intRes,intRes))
+            #Test if there are any scenes for the sensor
+            if len(ds_fgc) == 0:
+                del ds_fgc
+                continue
+            #If there are scenes the access Pixel Quality on the same grid and dates and align it with Fractional Cover
+            ds_pq = dc.load(product=strSensor + '_pq_albers',
+                            like=ds_fgc)
+            ds_both = xarray.merge([ds_fgc[['BS', 'PV', 'NPV', 'UE']], ds_pq[['pixelquality']]], join='inner')
+            del ds_fgc, ds_pq
+            #Take the pixel under each point from the aligned arrays.  Only these pixels are turned into a table.
+            ds_points = ds_both.sel(x=selX, y=selY, method='nearest').assign_coords(id=selId)
+            del ds_both
+            dfpoints = ds_points[['BS', 'PV', 'NPV', 'UE', 'pixelquality']].to_dataframe().reset_index()
+            dfpoints.insert(0, 'sensor', strSensor)
+            lsTables.append(dfpoints[lsColumns])
+            del ds_points, dfpoints
+
+    #Build one long table of every point, sensor and time and write it out in a single pass
+    if len(lsTables) > 0:
+        dfall = pandas.concat(lsTables, ignore_index=True)
+        dfall['sensor'] = pandas.Categorical(dfall['sensor'], categories=['ls8', 'ls7', 'ls5'], ordered=True)
+        #Keep the order of the points in the input csv
+        dicOrder = {}
+        for intIndex, ident in enumerate(lsIds):
+            dicOrder.setdefault(ident, intIndex)
+        dfall['order'] = dfall['id'].map(dicOrder)
+        dfall = dfall.sort_values(['order', 'sensor', 'time'], kind='mergesort').drop(columns='order')
+        dfall.to_csv(fout, header=True, index=False)
+        outcount = len(dfall)
+        del dfall
+    else:
+        print("No scenes found for any point between", date_start, "and", date_end)
+    del lsTables
+    del lsIds, lsX, lsY, arrIds, arrX, arrY, arrCells, arrCellKeys, arrCluster
+del lines, path_out, path_in, outcount, linecount, date_end, date_start
 
 fout.close()
 print("Output complete")
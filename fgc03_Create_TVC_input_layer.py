@@ -27,7 +27,26 @@ NOTE:
 For more infromation regarding the AusCover data see:
 http://data.auscover.org.au/xwiki/bin/view/Product+pages/Landsat+Seasonal+Fractional+Cover
 
-This script uses the arcpy package from ESRI and requires the Spatial Analyst extension.
+When blnIncremental = True a manifest (fgc03_manifest.json in pathOut) records the size, modification time and
+content hash of every input along with the processing parameters.  Only seasons whose input or parameters have
+changed, or whose outputs are missing, are converted again.
+
+This script uses the arcpy package from ESRI and requires the Spatial Analyst extension when strEngine = "arcpy".
+When strEngine = "gdal" the conversion is done with GDAL and numpy (see fgc_common.py) and arcpy is not needed.
+The "gdal" engine reads Band_2 and Band_3 once per block window and writes PVpc, NPVpc and TVCpc in the same pass.
+If pathCube is given the TVCpc GeoTIFF of every season between yearStart and yearEnd is then added to an aligned
+season cube in that folder (see fgc_cube.py), which fgc04, fgc05 and fgc06 can read instead of the GeoTIFFs.  Only new
+or changed seasons are added and seasons of other years already in the cube are kept.  The cube needs the osgeo (GDAL)
+and numpy packages with either engine.
+With blnTimings = True the wall time, bytes read and written, block windows and peak memory of converting each
+season (and of building the cube) are written as JSON lines to fgc03_timings.jsonl in pathOut (see
+fgc_instrument.py).  If pathProfile is given each stage is also profiled with cProfile.
+fgc04 and fgc05 can also read the dima2 GeoTIFFs directly (their blnFused), finding the TVC of each block window as it
+is read.  With blnWriteTVC = False ("gdal" engine only) no PVpc, NPVpc or TVCpc GeoTIFFs are written, and if pathCube
+is given the cube is built from the dima2 GeoTIFFs in pathIn instead.
+With strEngine = "gdal" the output GeoTIFFs are internally tiled and compressed with strCompress (DEFLATE or ZSTD)
+and a predictor.  With blnCOG = True each is finished as a Cloud Optimised GeoTIFF with nearest neighbour overviews
+and its colour map as the palette (see fgc_common.finish_output), so windowed reads and map previews are quick.
               
 This script is in development and care should be taken when using.
               
@@ -35,9 +54,12 @@ No guarentees are given and users should do their own validation.
 """
 
 #Import necessary packages
-import arcpy
+import fnmatch
 import os
 
+import fgc_instrument
+import fgc_manifest
+
 
 
 ##################################################################################################################
@@ -56,39 +78,82 @@ pathMask = r"" #"C:\Projects\Remote_Sensing_Resource_Condition\FGC\data\masks\SW
 #User nominated start and end year for images to process
 yearStart = 2000
 yearEnd = 2022
+
+#Engine used for the conversion.  "gdal" = block windowed GDAL/numpy (no arcpy needed), "arcpy" = original Spatial Analyst process
+strEngine = "gdal"
+#Number of worker processes used to convert seasons in parallel ("gdal" engine only).  1 = one season at a time.
+intWorkers = 1
+#GDAL block cache for each worker process in megabytes ("gdal" engine only)
+intGdalCacheMB = 256
+#Only rebuild outputs whose input data set or processing parameters have changed since the last run (True/False)
+blnIncremental = True
+#Folder of an aligned season cube of the TVCpc GeoTIFFs to build or update after the conversion (uses pathMask).  "" = no cube
+pathCube = r""
+#Write the time, I/O and memory of each stage to fgc03_timings.jsonl in pathOut (True/False)
+blnTimings = True
+#Folder for cProfile statistics of each stage.  "" = no profiling
+pathProfile = r""
+#Compression of the output GeoTIFFs, "DEFLATE" or "ZSTD" ("gdal" engine only, ZSTD needs GDAL built with it)
+strCompress = "DEFLATE"
+#Write the outputs as Cloud Optimised GeoTIFFs with overviews (True/False).  With "arcpy" the outputs are tiled with pyramids
+blnCOG = True
+#Write the PVpc, NPVpc and TVCpc GeoTIFFs (True/False).  False = only build the cube, if pathCube is given ("gdal" engine only)
+blnWriteTVC = True
 ####################################################################################################################
+if strEngine not in ("arcpy", "gdal"):
+    raise Exception("The engine {} is not recognised.  Please use either \"arcpy\" or \"gdal\"".format(strEngine))
+if strEngine == "arcpy" and intWorkers > 1:
+    raise Exception("Parallel conversion (intWorkers > 1) is only available with the \"gdal\" engine")
+if strEngine == "arcpy" and not blnWriteTVC:
+    raise Exception("The conversion can only be skipped (blnWriteTVC = False) with the \"gdal\" engine")
 if not os.path.exists(pathIn):
     raise Exception("Path to directory {} containing raw AusCover Seasonal Fractional Ground cover datasets does not exist.  Please correct the path".format(pathIn))
 if not os.path.exists(pathOut):
     raise Exception("Path to output directory {} does not exist.  Please correct the path".format(pathOut))
-arcpy.CheckOutExtension("Spatial")
-
-
-#ANALYSIS ENVIRONMENT
-#Will overwrite existing outputs
-arcpy.env.overwriteOutput = True
-#Set compression for GeoTIFF output
-arcpy.env.compression = "LZ77"
-#Ensure that NoData values set to 255 in outputs
-arcpy.env.nodata = "MAXIMUM"
-#Set the workspace to the folder containing the input FGC seasonal GeoTIFFs from AusCover
-arcpy.env.workspace = pathIn
-
-#If there is a mask set by the user then set environemnt for that mask and its extent. 
-if len(pathMask) > 0:
-    if arcpy.Exists(pathMask):
-        arcpy.env.mask = pathMask
-        arcpy.env.extent = pathMask
-    else:
-        arcpy.CheckInExtension("Spatial")
+runLog = fgc_instrument.RunLog(os.path.join(pathOut, "fgc03_timings.jsonl") if blnTimings else "", "fgc03", pathProfile)
+
+if strEngine == "arcpy":
+    import arcpy
+    arcpy.CheckOutExtension("Spatial")
+
+    #ANALYSIS ENVIRONMENT
+    #Will overwrite existing outputs
+    arcpy.env.overwriteOutput = True
+    #Set compression for GeoTIFF output
+    arcpy.env.compression = "LZ77"
+    #Tiled outputs with nearest neighbour pyramids so they are quick to read by window and to view
+    if blnCOG:
+        arcpy.env.tileSize = "512 512"
+        arcpy.env.pyramid = "PYRAMIDS -1 NEAREST DEFAULT 75 NO_SKIP"
+    #Ensure that NoData values set to 255 in outputs
+    arcpy.env.nodata = "MAXIMUM"
+    #Set the workspace to the folder containing the input FGC seasonal GeoTIFFs from AusCover
+    arcpy.env.workspace = pathIn
+
+    #If there is a mask set by the user then set environemnt for that mask and its extent. 
+    if len(pathMask) > 0:
+        if arcpy.Exists(pathMask):
+            arcpy.env.mask = pathMask
+            arcpy.env.extent = pathMask
+        else:
+            arcpy.CheckInExtension("Spatial")
+            raise Exception("The nominated mask data set: ", pathMask, "doesn't eixist.  please correct the path to the mask and try again.")
+
+    #Create a list of all AusCOver Seasonal Fractional Ground Cover data set in the input directory. 
+    lsCurRaster = arcpy.ListDatasets("lztmre_wa_" + "*" + "dima2.tif")
+else:
+    import fgc_common
+    fgc_common.set_output_format(strCompress, blnCOG)
+    if len(pathMask) > 0 and not os.path.exists(pathMask):
         raise Exception("The nominated mask data set: ", pathMask, "doesn't eixist.  please correct the path to the mask and try again.")
+    #Create a list of all AusCOver Seasonal Fractional Ground Cover data set in the input directory. 
+    lsCurRaster = sorted(fnmatch.filter(os.listdir(pathIn), "lztmre_wa_" + "*" + "dima2.tif"))
 
 #Create and empty list for input raster data sets to tbe processed.
 lsRas = []
-#Create a list of all AusCOver Seasonal Fractional Ground Cover data set in the input directory. 
-lsCurRaster = arcpy.ListDatasets("lztmre_wa_" + "*" + "dima2.tif")
 if len(lsCurRaster) == 0:
-    arcpy.CheckInExtension("Spatial")
+    if strEngine == "arcpy":
+        arcpy.CheckInExtension("Spatial")
     raise Exception("No raw AusCover Seasonal Fractional Ground Cover datasets exist int the directory {}".format(pathIn))
 
 #Filter the input list by the years of interest.
@@ -98,11 +163,50 @@ for i in range(yearStart,yearEnd + 1):
             print("Adding the data set", a, "to the analysis")
             lsRas.append(a)
 del lsCurRaster
+#The seasons selected by year, kept for the cube as lsRas becomes the seasons to convert
+lsSelected = list(lsRas)
 if len(lsRas) == 0:
-    arcpy.CheckInExtension("Spatial")
+    if strEngine == "arcpy":
+        arcpy.CheckInExtension("Spatial")
     raise Exception("No raw AusCover Seasonal Fractional Ground Cover datasets exist between {} and {} in the directory {}".format(yearStart, yearEnd, pathIn))
-#Set the workspace to the user nominated folder.
-arcpy.env.workspace = pathOut
+
+#Skip seasons whose outputs are up to date according to the manifest.  Only done in the main process so that
+#worker processes on Windows do not hash the inputs again.
+if blnIncremental and blnWriteTVC and __name__ == "__main__":
+    pathManifest = os.path.join(pathOut, "fgc03_manifest.json")
+    dicManifest = fgc_manifest.load_manifest(pathManifest)
+    #Only the content hash of the mask is a parameter, so touching or copying an unchanged mask does not rebuild every
+    #season.  Its pathway and full signature are kept separately so an unchanged mask is not hashed again.
+    dicMaskSignature = None
+    if len(pathMask) > 0:
+        dicMaskOld = dicManifest.get("mask") or {}
+        dicMaskSignature = fgc_manifest.file_signature(pathMask, dicMaskOld.get("signature") if dicMaskOld.get("path") == pathMask else None)
+    dicManifest["mask"] = {"path": pathMask, "signature": dicMaskSignature} if dicMaskSignature is not None else None
+    #The engine and output format are parameters so changing the compression or COG setting rebuilds the outputs
+    dicParams = {"products": ["PVpc", "NPVpc", "TVCpc"],
+                 "mask": dicMaskSignature["sha256"] if dicMaskSignature is not None else None, "engine": strEngine,
+                 "format": list(fgc_common.output_format()) if strEngine == "gdal" else ["LZ77", blnCOG]}
+    dicSignatures = {}
+    lsRebuild = []
+    for img in lsRas:
+        dicEntry = dicManifest.get(img)
+        dicSignatures[img] = fgc_manifest.file_signature(os.path.join(pathIn, img), dicEntry["input"] if dicEntry else None)
+        lsPathOutputs = [os.path.join(pathOut, "acfgcs_" + img[11:23] + "_" + strProduct + ".tif") for strProduct in dicParams["products"]]
+        if fgc_manifest.needs_rebuild(dicEntry, dicSignatures[img], dicParams, lsPathOutputs):
+            lsRebuild.append(img)
+        else:
+            #Keep the latest modification time so the file is not hashed again next run
+            dicEntry["input"] = dicSignatures[img]
+            print("The data set", img, "is up to date and will be skipped")
+    fgc_manifest.save_manifest(pathManifest, dicManifest)
+    lsRas = lsRebuild
+    if len(lsRas) == 0:
+        print("All outputs between {} and {} are up to date".format(yearStart, yearEnd))
+
+    def record_season(img, lsPathOutputs):
+        """Add a converted season to the manifest and save it straight away."""
+        fgc_manifest.record(dicManifest, img, dicSignatures[img], dicParams, lsPathOutputs)
+        fgc_manifest.save_manifest(pathManifest, dicManifest)
 
 #Iterate through the list of input GeoTIFFs, taking each band and processing it to -100 from the values and
 #truncate the minimum values to 0 and the maximum values to 100 for the BS, NPV and PV
@@ -115,56 +219,86 @@ arcpy.env.workspace = pathOut
 #The process also sums the truncated PV and NPV values to create a Total Vegetative Cover (TVC)data set.
 #Note that there is potential for the TVC dataset to exceed 100 but it has been trimmed to 100.
 
-for img in lsRas:
-    print(str(img))
-    strDate = str(img)[11:23]
-#    rasBS = arcpy.sa.Raster(os.path.join(pathIn,img,"Band_1"))
-#    arcpy.env.cellSize = rasBS
-#    arcpy.env.snapRaster = rasBS
-#    pathOutBS = os.path.join(pathOut, "acfgcs_"+ strDate + "_BSpc.tif")
-#    rasTempBS = rasBS - 100
-#    #Trim BS to minimum of 0 and maximum of 100
-#    rasOutBS = arcpy.sa.Con(rasTempBS < 0, 0, arcpy.sa.Con(rasTempBS > 100, 100, rasTempBS))
-#    arcpy.CopyRaster_management(rasOutBS, pathOutBS, pixel_type="8_BIT_UNSIGNED", scale_pixel_value="NONE")
-#    del rasOutBS, rasBS, rasTempBS
-#    print("BS done")
+if strEngine == "gdal":
+    #Each season is independent so they are spread across intWorkers processes.
+    #The __main__ test stops worker processes on Windows from starting the conversion again.
+    if blnWriteTVC and __name__ == "__main__":
+        lsJobs = [(os.path.join(pathIn, img), pathOut, pathMask) for img in lsRas]
+        funcDone = (lambda intIndex, lsPathOutputs: record_season(lsRas[intIndex], lsPathOutputs)) if blnIncremental else None
+        fgc_common.run_parallel(fgc_common.convert_fgc_season, lsJobs, intWorkers, intGdalCacheMB, lsLabels=lsRas, funcDone=funcDone,
+                                runLog=runLog, strStage="convert")
+        print("Completed Conversion")
+else:
+    #Set the workspace to the user nominated folder.
+    arcpy.env.workspace = pathOut
+
+    for img in lsRas:
+        print(str(img))
+        with runLog.stage("convert", img):
+            strDate = str(img)[11:23]
+        #    rasBS = arcpy.sa.Raster(os.path.join(pathIn,img,"Band_1"))
+        #    arcpy.env.cellSize = rasBS
+        #    arcpy.env.snapRaster = rasBS
+        #    pathOutBS = os.path.join(pathOut, "acfgcs_"+ strDate + "_BSpc.tif")
+        #    rasTempBS = rasBS - 100
+        #    #Trim BS to minimum of 0 and maximum of 100
+        #    rasOutBS = arcpy.sa.Con(rasTempBS < 0, 0, arcpy.sa.Con(rasTempBS > 100, 100, rasTempBS))
+        #    arcpy.CopyRaster_management(rasOutBS, pathOutBS, pixel_type="8_BIT_UNSIGNED", scale_pixel_value="NONE")
+        #    del rasOutBS, rasBS, rasTempBS
+        #    print("BS done")
     
-    rasPV = arcpy.sa.Raster(os.path.join(pathIn,img,"Band_2"))
-    arcpy.env.cellSize = rasPV
-    arcpy.env.snapRaster = rasPV
-    pathOutPV = os.path.join(pathOut, "acfgcs_"+ strDate + "_PVpc.tif")
-    rasTempPV = rasPV - 100
-    #Trim PV to minimum of 0 and maximum of 100
-    rasOutPV = arcpy.sa.Con(rasTempPV < 0, 0, arcpy.sa.Con(rasTempPV > 100, 100, rasTempPV))
-    arcpy.CopyRaster_management(rasOutPV, pathOutPV, pixel_type="8_BIT_UNSIGNED", scale_pixel_value="NONE")
-    del rasTempPV, rasPV
-    print("PV done")
+            rasPV = arcpy.sa.Raster(os.path.join(pathIn,img,"Band_2"))
+            arcpy.env.cellSize = rasPV
+            arcpy.env.snapRaster = rasPV
+            pathOutPV = os.path.join(pathOut, "acfgcs_"+ strDate + "_PVpc.tif")
+            rasTempPV = rasPV - 100
+            #Trim PV to minimum of 0 and maximum of 100
+            rasOutPV = arcpy.sa.Con(rasTempPV < 0, 0, arcpy.sa.Con(rasTempPV > 100, 100, rasTempPV))
+            arcpy.CopyRaster_management(rasOutPV, pathOutPV, pixel_type="8_BIT_UNSIGNED", scale_pixel_value="NONE")
+            del rasTempPV, rasPV
+            print("PV done")
     
-    rasNPV = arcpy.sa.Raster(os.path.join(pathIn,img, "Band_3"))
-    arcpy.env.cellSize = rasNPV
-    arcpy.env.snapRaster = rasNPV
-    pathOutNPV = os.path.join(pathOut, "acfgcs_"+ strDate + "_NPVpc.tif")
-    rasTempNPV = rasNPV - 100
-    #Trim NPV to minimum of 0 and maximum of 100
-    rasOutNPV = arcpy.sa.Con(rasTempNPV < 0, 0, arcpy.sa.Con(rasTempNPV > 100, 100, rasTempNPV))
-    arcpy.CopyRaster_management(rasOutNPV, pathOutNPV, pixel_type="8_BIT_UNSIGNED", scale_pixel_value="NONE")
-    del rasNPV, rasTempNPV
-    print("NPV done")
+            rasNPV = arcpy.sa.Raster(os.path.join(pathIn,img, "Band_3"))
+            arcpy.env.cellSize = rasNPV
+            arcpy.env.snapRaster = rasNPV
+            pathOutNPV = os.path.join(pathOut, "acfgcs_"+ strDate + "_NPVpc.tif")
+            rasTempNPV = rasNPV - 100
+            #Trim NPV to minimum of 0 and maximum of 100
+            rasOutNPV = arcpy.sa.Con(rasTempNPV < 0, 0, arcpy.sa.Con(rasTempNPV > 100, 100, rasTempNPV))
+            arcpy.CopyRaster_management(rasOutNPV, pathOutNPV, pixel_type="8_BIT_UNSIGNED", scale_pixel_value="NONE")
+            del rasNPV, rasTempNPV
+            print("NPV done")
     
-    rasTempTC = rasOutPV + rasOutNPV
-    #Trim TVC to a maximum of 100
-    rasTC = arcpy.sa.Con(rasTempTC > 100, 100, rasTempTC)
-    pathOutTC = os.path.join(pathOut, "acfgcs_"+ strDate + "_TVCpc.tif")
-    arcpy.CopyRaster_management(rasTC, pathOutTC, pixel_type="8_BIT_UNSIGNED", scale_pixel_value="NONE")
-    del rasOutPV, rasOutNPV, rasTC, rasTempTC
-    print("TVC done")
+            rasTempTC = rasOutPV + rasOutNPV
+            #Trim TVC to a maximum of 100
+            rasTC = arcpy.sa.Con(rasTempTC > 100, 100, rasTempTC)
+            pathOutTC = os.path.join(pathOut, "acfgcs_"+ strDate + "_TVCpc.tif")
+            arcpy.CopyRaster_management(rasTC, pathOutTC, pixel_type="8_BIT_UNSIGNED", scale_pixel_value="NONE")
+            del rasOutPV, rasOutNPV, rasTC, rasTempTC
+            print("TVC done")
+            if blnIncremental:
+                record_season(img, [pathOutPV, pathOutNPV, pathOutTC])
     
-#    rasUE = arcpy.sa.Raster(os.path.join(pathIn,img, "Band_4"))
-#    arcpy.env.cellSize = rasUE
-#    arcpy.env.snapRaster = rasUE
-#    pathOutUE = os.path.join(pathOut, "acfgcs_"+ strDate + "_UE.tif")
-#    arcpy.CopyRaster_management(rasUE, pathOutUE, pixel_type="8_BIT_UNSIGNED", scale_pixel_value="NONE")
-#del rasUE
-print("Completed Conversion")
-
-arcpy.CheckInExtension("Spatial")
+    #    rasUE = arcpy.sa.Raster(os.path.join(pathIn,img, "Band_4"))
+    #    arcpy.env.cellSize = rasUE
+    #    arcpy.env.snapRaster = rasUE
+    #    pathOutUE = os.path.join(pathOut, "acfgcs_"+ strDate + "_UE.tif")
+    #    arcpy.CopyRaster_management(rasUE, pathOutUE, pixel_type="8_BIT_UNSIGNED", scale_pixel_value="NONE")
+    #del rasUE
+    print("Completed Conversion")
+
+    arcpy.CheckInExtension("Spatial")
+
+if len(pathCube) > 0 and __name__ == "__main__":
+    import fgc_cube
+    #Resample and mask every season once so later scripts read the aligned .npy slices
+    import fgc_common
+    #The seasons between yearStart and yearEnd are added to the cube, from their TVCpc GeoTIFFs or, without them, from
+    #the dima2 GeoTIFFs (the TVC is found as they are read).  Seasons outside the years are kept in the cube.
+    if blnWriteTVC:
+        lsPathCube = [os.path.join(pathOut, fgc_common.tvc_name(a)) for a in lsSelected]
+    else:
+        lsPathCube = [os.path.join(pathIn, a) for a in lsSelected]
+    with runLog.stage("cube"):
+        intWritten, intKept = fgc_cube.build_cube(pathCube, lsPathCube, pathMask, blnPrune=False)
+    print("Season cube {}: {} seasons added and {} unchanged".format(pathCube, intWritten, intKept))
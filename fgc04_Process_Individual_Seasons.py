@@ -48,21 +48,34 @@ NOTE:
 For more infromation regarding the AusCover data see:
 http://data.auscover.org.au/xwiki/bin/view/Product+pages/Landsat+Seasonal+Fractional+Cover
 
-This script uses the arcpy package from ESRI and requires the Spatial Analyst extension.
+This script uses the arcpy package from ESRI and requires the Spatial Analyst extension when strEngine = "arcpy".
+When strEngine = "gdal" the analysis is done with GDAL, numpy and pandas (see fgc_zones.py) and arcpy is not needed.
+The "gdal" engine reads each TVC raster and the rasterised zones one block window at a time and counts the pixels of
+every zone and TVC value with numpy.unique.  These per zone histograms are saved so that new class breaks
+(lsTVCThreshold) can be tabulated by summing histogram bins rather than reading the rasters again.  Images can be
+tabulated in parallel across intWorkers processes.  If pathCube is a season cube built by fgc03 (see fgc_cube.py)
+each season is read from its aligned .npy slice rather than the GeoTIFF.  The tables are written to a Parquet store rather than .dbf
+(tabulate_records.parquet, partitioned by ImageDate) and combined into All_tabulate_records_acfgcs.csv.
+With blnTimings = True the wall time, bytes read and written, block windows and peak memory of rasterising the
+zones, tabulating each image and writing the tables are written as JSON lines to fgc04_timings.jsonl in pathOut
+(see fgc_instrument.py), alongside log.txt.  If pathProfile is given each stage is also profiled with cProfile.
+With blnFused = True ("gdal" engine only) the raw AusCover dima2 GeoTIFFs in pathTVC are tabulated directly.  The TVC
+of each block window is found from Bands 2 and 3 as it is read (see fgc_common.FusedTVCBand), so fgc03 does not have
+to write TVCpc GeoTIFFs first.  Outputs are named after the TVCpc GeoTIFF each dima2 stands for.
+With strEngine = "gdal" the output GeoTIFFs are internally tiled and compressed with strCompress (DEFLATE or ZSTD)
+and a predictor.  With blnCOG = True each is finished as a Cloud Optimised GeoTIFF with nearest neighbour overviews
+and its colour map as the palette (see fgc_common.finish_output), so windowed reads and map previews are quick.
               
 This script is in development and care should be taken when using.
               
 No guarentees are given and users should do their own validation.
 """
 #Import packages
-import arcpy
+import fnmatch
 import os
-from arcpy.sa import *
 from datetime import datetime
 
-#BE WARNED - Overwite is TRUE so it will overwrite existing data
-arcpy.env.overwriteOutput = True
-arcpy.CheckOutExtension("Spatial")
+import fgc_instrument
 
 #USER DEFINED VARIABLES
 ########################################################################################################################################################
@@ -90,219 +103,300 @@ pathTVC = r"E:\FGC\TVC"         #"C:\Projects\Remote_Sensing_Resource_Condition\
 pathMask = r"C:\Projects\Remote_Sensing_Resource_Condition\FGC\data\masks\arable_albers_JL.tif" #"C:\Projects\Remote_Sensing_Resource_Condition\!Cadaster\Dams_3577.shp"#"C:\Projects\Remote_Sensing_Resource_Condition\FGC\data\masks\arable_albers_JL.tif"
 #ColourImage ** Path to the .clr file that will colour the image from brown to green
 pathTVCColour = r"C:\Projects\Remote_Sensing_Resource_Condition\fgc\layer_files\TVC_10pc_10class.clr"
+#Engine used for the analysis.  "gdal" = block windowed GDAL/numpy (no arcpy needed), "arcpy" = original Spatial Analyst process
+strEngine = "gdal"
+#Folder where rasterised zone grids are cached between runs ("gdal" engine only).  Leave empty to use a zone_cache folder in pathOut
+pathZoneCache = r""
+#Write the coloured threshold rasters (*tvcth.tif) ("gdal" engine only).  With False the tables for new class breaks
+#are built from the per zone histograms saved by earlier runs, without reading any TVC rasters.
+blnThresholdRaster = True
+#Number of worker processes used to tabulate images in parallel ("gdal" engine only).  1 = one image at a time.
+intWorkers = 1
+#Also write the tables to a Parquet store partitioned by image date, tabulate_records.parquet in pathOut ("gdal" engine only, needs pyarrow)
+blnParquet = True
+#Folder of a season cube built by fgc03 to read the seasons from ("gdal" engine only, the zone grid must be aligned with the cube).  "" = read the GeoTIFFs
+pathCube = r""
+#Write the time, I/O and memory of each stage to fgc04_timings.jsonl in pathOut (True/False)
+blnTimings = True
+#Folder for cProfile statistics of each stage.  "" = no profiling
+pathProfile = r""
+#Compression of the output GeoTIFFs, "DEFLATE" or "ZSTD" ("gdal" engine only, ZSTD needs GDAL built with it)
+strCompress = "DEFLATE"
+#Write the outputs as Cloud Optimised GeoTIFFs with overviews (True/False).  With "arcpy" the outputs are tiled with pyramids
+blnCOG = True
+#Tabulate the raw AusCover dima2 GeoTIFFs in pathTVC (lztmre_wa_*dima2.tif) instead of TVCpc GeoTIFFs ("gdal" engine only)
+blnFused = False
 #########################################################################################################################################################
-if not os.path.exists(pathOut):
-    raise Exception("Path to the output directory {} does not exist.  Please correct the path".format(pathOut))
-if not arcpy.Exists(pathPoly):
-    raise Exception("Path to the polygon data set {} does not exist.  Please correct the path".format(pathPoly))
-print ("Marker 1")
-desc = arcpy.Describe(pathPoly)
-flds = desc.fields
-fldin = 'no'
-for fld in flds:
-    if fld.name == strFieldName:
-        fldin = 'yes'
-if fldin == 'no':
-    raise Exception("The field {} does not exist in the polygon data set {}.  Please check the name of the field".format(strFieldName, pathOut))
-
-if not os.path.exists(pathTVC):
-    raise Exception("Path to the Total Vegetation Cover GeoTIFF data set {} does not exist.  Please correct the path".format(pathTVC))
-
-######     JL;  I found this in NickM other codes
-#Create a list of all Total Vegetative Cover percentage GeoTIFFs in the workspace   NOTE it is looking for *TVCpc.tif
-arcpy.env.workspace = pathTVC
-lsAllTVC = arcpy.ListDatasets("*TVCpc.tif")
-
-if len(lsAllTVC) == 0:
-    arcpy.CheckInExtension("Spatial")
-    raise Exception("No Total Vegetation Cover GeoTIFFs exist in the directory {}".format(pathTVC)) #check if needs a tif file
-
-print ("Marker 2")
-print ("List of images for processing : " + str(lsAllTVC))
-
-#If there is a mask set by the user then set environment for that mask and its extent.
-      
-if len(pathMask) > 0:
-    if arcpy.Exists(pathMask):
-        arcpy.env.mask = pathMask
-        arcpy.env.extent = pathMask
+#The __main__ test stops worker processes on Windows (intWorkers > 1) from running the analysis again
+if __name__ == "__main__":
+    if strEngine not in ("arcpy", "gdal"):
+        raise Exception("The engine {} is not recognised.  Please use either \"arcpy\" or \"gdal\"".format(strEngine))
+    if strEngine == "arcpy" and blnFused:
+        raise Exception("The dima2 GeoTIFFs can only be tabulated directly (blnFused) with the \"gdal\" engine")
+    if strEngine == "arcpy":
+        import arcpy
+        from arcpy.sa import *
+
+        #BE WARNED - Overwite is TRUE so it will overwrite existing data
+        arcpy.env.overwriteOutput = True
+        arcpy.CheckOutExtension("Spatial")
+        blnPolyExists = arcpy.Exists(pathPoly)
     else:
-        arcpy.CheckInExtension("Spatial")
-        raise Exception("The nominated mask data set: ", pathMask, "doesn't exist.  please correct the path to the mask and try again.")
-else:
-    arcpy.env.mask = pathTVC+"/"+lsAllTVC[0]     #JL2020 The 0 was 1
-logFile = os.path.join(pathOut, "log.txt")
-f = open(logFile, mode='w')
-f.write("Input Total Vegetation Cover GeoTIFF = " + pathTVC + "\n")
-f.write("Polygon data set containing features to be assessed = " + pathPoly + "\n")
-f.write("Field uniquely identifiying features = " + strFieldName + "\n")
-if len(pathMask) > 0:
-    f.write("Data set used as a mask = " + pathMask + "\n")
-else:
-    f.write("No additional mask used.")
-f.write("Class breaks used in the analysis = " + str(lsTVCThreshold) + "\n")
-f.write("List of images for processing : " + str(lsAllTVC) + "\n")
-print ("Marker 3")
-print ("Enviroment Mask : " + arcpy.env.mask)
-
-#Set workspace to folder containing FGC TVC rasters
-arcpy.env.workspace = pathOut
-#Standard compression fro GeoTIFFs
-arcpy.env.compression = "LZ77"
-#Ensure No Data values will be set to 255 for unsigned 8 bit GeoTIFFs
-arcpy.env.nodata = "MAXIMUM"
-#Set raster analysis properties based on the TVC    JL2020 changed the [0] below, it was 1
-arcpy.env.cellSize = pathTVC+"/"+lsAllTVC[0]
-print("Environment Cell Size : "+ arcpy.env.cellSize)
-arcpy.env.outputCoordinateSystem = pathTVC+"/"+lsAllTVC[0]
-arcpy.env.snapRaster = pathTVC+"/"+lsAllTVC[0]
-arcpy.env.extent = pathPoly
-
-#convert the user selected polygons to raster data set"pathPolyConvert"
-pathPolyConvert = "polyunits"
-arcpy.PolygonToRaster_conversion(pathPoly, strFieldName, pathPolyConvert, "MAXIMUM_AREA")
-
-  ##
-  # SET UP REMAP TABLE FOR RECLASSIFYING TVC RASTER TO THRESHOLDS
-  #Based on the user defined thresholds a new list of lists is created where the sub-lists have the
-  #structure required by arcgis relcassification for ranges with a strucutre of [x,y,a] where:
-  #x = lower limit
-  #y = upper limit
-  #a = output reclassified value for range
-  #
-#The new sub-lists will allways classify the fist range as being from 0 to the first class break that
-#the user nominates.  The final sub-list will always be from the last class break the user nominates to 100.
-intLen = len(lsTVCThreshold) 
-#dictionary for column headers
-
-ls2 = []
-counter = 0
-while counter <= intLen:
-   if counter == 0:
-        a = 0
-        b = lsTVCThreshold[counter]
-        ls2.append([a,b,counter + 1])  
-   elif counter == intLen:
-        a = lsTVCThreshold[counter -1]
-        b = 100
-        ls2.append([a,b,counter + 1])
-   else:
-        a = lsTVCThreshold[counter - 1]
-        b = lsTVCThreshold[counter]
-        ls2.append([a,b,counter + 1])
-   counter += 1
-print ("Cover Classes") 
-print (ls2)
-
-lim_strings = ['{}_{}'.format(bkt[0],bkt[1]) for bkt in ls2]
-val_dict = {k+1:v for k,v in enumerate(lim_strings)}
-#ls2 is a remap table, used for each of the rasters.  
-
-
-### THIS IS WHERE TO START THE LOOP
-#Looping over all tif names in lsAllTVC
-
-for inTVC in lsAllTVC:  
-    #inTVC =lsAllTVC[1]  #use this for testing on 1 raster
-  rasNameTVC =pathTVC+"\\"+inTVC   #CHECK if path is present in the list of tifs
-  print("Loop Process : " + rasNameTVC)
-  # get prefix to use for naming output raster and table
-  filePrefix = inTVC[:-9]
- 
-  #Consistent name to which FGC TVC data set are converted
-  pathRasTVCThreshold = filePrefix+"tvcth.tif" 
-  pathRasTable = "tabulate_records_"+filePrefix[:-1]+".dbf"
-
-    ##fout = open(os.path.join(pathWKS, "TVCthreshold" + str(lsTVCThreshold) + season + str(yearStart) + "to" + str(yearEnd) + ".txt"), "w")
-  ##fout.write("unit, TVCimage, date, season, perc_below{}, perc_above{}, area_assessed\n".format(lsTVCThreshold, lsTVCThreshold))        
-
-  #Create a raster object in memory from the TVC GeoTIFF
-  rasTVC = arcpy.Raster(rasNameTVC)
-
-  ## Now reclassify using thresholds written into ls2
-  rasTVCThreshold = Reclassify(rasTVC, "Value", RemapRange(ls2))
-  ##
-  ##  Colour The image using the colour file
-  print("\n about to apply the colouring to the raster image")
-  arcpy.AddColormap_management(rasTVCThreshold, "#" , pathTVCColour)
-  print("colour has been applied \n")
-  #Save the temporary raster to an ESRI GRID
-  ##rasTVCThreshold.save(pathRasTVCThreshold)
-
-  #save thresholds raster to disk
-  arcpy.CopyRaster_management(rasTVCThreshold, pathRasTVCThreshold, pixel_type="8_BIT_UNSIGNED", scale_pixel_value="NONE")
-  #tabulate area with in the polygons.  This creates the dbf file in the first place. 
-  arcpy.sa.TabulateArea(pathPolyConvert, strFieldName, rasTVCThreshold, "Value", pathRasTable)
-
-  # Add area to the tabulate-area table.  THis will be done for each threshold class in next loop
-  intClasses = len(ls2)
-  arcpy.AddField_management(pathRasTable, "total_area", "DOUBLE")
-  arcpy.AddField_management(pathRasTable, "ImageDate", "TEXT")
-  #arcpy.AddField_management(pathRasTable, "Value", "TEXT")
-  #arcpy.AddField_management(pathPolyConvert, "MAPUNIT")
-  f.write("Processed Image:  " + rasNameTVC + "\n")
-
-  # This adds a column for each threshold's percent value.  So 2 thresholds gives 3 new columns.
-  for i in ls2:   
-    arcpy.AddField_management(pathRasTable, "a" + val_dict[i[2]] + "ha", "DOUBLE")
-  cursor =  arcpy.UpdateCursor(pathRasTable)
-  intTA = 0
-  for row in cursor:
-     for i in ls2:
-        curField = 'VALUE_' + str(i[2])
-        intTA += row.getValue(curField)
-     row.setValue("total_area", intTA)
-     for i in ls2:
-        curFieldVal = 'VALUE_' + str(i[2])
-        curFieldPC = "a" + val_dict[i[2]] + "ha"
-        row.setValue(curFieldPC, (row.getValue(curFieldVal)) / 10000)
-        row.setValue("ImageDate", filePrefix[5:-1])
-     cursor.updateRow(row)
-     intTA = 0
-  del row
-  del cursor
-  
-## END OF LOOP OVER TVC RASTERS
-
-
-# Now read in dbfs, append, then write out as a csv file
-#os.getcwd()  # get current working directory
-#pathOut = r"C:\ALL_PROJECTS\KPI_FGC_landsat\Code_multiImage\05ThresholdSummary_test"
-#arcpy.env.workspace = pathOut
-
-# make a list of dbf tables (using the arcpy command avoids all the 'other' dbf files)
-tableList = arcpy.ListTables('tabulate*')
-
-#import these for data base and data frame functions
-import pandas
-from simpledbf import Dbf5
+        import pandas
+        from osgeo import gdal
+        import fgc_common
+        fgc_common.set_output_format(strCompress, blnCOG)
+        import fgc_zones
+        blnPolyExists = os.path.exists(pathPoly)
+
+    if not os.path.exists(pathOut):
+        raise Exception("Path to the output directory {} does not exist.  Please correct the path".format(pathOut))
+    runLog = fgc_instrument.RunLog(os.path.join(pathOut, "fgc04_timings.jsonl") if blnTimings else "", "fgc04", pathProfile)
+    if not blnPolyExists:
+        raise Exception("Path to the polygon data set {} does not exist.  Please correct the path".format(pathPoly))
+    print ("Marker 1")
+    if strEngine == "arcpy":
+        desc = arcpy.Describe(pathPoly)
+        lsFieldNames = [fld.name for fld in desc.fields]
+    else:
+        layerDefn = gdal.OpenEx(pathPoly, gdal.OF_VECTOR).GetLayer(0).GetLayerDefn()
+        lsFieldNames = [layerDefn.GetFieldDefn(i).GetName() for i in range(layerDefn.GetFieldCount())]
+    fldin = 'no'
+    for fld in lsFieldNames:
+        if fld == strFieldName:
+            fldin = 'yes'
+    if fldin == 'no':
+        raise Exception("The field {} does not exist in the polygon data set {}.  Please check the name of the field".format(strFieldName, pathOut))
+
+    if not os.path.exists(pathTVC):
+        raise Exception("Path to the Total Vegetation Cover GeoTIFF data set {} does not exist.  Please correct the path".format(pathTVC))
+
+    ######     JL;  I found this in NickM other codes
+    #Create a list of all Total Vegetative Cover percentage GeoTIFFs in the workspace   NOTE it is looking for *TVCpc.tif
+    if strEngine == "arcpy":
+        arcpy.env.workspace = pathTVC
+        lsAllTVC = arcpy.ListDatasets("*TVCpc.tif")
+    else:
+        #(or for the dima2 GeoTIFFs with blnFused)
+        lsAllTVC = sorted(fnmatch.filter(os.listdir(pathTVC), fgc_common.DIMA2_PATTERN if blnFused else "*TVCpc.tif"))
 
-#cool 'pop' feature
-#dbf = Dbf5(pathOut + '\\' + tableList.pop(1))
+    if len(lsAllTVC) == 0:
+        if strEngine == "arcpy":
+            arcpy.CheckInExtension("Spatial")
+        raise Exception("No Total Vegetation Cover GeoTIFFs exist in the directory {}".format(pathTVC)) #check if needs a tif file
 
-# this works for all tables with 9 columns (complete)
-#check that all outputs have the 9 cols, or add an 'if' section.
+    print ("Marker 2")
+    print ("List of images for processing : " + str(lsAllTVC))
 
-#set up empty data frame, then fill with all the tables in the list, then stack up (concat)
-li = []
+    #If there is a mask set by the user then set environment for that mask and its extent.
+      
+    if len(pathMask) > 0:
+        if (strEngine == "arcpy" and arcpy.Exists(pathMask)) or (strEngine == "gdal" and os.path.exists(pathMask)):
+            pathAnalysisMask = pathMask
+        else:
+            if strEngine == "arcpy":
+                arcpy.CheckInExtension("Spatial")
+            raise Exception("The nominated mask data set: ", pathMask, "doesn't exist.  please correct the path to the mask and try again.")
+    else:
+        pathAnalysisMask = pathTVC+"/"+lsAllTVC[0]     #JL2020 The 0 was 1
+    if strEngine == "arcpy":
+        arcpy.env.mask = pathAnalysisMask
+        if len(pathMask) > 0:
+            arcpy.env.extent = pathMask
+    logFile = os.path.join(pathOut, "log.txt")
+    f = open(logFile, mode='w')
+    f.write("Input Total Vegetation Cover GeoTIFF = " + pathTVC + "\n")
+    f.write("Polygon data set containing features to be assessed = " + pathPoly + "\n")
+    f.write("Field uniquely identifiying features = " + strFieldName + "\n")
+    if len(pathMask) > 0:
+        f.write("Data set used as a mask = " + pathMask + "\n")
+    else:
+        f.write("No additional mask used.")
+    f.write("Class breaks used in the analysis = " + str(lsTVCThreshold) + "\n")
+    f.write("List of images for processing : " + str(lsAllTVC) + "\n")
+    print ("Marker 3")
+    print ("Enviroment Mask : " + pathAnalysisMask)
+
+    if strEngine == "arcpy":
+        #Set workspace to folder containing FGC TVC rasters
+        arcpy.env.workspace = pathOut
+        #Standard compression fro GeoTIFFs
+        arcpy.env.compression = "LZ77"
+        #Tiled outputs with nearest neighbour pyramids so they are quick to read by window and to view
+        if blnCOG:
+            arcpy.env.tileSize = "512 512"
+            arcpy.env.pyramid = "PYRAMIDS -1 NEAREST DEFAULT 75 NO_SKIP"
+        #Ensure No Data values will be set to 255 for unsigned 8 bit GeoTIFFs
+        arcpy.env.nodata = "MAXIMUM"
+        #Set raster analysis properties based on the TVC    JL2020 changed the [0] below, it was 1
+        arcpy.env.cellSize = pathTVC+"/"+lsAllTVC[0]
+        print("Environment Cell Size : "+ arcpy.env.cellSize)
+        arcpy.env.outputCoordinateSystem = pathTVC+"/"+lsAllTVC[0]
+        arcpy.env.snapRaster = pathTVC+"/"+lsAllTVC[0]
+        arcpy.env.extent = pathPoly
+
+        #convert the user selected polygons to raster data set"pathPolyConvert"
+        pathPolyConvert = "polyunits"
+        with runLog.stage("zones"):
+            arcpy.PolygonToRaster_conversion(pathPoly, strFieldName, pathPolyConvert, "MAXIMUM_AREA")
+    else:
+        #convert the user selected polygons to a zone raster snapped to the first TVC raster, with the extent of the polygons
+        #and the mask stored with it.  The zone raster is reused from the cache if the polygons, field, grid and mask are unchanged.
+        if len(pathZoneCache) == 0:
+            pathZoneCache = os.path.join(pathOut, "zone_cache")
+        with runLog.stage("zones"):
+            pathPolyConvert, lsZoneNames = fgc_zones.cached_zones(pathPoly, strFieldName, os.path.join(pathTVC, lsAllTVC[0]),
+                                                                  pathAnalysisMask, pathZoneCache)
+        dsRefTVC = gdal.Open(os.path.join(pathTVC, lsAllTVC[0]))
+        valCellArea = abs(dsRefTVC.GetGeoTransform()[1] * dsRefTVC.GetGeoTransform()[5])
+        del dsRefTVC
+        print("Rasterised", len(lsZoneNames) - 1, "zones to", pathPolyConvert)
+
+      ##
+      # SET UP REMAP TABLE FOR RECLASSIFYING TVC RASTER TO THRESHOLDS
+      #Based on the user defined thresholds a new list of lists is created where the sub-lists have the
+      #structure required by arcgis relcassification for ranges with a strucutre of [x,y,a] where:
+      #x = lower limit
+      #y = upper limit
+      #a = output reclassified value for range
+      #
+    #The new sub-lists will allways classify the fist range as being from 0 to the first class break that
+    #the user nominates.  The final sub-list will always be from the last class break the user nominates to 100.
+    intLen = len(lsTVCThreshold) 
+    #dictionary for column headers
+
+    ls2 = []
+    counter = 0
+    while counter <= intLen:
+       if counter == 0:
+            a = 0
+            b = lsTVCThreshold[counter]
+            ls2.append([a,b,counter + 1])  
+       elif counter == intLen:
+            a = lsTVCThreshold[counter -1]
+            b = 100
+            ls2.append([a,b,counter + 1])
+       else:
+            a = lsTVCThreshold[counter - 1]
+            b = lsTVCThreshold[counter]
+            ls2.append([a,b,counter + 1])
+       counter += 1
+    print ("Cover Classes") 
+    print (ls2)
+
+    lim_strings = ['{}_{}'.format(bkt[0],bkt[1]) for bkt in ls2]
+    val_dict = {k+1:v for k,v in enumerate(lim_strings)}
+    #ls2 is a remap table, used for each of the rasters.  
+
+
+    if strEngine == "gdal":
+        pathStore = os.path.join(pathOut, "tabulate_records.parquet") if blnParquet else ""
+        #Each image is tabulated independently so they are spread across intWorkers processes
+        lsJobs = []
+        for inTVC in lsAllTVC:
+            # get prefix to use for naming output raster (a dima2 is named after its TVCpc GeoTIFF)
+            filePrefix = fgc_common.tvc_name(inTVC)[:-9]
+            pathRasTVCThreshold = os.path.join(pathOut, filePrefix+"tvcth.tif") if blnThresholdRaster else ""
+            lsJobs.append((os.path.join(pathTVC, inTVC), pathPolyConvert, lsZoneNames, ls2, strFieldName, valCellArea,
+                           pathZoneCache, pathRasTVCThreshold, pathTVCColour, pathStore, pathCube))
+        #Count every TVC value in each zone (and classify, colour and save the thresholds raster) in one pass, or reuse
+        #the saved histogram, then sum the histogram bins into the threshold classes
+        lsTables = fgc_common.run_parallel(fgc_zones.tabulate_season, lsJobs, intWorkers, lsLabels=lsAllTVC, runLog=runLog,
+                                           strStage="tabulate")
+        for inTVC in lsAllTVC:
+            f.write("Processed Image:  " + os.path.join(pathTVC, inTVC) + "\n")
+
+        # Now append the tables in image order, then write out as a csv file
+        with runLog.stage("write_tables"):
+            frame = pandas.concat(lsTables, axis=0, ignore_index=True)
+            frame.to_csv(os.path.join(pathOut, 'All_tabulate_records_acfgcs.csv'), index = None, header=True)
+        if blnParquet:
+            print("Tables written to the Parquet store", pathStore)
+    else:
+        #import these for data base and data frame functions
+        import numpy
+        import pandas
+
+        #set up empty list of data frames, one per image, which are stacked up (concat) after the loop
+        li = []
+
+        ### THIS IS WHERE TO START THE LOOP
+        #Looping over all tif names in lsAllTVC
+
+        for inTVC in lsAllTVC:  
+            #inTVC =lsAllTVC[1]  #use this for testing on 1 raster
+          rasNameTVC =pathTVC+"\\"+inTVC   #CHECK if path is present in the list of tifs
+          print("Loop Process : " + rasNameTVC)
+          with runLog.stage("tabulate", inTVC):
+            # get prefix to use for naming output raster and table
+            filePrefix = inTVC[:-9]
+ 
+            #Consistent name to which FGC TVC data set are converted
+            pathRasTVCThreshold = filePrefix+"tvcth.tif" 
+            pathRasTable = "tabulate_records_"+filePrefix[:-1]+".dbf"
+
+              ##fout = open(os.path.join(pathWKS, "TVCthreshold" + str(lsTVCThreshold) + season + str(yearStart) + "to" + str(yearEnd) + ".txt"), "w")
+            ##fout.write("unit, TVCimage, date, season, perc_below{}, perc_above{}, area_assessed\n".format(lsTVCThreshold, lsTVCThreshold))        
+
+            #Create a raster object in memory from the TVC GeoTIFF
+            rasTVC = arcpy.Raster(rasNameTVC)
+
+            ## Now reclassify using thresholds written into ls2
+            rasTVCThreshold = Reclassify(rasTVC, "Value", RemapRange(ls2))
+            ##
+            ##  Colour The image using the colour file
+            print("\n about to apply the colouring to the raster image")
+            arcpy.AddColormap_management(rasTVCThreshold, "#" , pathTVCColour)
+            print("colour has been applied \n")
+            #Save the temporary raster to an ESRI GRID
+            ##rasTVCThreshold.save(pathRasTVCThreshold)
+
+            #save thresholds raster to disk
+            arcpy.CopyRaster_management(rasTVCThreshold, pathRasTVCThreshold, pixel_type="8_BIT_UNSIGNED", scale_pixel_value="NONE")
+            #tabulate area with in the polygons.  The table is kept in memory until the derived columns are added
+            pathMemTable = "in_memory\\tabulate_records"
+            arcpy.sa.TabulateArea(pathPolyConvert, strFieldName, rasTVCThreshold, "Value", pathMemTable)
+            f.write("Processed Image:  " + rasNameTVC + "\n")
+
+            #Read the whole table into a data frame and add total_area, ImageDate and a column of hectares for each
+            #threshold class with array operations, rather than visiting every row with a cursor
+            lsFields = [fld.name for fld in arcpy.ListFields(pathMemTable) if fld.type != "OID"]
+            dfTable = pandas.DataFrame(arcpy.da.TableToNumPyArray(pathMemTable, lsFields))
+            arcpy.Delete_management(pathMemTable)
+            lsValueFields = ['VALUE_' + str(i[2]) for i in ls2]
+            #A class with no pixels in the image has no VALUE_ column, so it is added as zero
+            arrArea = dfTable.reindex(columns=lsValueFields, fill_value=0).to_numpy(dtype=numpy.float64)
+            dfTable[lsValueFields] = arrArea
+            dfTable["total_area"] = arrArea.sum(axis=1)
+            dfTable["ImageDate"] = filePrefix[5:-1]
+            for intIndex, i in enumerate(ls2):
+              dfTable["a" + val_dict[i[2]] + "ha"] = arrArea[:, intIndex] / 10000
+            li.append(dfTable)
+
+            #Write the finished table to the dbf in one step.  Text columns need a fixed width for the dbf
+            dicTypes = {col: "U{}".format(max(1, dfTable[col].astype(str).str.len().max()))
+                        for col in dfTable.columns if dfTable[col].dtype == object}
+            if arcpy.Exists(pathRasTable):
+              arcpy.Delete_management(pathRasTable)
+            arcpy.da.NumPyArrayToTable(dfTable.to_records(index=False, column_dtypes=dicTypes), os.path.join(pathOut, pathRasTable))
+  
+        ## END OF LOOP OVER TVC RASTERS
 
-for filename in tableList:
-    dbfnext = Dbf5(pathOut + '\\' + filename)
-    dfnew = dbfnext.to_dataframe()
-    li.append(dfnew)
-frame = pandas.concat(li, axis=0, ignore_index=True)
+        # Now append the tables in image order, then write out as a csv file
+        with runLog.stage("write_tables"):
+            frame = pandas.concat(li, axis=0, ignore_index=True)
 
-# write the data frame to a csv file
-frame.to_csv (pathOut + '\\All_tabulate_records_acfgcs.csv', index = None, header=True) 
+            # write the data frame to a csv file
+            frame.to_csv (pathOut + '\\All_tabulate_records_acfgcs.csv', index = None, header=True) 
 
-##
+        ##
 
-arcpy.CheckInExtension("Spatial")
+        arcpy.CheckInExtension("Spatial")
 
-dateTimeObj = datetime.now()
-timestampStr = dateTimeObj.strftime("%c")
-f.write("Analysis completed at: " + timestampStr + "\n")
-f.write("Yes   The Analysis is now completed")
-f.close
+    dateTimeObj = datetime.now()
+    timestampStr = dateTimeObj.strftime("%c")
+    f.write("Analysis completed at: " + timestampStr + "\n")
+    f.write("Yes   The Analysis is now completed")
+    f.close
 
-print ("done - Check log.txt file for other details")
+    print ("done - Check log.txt file for other details")
@@ -18,24 +18,51 @@ Inputs:  Start Year for the analysis (yearStart)
          Pathway to a folder where all outputs will be written (pathOut)
          Pathway to data set to act as a mask for the Analysis (pathMask) OPTIONAL
          A single season whcihc will be analysed for the years between the start and end years (seasonSingle)
-         OR, Start and and End season that will seee the analysis done for all seasons between the start and end years.
+         OR, a list of seasons that will all be analysed for the years between the start and end years (lsSeasons, "gdal" engine only)
          The pathway and file name to the image used to assess the anomaly, such as the most recent season (anomalyImage)
          A integer percentage threshold cover value (intThreshold)
+         OR, a list of threshold cover values (lsThresholds, "gdal" engine only)
 NOTE:
 For more infromation regarding the AusCover data see:
 http://data.auscover.org.au/xwiki/bin/view/Product+pages/Landsat+Seasonal+Fractional+Cover
 
-This script uses the arcpy package from ESRI and requires the Spatial Analyst extension.
+This script uses the arcpy package from ESRI and requires the Spatial Analyst extension when strEngine = "arcpy".
+When strEngine = "gdal" the analysis is done with GDAL and numpy (see fgc_temporal.py) and arcpy is not needed.
+The same block window is read from every seasonal GeoTIFF and the median is found along time, so the whole stack
+never has to fit in memory.  The valid and bad year counts come from the same block windows, so no temporary
+GeoTIFFs are written.  Every season in lsSeasons and threshold in lsThresholds is produced in that one pass, reading
+each GeoTIFF once.  With more than one threshold the bad year count is named badyearcount_<threshold>pc_...
+With blnClimatology = True the count of years at each TVC value is kept for every pixel and season (see
+fgc_climatology.py).  A new season is added to the counts by reading just that GeoTIFF and all of the outputs are
+found from the counts, so a quarterly update does not read the earlier seasons again.
+If pathCube is a season cube built by fgc03 (see fgc_cube.py) the seasons are read from its aligned and masked .npy
+slices instead of the GeoTIFFs, so nothing is decompressed or resampled.  The outputs are on the grid of the cube.
+With intTileSize > 0 the extent is split into tiles that are run across intWorkers processes (see fgc_tiles.py).
+Finished tiles are recorded in a checkpoint so an interrupted run carries on from where it stopped, and the tiles
+are mosaicked into the outputs at the end.
+With blnDask = True the seasons are opened as one chunked, lazily evaluated (time, y, x) xarray array and every output
+is one dask task graph run on intWorkers threads (see fgc_lazy.py), so the work is spread over every core without
+tiles.  This needs the dask and xarray packages.
+With blnTimings = True the wall time, bytes read and written, block windows and peak memory of each stage (and each
+image or tile) are written as JSON lines to fgc05_timings.jsonl in pathOut (see fgc_instrument.py).  If pathProfile
+is given each stage is also profiled with cProfile.
+With blnFused = True ("gdal" engine only) the raw AusCover dima2 GeoTIFFs in pathIn are analysed directly.  The Total
+Vegetation Cover of each block window is found from Bands 2 and 3 as it is read (see fgc_common.FusedTVCBand), so
+fgc03 does not have to write TVCpc GeoTIFFs first.  The outputs are the same as from the TVCpc GeoTIFFs.
+With strEngine = "gdal" the output GeoTIFFs are internally tiled and compressed with strCompress (DEFLATE or ZSTD)
+and a predictor.  With blnCOG = True each is finished as a Cloud Optimised GeoTIFF with nearest neighbour overviews
+and its colour map as the palette (see fgc_common.finish_output), so windowed reads and map previews of the
+median, anomaly and badyearratio outputs are quick.  With tiles only the mosaics are made into COGs.
               
 This script is in development and care should be taken when using.
               
 No guarentees are given and users should do their own validation.
 """
 # Import packages
-import arcpy
+import fnmatch
 import os
-#Note that existing files will be overwritten if they exist
-arcpy.env.overwriteOutput = True
+
+import fgc_instrument
 
 #USER DEFINED VARIABLES
 ##################################################################################################################################################
@@ -56,286 +83,437 @@ seasonSingle = "Autumn" #"Autumn", "Spring", "Winter", "Summer"
 intThreshold = 50
 #Do you want to asess the final Raster agaist the median for the list?
 assess = True    #True
+#Engine used for the analysis.  "gdal" = block windowed GDAL/numpy (no arcpy needed), "arcpy" = original Spatial Analyst process
+strEngine = "gdal"
+#Seasons analysed together in one pass ("gdal" engine only), e.g. ["Summer", "Autumn", "Winter", "Spring"].  Leave empty for seasonSingle only
+lsSeasons = []
+#Thresholds analysed together in one pass ("gdal" engine only), e.g. [30, 50, 70].  Leave empty for intThreshold only
+lsThresholds = []
+#Keep a per pixel climatology of each season so later runs only read the GeoTIFFs added or removed since the last run ("gdal" engine only)
+blnClimatology = False
+#Folder holding the climatology.  Leave empty to use a climatology folder in pathOut
+pathClimatology = r""
+#Folder of a season cube built by fgc03 to read the seasons from ("gdal" engine only, not used with blnClimatology).  "" = read the GeoTIFFs
+pathCube = r""
+#Width and height in pixels of the tiles a state wide run is split into ("gdal" engine only, not used with blnClimatology).  0 = no tiles
+intTileSize = 0
+#Number of worker processes used to run tiles (or threads used to run dask chunks with blnDask) in parallel.  1 = one at a time
+intWorkers = 1
+#Folder holding the tiles and checkpoint of a tiled run.  Leave empty to use a tiles folder in pathOut
+pathTiles = r""
+#Find the outputs from one lazy dask/xarray task graph run on intWorkers threads ("gdal" engine only, needs dask and xarray,
+#not used with blnClimatology, intTileSize or pathCube)
+blnDask = False
+#Width and height in pixels of the dask chunks.  0 = sized from the number of GeoTIFFs
+intChunkSize = 0
+#Write the time, I/O and memory of each stage to fgc05_timings.jsonl in pathOut (True/False)
+blnTimings = True
+#Folder for cProfile statistics of each stage.  "" = no profiling
+pathProfile = r""
+#Compression of the output GeoTIFFs, "DEFLATE" or "ZSTD" ("gdal" engine only, ZSTD needs GDAL built with it)
+strCompress = "DEFLATE"
+#Write the outputs as Cloud Optimised GeoTIFFs with overviews (True/False).  With "arcpy" the outputs are tiled with pyramids
+blnCOG = True
+#Analyse the raw AusCover dima2 GeoTIFFs in pathIn (lztmre_wa_*dima2.tif) instead of TVCpc GeoTIFFs ("gdal" engine only)
+blnFused = False
 ###################################################################################################################################################
+if strEngine not in ("arcpy", "gdal"):
+    raise Exception("The engine {} is not recognised.  Please use either \"arcpy\" or \"gdal\"".format(strEngine))
+if len(lsSeasons) == 0:
+    lsSeasons = [seasonSingle]
+if len(lsThresholds) == 0:
+    lsThresholds = [intThreshold]
+if strEngine == "arcpy" and (lsSeasons != [seasonSingle] or lsThresholds != [intThreshold]):
+    raise Exception("More than one season or threshold (lsSeasons, lsThresholds) can only be analysed with the \"gdal\" engine")
+if strEngine == "arcpy" and blnFused:
+    raise Exception("The dima2 GeoTIFFs can only be analysed directly (blnFused) with the \"gdal\" engine")
+if strEngine == "arcpy" and (blnClimatology or len(pathCube) > 0 or intTileSize > 0 or blnDask):
+    raise Exception("The climatology, season cube, tiles and dask modes (blnClimatology, pathCube, intTileSize, blnDask) can only be used with the \"gdal\" engine")
+if blnClimatology and (len(pathCube) > 0 or intTileSize > 0 or blnDask):
+    raise Exception("The climatology (blnClimatology) can not be used with a season cube, tiles or dask (pathCube, intTileSize, blnDask).  Please choose one")
+if blnDask and (len(pathCube) > 0 or intTileSize > 0):
+    raise Exception("The dask mode (blnDask) reads the GeoTIFFs and can not be used with a season cube or tiles (pathCube, intTileSize).  Please choose one")
 if not os.path.exists(pathIn):
     raise Exception("Path to directory {} containing Total Vegetation Cover GeoTIFFs does not exist.  Please correct the path".format(pathIn))
 if not os.path.exists(pathOut):
     raise Exception("Path to output directory {} does not exist.  Please correct the path".format(pathOut))
-
-#SPATIAL ANALYSIS VARIABLES
-arcpy.CheckOutExtension("Spatial")
-#Default compression for GeoTIFFs
-arcpy.env.compression = "LZ77"
-#Ensure that NoData values set to 255 in outputs
-arcpy.env.nodata = "MAXIMUM"
-#Set workspace to the path to generate list of GeoTIFFs to be processed
-arcpy.env.workspace = pathIn
+runLog = fgc_instrument.RunLog(os.path.join(pathOut, "fgc05_timings.jsonl") if blnTimings else "", "fgc05", pathProfile)
 
 #Dictionary of Seasons and their start months. e.g. 03 = March
 dicSeason = dict([("Summer", "12"), ("Autumn", "03"), ("Winter", "06"), ("Spring", "09")])
-
-#If there is a mask set by the user then set environment for that mask and its extent. 
-if len(pathMask) > 0:
-    if arcpy.Exists(pathMask):
-        arcpy.env.mask = pathMask
-        arcpy.env.extent = pathMask
-    else:
-        arcpy.CheckInExtension("Spatial")
-        raise Exception("The nominated mask data set: ", pathMask, "doesn't eixist.  please correct the path to the mask and try again.")
+for season in lsSeasons:
+    if season not in dicSeason:
+        raise Exception("The season {} is not recognised.  Please use one of {}".format(season, list(dicSeason)))
+
+if strEngine == "arcpy":
+    import arcpy
+    #Note that existing files will be overwritten if they exist
+    arcpy.env.overwriteOutput = True
+
+    #SPATIAL ANALYSIS VARIABLES
+    arcpy.CheckOutExtension("Spatial")
+    #Default compression for GeoTIFFs
+    arcpy.env.compression = "LZ77"
+    #Tiled outputs with nearest neighbour pyramids so they are quick to read by window and to view
+    if blnCOG:
+        arcpy.env.tileSize = "512 512"
+        arcpy.env.pyramid = "PYRAMIDS -1 NEAREST DEFAULT 75 NO_SKIP"
+    #Ensure that NoData values set to 255 in outputs
+    arcpy.env.nodata = "MAXIMUM"
+    #Set workspace to the path to generate list of GeoTIFFs to be processed
+    arcpy.env.workspace = pathIn
+
+    #If there is a mask set by the user then set environment for that mask and its extent. 
+    if len(pathMask) > 0:
+        if arcpy.Exists(pathMask):
+            arcpy.env.mask = pathMask
+            arcpy.env.extent = pathMask
+        else:
+            arcpy.CheckInExtension("Spatial")
+            raise Exception("The nominated mask data set: ", pathMask, "doesn't eixist.  please correct the path to the mask and try again.")
         
-#Create a list of all Total Vegetative Cover percentage GeoTIFFs in the workspace   NOTE it is looking for *TVCpc.tif
-lsAllTVC = arcpy.ListDatasets("*TVCpc.tif")
+    #Create a list of all Total Vegetative Cover percentage GeoTIFFs in the workspace   NOTE it is looking for *TVCpc.tif
+    lsAllTVC = arcpy.ListDatasets("*TVCpc.tif")
+else:
+    import fgc_climatology
+    import fgc_common
+    import fgc_cube
+    import fgc_temporal
+    import fgc_tiles
+    fgc_common.set_output_format(strCompress, blnCOG)
+    if len(pathMask) > 0 and not os.path.exists(pathMask):
+        raise Exception("The nominated mask data set: ", pathMask, "doesn't eixist.  please correct the path to the mask and try again.")
+    #Create a list of all Total Vegetative Cover percentage GeoTIFFs in the folder   NOTE it is looking for *TVCpc.tif
+    #(or for the dima2 GeoTIFFs with blnFused)
+    lsAllTVC = sorted(fnmatch.filter(os.listdir(pathIn), fgc_common.DIMA2_PATTERN if blnFused else "*TVCpc.tif"))
 if len(lsAllTVC) == 0:
-    arcpy.CheckInExtension("Spatial")
+    if strEngine == "arcpy":
+        arcpy.CheckInExtension("Spatial")
     raise Exception("No Total Vegetation Cover GeoTIFFs exist in the directory {}".format(pathIn))
 
-#Create an empty list to which GeoTIFFs of interest will be added (in the year range and from the correct season)
-lsRas = []
-
-strYesMonth = dicSeason[seasonSingle]
-for i in range(yearStart,yearEnd + 1):
-    for a in lsAllTVC:
-        if str(i) == a[7:11] and a[11:13] == strYesMonth:
-            print("Adding the data set", a, "to the analysis")
-            lsRas.append(a)
+#Position of the year in the file names, acfgcs_YYYYMM... or lztmre_wa_mYYYYMM... with blnFused
+intP = 11 if blnFused else 7
+#Create a list for each season to which GeoTIFFs of interest will be added (in the year range and from the correct season)
+dicSeasonRas = {}
+#The image each season is compared against for the anomaly.  For seasons other than seasonSingle it is the
+#season in the year after yearEnd, if it exists.
+dicAnomalyImage = {}
+for season in lsSeasons:
+    lsRas = []
+    strYesMonth = dicSeason[season]
+    for i in range(yearStart,yearEnd + 1):
+        for a in lsAllTVC:
+            if str(i) == a[intP:intP + 4] and a[intP + 4:intP + 6] == strYesMonth:
+                print("Adding the data set", a, "to the analysis")
+                lsRas.append(a)
+    if len(lsRas) == 0:
+        if strEngine == "arcpy":
+            arcpy.CheckInExtension("Spatial")
+        raise Exception("No Total Vegetation Cover GeoTIFFs exist for that year date or for the season {}".format(season))          
+    dicSeasonRas[season] = lsRas
+    if season == seasonSingle:
+        dicAnomalyImage[season] = anomalyImage
+    else:
+        lsNext = [a for a in lsAllTVC if a[intP:intP + 4] == str(yearEnd + 1) and a[intP + 4:intP + 6] == strYesMonth]
+        dicAnomalyImage[season] = os.path.join(pathIn, lsNext[0]) if len(lsNext) > 0 else ""
             
 #Delete the list of all TVC GeoTIFFs
 del lsAllTVC
 
+lsRas = dicSeasonRas[lsSeasons[0]]
 lenLsRas = len(lsRas)
-if lenLsRas == 0:
-    arcpy.CheckInExtension("Spatial")
-    raise Exception("No Total Vegetation Cover GeoTIFFs exist for that year date or for the season {}".format(seasonSingle))          
 
 strSuffix = seasonSingle + str(yearStart) + "_to_" + str(yearEnd) + ".tif"
 
+#Colour maps for the outputs
+pathTVCmedianCol = r"C:\Projects\Remote_Sensing_Resource_Condition\fgc\layer_files\clr_TVC_median.clr"
+pathAnomalyCol = r"C:\Projects\Remote_Sensing_Resource_Condition\fgc\layer_files\clr_Anomaly.clr"
+pathValPixCol = r"C:\Projects\Remote_Sensing_Resource_Condition\fgc\layer_files\clr_ValPix.clr"
+pathBadYrRatCLR = r"C:\Projects\Remote_Sensing_Resource_Condition\fgc\layer_files\clr_BadYrRatio.clr"
 
+#The __main__ test stops worker processes on Windows (intWorkers > 1) from running the analysis again
+if strEngine == "gdal" and __name__ == "__main__":
+    #Read each block window of each GeoTIFF once and use it for every output of its season: the median, the
+    #anomaly, the valid year count and the bad year count and ratio for every threshold.  No temporary GeoTIFFs
+    #are needed.
+    dicSeasonPaths = {}
+    for season in lsSeasons:
+        blnMedian = len(dicSeasonRas[season]) >= 3
+        if blnMedian:
+            print("More than 3 Total Vegetation Cover GeoTIFFs for {}.  Calculating a MEDIAN and ANOMOLY rasters.".format(season))
+        dicSeasonPaths[season] = fgc_temporal.season_paths(pathOut, season, yearStart, yearEnd, lsThresholds, blnMedian,
+                                                          len(dicAnomalyImage[season]) > 0)
+    dicClr = {"median": pathTVCmedianCol, "anomaly": pathAnomalyCol, "valid": pathValPixCol, "ratio": pathBadYrRatCLR}
+    if blnClimatology:
+        #Add the new GeoTIFFs to (and take GeoTIFFs outside the year range out of) each season's climatology, then
+        #find the outputs from the climatology alone
+        if len(pathClimatology) == 0:
+            pathClimatology = os.path.join(pathOut, "climatology")
+        if not os.path.exists(pathClimatology):
+            os.makedirs(pathClimatology)
+        dicStore = {}
+        for season in lsSeasons:
+            with runLog.stage("climatology_update", season):
+                intAdded, intRemoved = fgc_climatology.update_climatology(pathClimatology, season,
+                                                                          [os.path.join(pathIn, a) for a in dicSeasonRas[season]], pathMask)
+            print("{} climatology: {} GeoTIFFs added and {} removed".format(season, intAdded, intRemoved))
+            dicStore[season] = fgc_climatology.store_paths(pathClimatology, season)[0]
+        with runLog.stage("climatology_products"):
+            fgc_climatology.climatology_products(dicStore, lsThresholds, dicSeasonPaths, dicAnomalyImage, dicClr)
+    elif intTileSize > 0:
+        #Run the extent tile by tile, skipping the tiles in the checkpoint, then mosaic the tiles
+        if len(pathTiles) == 0:
+            pathTiles = os.path.join(pathOut, "tiles")
+        intRun = fgc_tiles.tiled_season_products({season: [os.path.join(pathIn, a) for a in dicSeasonRas[season]] for season in lsSeasons},
+                                                 lsThresholds, dicSeasonPaths, pathTiles, pathMask, dicAnomalyImage, dicClr,
+                                                 pathCube, intTileSize, intWorkers, runLog=runLog)
+        print("{} tiles were run".format(intRun))
+    elif blnDask:
+        import fgc_lazy
+        #Every output of every season is one task graph over a chunked (time, y, x) stack of the GeoTIFFs
+        with runLog.stage("lazy_season_products"):
+            intChunks = fgc_lazy.lazy_season_products({season: [os.path.join(pathIn, a) for a in dicSeasonRas[season]] for season in lsSeasons},
+                                                      lsThresholds, dicSeasonPaths, pathMask, dicAnomalyImage, dicClr,
+                                                      intWorkers, intChunkSize)
+        print("{} chunks were computed".format(intChunks))
+    else:
+        with runLog.stage("season_products"):
+            fgc_temporal.season_products({season: [os.path.join(pathIn, a) for a in dicSeasonRas[season]] for season in lsSeasons},
+                                         lsThresholds, dicSeasonPaths, pathMask, dicAnomalyImage, dicClr,
+                                         fgc_cube.SeasonCube(pathCube) if len(pathCube) > 0 else None)
+    for season in lsSeasons:
+        print("Saved the {} data sets to:".format(season))
+        for value in dicSeasonPaths[season].values():
+            for pathProduct in (value.values() if isinstance(value, dict) else [value]):
+                print("   ", pathProduct)
+    del lsRas, dicSeasonRas
 
 #If the user wantes to assess the final raster/season agianst the range of seasons and years do the following.
 #If the user wantes to assess the final raster/season gaiants the range of seasons and years do the following.
-if lenLsRas >= 3:
+if strEngine == "arcpy" and lenLsRas >= 3:
     print("More than 3 Total Vegetation Cover GeoTIFFs in the selection.  Calculating a MEDIAN and ANOMOLY rasters.")
-    #Create a pixel by pixel median
-    rasMedian = arcpy.sa.CellStatistics(lsRas, statistics_type="MEDIAN", ignore_nodata="DATA")
-    
-##  Colour The Median
-    pathTVCmedianCol = r"C:\Projects\Remote_Sensing_Resource_Condition\fgc\layer_files\clr_TVC_median.clr"
-    arcpy.AddColormap_management(rasMedian, "#" , pathTVCmedianCol)
-
-    
-    
-    
-    #Create a raster of the last raster in the list which should be final one by date
-    pathMedian = os.path.join(pathOut, "median_" + strSuffix)
-    arcpy.CopyRaster_management(rasMedian, pathMedian, pixel_type="16_BIT_SIGNED", scale_pixel_value="NONE")
-    print("Saved the median data set to:", pathMedian)
-## JL2021
-    pathMedian8Bit = os.path.join(pathOut, "median8Bit_" + strSuffix)
-    arcpy.CopyRaster_management(rasMedian, pathMedian8Bit, pixel_type="8_BIT_UNSIGNED", scale_pixel_value="NONE")
-    print("Saved the 8Bit median data set to:", pathMedian8Bit)
-    
-    #JL2020 reference to new anomaly image
-    rasFinal = arcpy.sa.Int(anomalyImage)
-    #Original   rasFinal = arcpy.sa.Raster(str(lsRas[-1]))
-    #Calculate the Anomaly as the percentage of the final minus the median over the median.
-    rasAnomaly = arcpy.sa.Int(arcpy.sa.Float(rasFinal - rasMedian))
-    print("A0")
-    rasAnomaly8Bit = arcpy.sa.Int(arcpy.sa.Float(rasFinal - rasMedian + 100))
-    ##  Colour The 8Bit Anomaly
-    pathAnomalyCol = r"C:\Projects\Remote_Sensing_Resource_Condition\fgc\layer_files\clr_Anomaly.clr"
-    arcpy.AddColormap_management(rasAnomaly8Bit, "#" , pathAnomalyCol)
-    ###############Colour the Anomaly###############
-    
-    
-    #Original incorrect calculation   rasAnomaly = arcpy.sa.Int((arcpy.sa.Float(rasFinal - rasMedian) / arcpy.sa.Float(rasMedian)) * 100)
-    
-    #Delete the in memory median and Final
-    del rasMedian
-    del rasFinal
-    #Decide how to name the Anomaly whether it is by season or linear date 
-    pathAnomaly = os.path.join(pathOut, "anomaly_" + str(yearEnd + 1) +  strSuffix )
-    #Save the result to an 
-    arcpy.CopyRaster_management(rasAnomaly, pathAnomaly, pixel_type="16_BIT_SIGNED", scale_pixel_value="NONE")
-    print("Saved the anomaly data set to:", pathAnomaly)
-## JL2021    
-    pathAnomaly8Bit = os.path.join(pathOut, "Anomaly8Bit_" + str(yearEnd + 1) +  strSuffix )
-    print("A1")
-    arcpy.CopyRaster_management(rasAnomaly8Bit, pathAnomaly8Bit, pixel_type="8_BIT_UNSIGNED", scale_pixel_value="NONE")
-    print("Saved the 8bit anomaly data set to:", pathAnomaly8Bit)
-    
-    #Delete the in memory Anomaly raster
-    del rasAnomaly
-    del rasAnomaly8Bit
+    with runLog.stage("median_anomaly"):
+        pathMedian = os.path.join(pathOut, "median_" + strSuffix)
+        pathMedian8Bit = os.path.join(pathOut, "median8Bit_" + strSuffix)
+        #Decide how to name the Anomaly whether it is by season or linear date 
+        pathAnomaly = os.path.join(pathOut, "anomaly_" + str(yearEnd + 1) +  strSuffix )
+        pathAnomaly8Bit = os.path.join(pathOut, "Anomaly8Bit_" + str(yearEnd + 1) +  strSuffix )
+        #Create a pixel by pixel median
+        rasMedian = arcpy.sa.CellStatistics(lsRas, statistics_type="MEDIAN", ignore_nodata="DATA")
+
+    ##  Colour The Median
+        arcpy.AddColormap_management(rasMedian, "#" , pathTVCmedianCol)
+
+
+
+
+        #Create a raster of the last raster in the list which should be final one by date
+        arcpy.CopyRaster_management(rasMedian, pathMedian, pixel_type="16_BIT_SIGNED", scale_pixel_value="NONE")
+        print("Saved the median data set to:", pathMedian)
+    ## JL2021
+        arcpy.CopyRaster_management(rasMedian, pathMedian8Bit, pixel_type="8_BIT_UNSIGNED", scale_pixel_value="NONE")
+        print("Saved the 8Bit median data set to:", pathMedian8Bit)
+
+        #JL2020 reference to new anomaly image
+        rasFinal = arcpy.sa.Int(anomalyImage)
+        #Original   rasFinal = arcpy.sa.Raster(str(lsRas[-1]))
+        #Calculate the Anomaly as the percentage of the final minus the median over the median.
+        rasAnomaly = arcpy.sa.Int(arcpy.sa.Float(rasFinal - rasMedian))
+        print("A0")
+        rasAnomaly8Bit = arcpy.sa.Int(arcpy.sa.Float(rasFinal - rasMedian + 100))
+        ##  Colour The 8Bit Anomaly
+        arcpy.AddColormap_management(rasAnomaly8Bit, "#" , pathAnomalyCol)
+        ###############Colour the Anomaly###############
+
+
+        #Original incorrect calculation   rasAnomaly = arcpy.sa.Int((arcpy.sa.Float(rasFinal - rasMedian) / arcpy.sa.Float(rasMedian)) * 100)
+
+        #Delete the in memory median and Final
+        del rasMedian
+        del rasFinal
+        #Save the result to an 
+        arcpy.CopyRaster_management(rasAnomaly, pathAnomaly, pixel_type="16_BIT_SIGNED", scale_pixel_value="NONE")
+        print("Saved the anomaly data set to:", pathAnomaly)
+    ## JL2021    
+        print("A1")
+        arcpy.CopyRaster_management(rasAnomaly8Bit, pathAnomaly8Bit, pixel_type="8_BIT_UNSIGNED", scale_pixel_value="NONE")
+        print("Saved the 8bit anomaly data set to:", pathAnomaly8Bit)
+
+        #Delete the in memory Anomaly raster
+        del rasAnomaly
+        del rasAnomaly8Bit
 print("made anomaly and median TIF files")
 
 
-#Process to create number of valid years, Number of Bad years and Bad year ratio.
-#This process had to be modified to make batches of sites as it failed on JL machine.
-
-#Set the workspace to the output folder
-arcpy.env.workspace = pathOut
-#Intiate a counter that assesses if the image being processed is the first.  If so it becomes the output raster
-#If not then the current raster is added to the existing raster
-count = 0
-loop_counter = 0
-valid_temp_saves = 0
-temp_valid_list = []
-temp_bad_list = []
-#Iterate through the images of interest
-total_imgs = len(lsRas)
-true_count = 0
-for img in lsRas:
-    true_count+=1
-    #Create a raster object for the current GeoTIFF
-    rasCurrent = arcpy.sa.Raster(os.path.join(pathIn,img))
-    #Set the cellsize to match the current raster
-    arcpy.env.cellSize = rasCurrent
-    #Snap cells to match the current raster
-    arcpy.env.snapRaster = rasCurrent
+if strEngine == "arcpy":
+    #Process to create number of valid years, Number of Bad years and Bad year ratio.
+    #This process had to be modified to make batches of sites as it failed on JL machine.
+
+    #Set the workspace to the output folder
+    arcpy.env.workspace = pathOut
+    #Intiate a counter that assesses if the image being processed is the first.  If so it becomes the output raster
+    #If not then the current raster is added to the existing raster
+    count = 0
+    loop_counter = 0
+    valid_temp_saves = 0
+    temp_valid_list = []
+    temp_bad_list = []
+    #Iterate through the images of interest
+    total_imgs = len(lsRas)
+    true_count = 0
+    for img in lsRas:
+        true_count+=1
+        with runLog.stage("count", img):
+            #Create a raster object for the current GeoTIFF
+            rasCurrent = arcpy.sa.Raster(os.path.join(pathIn,img))
+            #Set the cellsize to match the current raster
+            arcpy.env.cellSize = rasCurrent
+            #Snap cells to match the current raster
+            arcpy.env.snapRaster = rasCurrent
     
-    #Do a binary reclassification of the current raster to identify NULL and Valid pixels
-    rasReclass = arcpy.sa.Con(arcpy.sa.IsNull(rasCurrent), 0 , 1)
-    #Do a binary reclassification of the current raster to identify pixels above (0) and below (1) the user nominated threshold percentage
-    rasCountBad = arcpy.sa.Con(arcpy.sa.IsNull(rasCurrent), 0, arcpy.sa.Con(rasCurrent <= intThreshold, 1, 0))
-    #User the initiated counter and if it the first iteration create the output raster based on the first input raster
-    print(img)
+            #Do a binary reclassification of the current raster to identify NULL and Valid pixels
+            rasReclass = arcpy.sa.Con(arcpy.sa.IsNull(rasCurrent), 0 , 1)
+            #Do a binary reclassification of the current raster to identify pixels above (0) and below (1) the user nominated threshold percentage
+            rasCountBad = arcpy.sa.Con(arcpy.sa.IsNull(rasCurrent), 0, arcpy.sa.Con(rasCurrent <= intThreshold, 1, 0))
+            #User the initiated counter and if it the first iteration create the output raster based on the first input raster
+            print(img)
  
 
-    if count == 0:
-        rasOutValid = rasReclass
-        rasOutBad  = rasCountBad
-        count = count + 1
-    #If it is not the first then add the current rasters to the final rasters.  Accumulating process.
-    else:
-        rasOutValid += rasReclass
-        rasOutBad += rasCountBad
-    #Delete the current rasters based n the input GeoTIFFs
-    del rasReclass
-    del rasCurrent
-    loop_counter = loop_counter + 1
-    print("finished lsrast loop",loop_counter) 
-
-##########  alter number to suit analysis  loop counter #########    
-# Change the loop counter to a max of 9 (on JL computer) to process all imagery in batches.    
-    if loop_counter == 6 or true_count == total_imgs:
+            if count == 0:
+                rasOutValid = rasReclass
+                rasOutBad  = rasCountBad
+                count = count + 1
+            #If it is not the first then add the current rasters to the final rasters.  Accumulating process.
+            else:
+                rasOutValid += rasReclass
+                rasOutBad += rasCountBad
+            #Delete the current rasters based n the input GeoTIFFs
+            del rasReclass
+            del rasCurrent
+            loop_counter = loop_counter + 1
+            print("finished lsrast loop",loop_counter) 
+
+        ##########  alter number to suit analysis  loop counter #########    
+        # Change the loop counter to a max of 9 (on JL computer) to process all imagery in batches.    
+            if loop_counter == 6 or true_count == total_imgs:
         
-        valid_temp_saves += 1
-        tempValidname = 'tempValid'+str(valid_temp_saves)+'.tif'
-        tempValidDir = os.path.join(pathOut, tempValidname)
-        print(tempValidDir)
+                valid_temp_saves += 1
+                tempValidname = 'tempValid'+str(valid_temp_saves)+'.tif'
+                tempValidDir = os.path.join(pathOut, tempValidname)
+                print(tempValidDir)
         
-        tempBadname = 'tempBad'+str(valid_temp_saves)+'.tif'
-        tempBadDir = os.path.join(pathOut, tempBadname)
-        print(tempBadDir)
+                tempBadname = 'tempBad'+str(valid_temp_saves)+'.tif'
+                tempBadDir = os.path.join(pathOut, tempBadname)
+                print(tempBadDir)
         
-        temp_valid_list.append(tempValidDir)
+                temp_valid_list.append(tempValidDir)
         
-        temp_bad_list.append(tempBadDir)
+                temp_bad_list.append(tempBadDir)
 
-        arcpy.CopyRaster_management(rasOutValid, tempValidDir, pixel_type="8_BIT_UNSIGNED", scale_pixel_value="NONE")
+                arcpy.CopyRaster_management(rasOutValid, tempValidDir, pixel_type="8_BIT_UNSIGNED", scale_pixel_value="NONE")
         
-        arcpy.CopyRaster_management(rasOutBad, tempBadDir, pixel_type="8_BIT_UNSIGNED", scale_pixel_value="NONE")
-
-
-        loop_counter = 0
-        count = 0
-
-del rasOutValid
-print(len(temp_valid_list),'file to combine')
-first = True
-for val in temp_valid_list:
-    rasCurrent = arcpy.sa.Raster(val)
-    arcpy.env.cellSize = rasCurrent
-    arcpy.env.snapRaster = rasCurrent
-    if first:
-        rasOutValid = rasCurrent
-        first = False
-    else:
-        rasOutValid += rasCurrent
+                arcpy.CopyRaster_management(rasOutBad, tempBadDir, pixel_type="8_BIT_UNSIGNED", scale_pixel_value="NONE")
+
+
+                loop_counter = 0
+                count = 0
+
+    #The batches are combined into the valid and bad year counts and the ratio
+    with runLog.stage("combine_ratio"):
+        del rasOutValid
+        print(len(temp_valid_list),'file to combine')
+        first = True
+        for val in temp_valid_list:
+            rasCurrent = arcpy.sa.Raster(val)
+            arcpy.env.cellSize = rasCurrent
+            arcpy.env.snapRaster = rasCurrent
+            if first:
+                rasOutValid = rasCurrent
+                first = False
+            else:
+                rasOutValid += rasCurrent
    
     
     
-print("finished entire lsrast loop")
-
-#Delete the list of rasters which were processed
-del lsRas
-print("Deleted lsras")
-#Set the workspace to the user identified folder where output rasters will be written
-arcpy.env.workspace = pathOut
-print("Env workspace is pathout")
-#Create an output pathway for the count of valid pixels
-pathValid = "validpixelcount_" + strSuffix
-print("pathvalid - next line is path valid text")
-print(pathValid)
-
-
-### Colour Vaid Pixel Image
-pathValPixCol = r"C:\Projects\Remote_Sensing_Resource_Condition\fgc\layer_files\clr_ValPix.clr"
-arcpy.AddColormap_management(rasOutValid, "#" , pathValPixCol)
-
-
-
-###############################################################################################################################
-#Save the count of valid pixels raster out to a GeoTIFF
-arcpy.CopyRaster_management(rasOutValid, pathValid, pixel_type="8_BIT_UNSIGNED", scale_pixel_value="NONE")
-print("Saved the count of seasons with valid pixels data set to:", pathValid)
-#Delete the in memory valid pixels raster.  This is somewhat redundant but it can help with out of memory issues
-del rasOutValid
-print("A-Delete Done") 
-#Create an output pathway for the count of valid pixels
-pathBad = "badyearcount_" + strSuffix
-print("B  pathBad")
-
-
-del rasOutBad
-print('finished val now doing bad')
-first = True
-for bad in temp_bad_list:
-    rasCurrent = arcpy.sa.Raster(bad)
-    arcpy.env.cellSize = rasCurrent
-    arcpy.env.snapRaster = rasCurrent
-    if first:
-       rasOutBad = rasCurrent 
-       first = False
-    else:   
-        rasOutBad += rasCurrent
+        print("finished entire lsrast loop")
+
+        #Delete the list of rasters which were processed
+        del lsRas
+        print("Deleted lsras")
+        #Set the workspace to the user identified folder where output rasters will be written
+        arcpy.env.workspace = pathOut
+        print("Env workspace is pathout")
+        #Create an output pathway for the count of valid pixels
+        pathValid = "validpixelcount_" + strSuffix
+        print("pathvalid - next line is path valid text")
+        print(pathValid)
+
+
+        ### Colour Vaid Pixel Image
+        arcpy.AddColormap_management(rasOutValid, "#" , pathValPixCol)
+
+
+
+        ###############################################################################################################################
+        #Save the count of valid pixels raster out to a GeoTIFF
+        arcpy.CopyRaster_management(rasOutValid, pathValid, pixel_type="8_BIT_UNSIGNED", scale_pixel_value="NONE")
+        print("Saved the count of seasons with valid pixels data set to:", pathValid)
+        #Delete the in memory valid pixels raster.  This is somewhat redundant but it can help with out of memory issues
+        del rasOutValid
+        print("A-Delete Done") 
+        #Create an output pathway for the count of valid pixels
+        pathBad = "badyearcount_" + strSuffix
+        print("B  pathBad")
+
+
+        del rasOutBad
+        print('finished val now doing bad')
+        first = True
+        for bad in temp_bad_list:
+            rasCurrent = arcpy.sa.Raster(bad)
+            arcpy.env.cellSize = rasCurrent
+            arcpy.env.snapRaster = rasCurrent
+            if first:
+               rasOutBad = rasCurrent 
+               first = False
+            else:   
+                rasOutBad += rasCurrent
   
 
 
 
-#Save the count of bad pixels raster out to a GeoTIFF
-arcpy.CopyRaster_management(rasOutBad, pathBad, pixel_type="8_BIT_UNSIGNED", scale_pixel_value="NONE")
-#print("C  copyRaster")
-print("Saved the count of seasons with pixels values below the nominated threshold data set to:", pathValid)
-#Delete the in memory valid pixels raster.  This is somewhat redundant but it can help with out of memory issues
-del rasOutBad
-print("D  DeleteOutBad")
-#Re-create the rasters in memory.  Again this could be considered redundant but it can help with out of memory issues
-rasBad = arcpy.sa.Raster(pathBad)
-print("B0")
-rasValid = arcpy.sa.Raster(pathValid)
-#
-#
-#Calculate a ratio of the number of bad years over the number of years of valid pixels
-#This ratio is in interger percentage values from 0 to 100.  Modify this block to have
-#it saved a a floating point raster.
-
-rasOutRatio = arcpy.sa.Int((arcpy.sa.Float(rasBad) / arcpy.sa.Float(rasValid)) * 100)
-pathBadYrRatCLR = r"C:\Projects\Remote_Sensing_Resource_Condition\fgc\layer_files\clr_BadYrRatio.clr"
-arcpy.AddColormap_management(rasOutRatio, "#" , pathBadYrRatCLR)
-print("Colours added to Bad Yr Ratio")
-
-#Create a path to save the ratio dataset out to.
-pathRatio = "badyearratio_" + str(intThreshold) + "pc_" + strSuffix
-#Save out the ratio raster to a ratio raster.  Remember this is an integer value
-#between 0 and 100.
-arcpy.CopyRaster_management(rasOutRatio, pathRatio, pixel_type="8_BIT_UNSIGNED", scale_pixel_value="NONE")
-print("Saved the ratio of seasons below threshold over all seasons with valida pixels values to:", pathRatio)
-#Progress print
-print(pathValid, " / ", pathBad, " = ", pathRatio)
-#Delete the in memory rasters
-del rasOutRatio, rasBad, rasValid
-print("Completed!")
-#Check the Spatial Analyst Extension back in.
-arcpy.CheckInExtension("Spatial")
+        #Save the count of bad pixels raster out to a GeoTIFF
+        arcpy.CopyRaster_management(rasOutBad, pathBad, pixel_type="8_BIT_UNSIGNED", scale_pixel_value="NONE")
+        #print("C  copyRaster")
+        print("Saved the count of seasons with pixels values below the nominated threshold data set to:", pathValid)
+        #Delete the in memory valid pixels raster.  This is somewhat redundant but it can help with out of memory issues
+        del rasOutBad
+        print("D  DeleteOutBad")
+        #Re-create the rasters in memory.  Again this could be considered redundant but it can help with out of memory issues
+        rasBad = arcpy.sa.Raster(pathBad)
+        print("B0")
+        rasValid = arcpy.sa.Raster(pathValid)
+        #
+        #
+        #Calculate a ratio of the number of bad years over the number of years of valid pixels
+        #This ratio is in interger percentage values from 0 to 100.  Modify this block to have
+        #it saved a a floating point raster.
+
+        rasOutRatio = arcpy.sa.Int((arcpy.sa.Float(rasBad) / arcpy.sa.Float(rasValid)) * 100)
+        arcpy.AddColormap_management(rasOutRatio, "#" , pathBadYrRatCLR)
+        print("Colours added to Bad Yr Ratio")
+
+        #Create a path to save the ratio dataset out to.
+        pathRatio = "badyearratio_" + str(intThreshold) + "pc_" + strSuffix
+        #Save out the ratio raster to a ratio raster.  Remember this is an integer value
+        #between 0 and 100.
+        arcpy.CopyRaster_management(rasOutRatio, pathRatio, pixel_type="8_BIT_UNSIGNED", scale_pixel_value="NONE")
+        print("Saved the ratio of seasons below threshold over all seasons with valida pixels values to:", pathRatio)
+        #Progress print
+        print(pathValid, " / ", pathBad, " = ", pathRatio)
+        #Delete the in memory rasters
+        del rasOutRatio, rasBad, rasValid
+    print("Completed!")
+    #Check the Spatial Analyst Extension back in.
+    arcpy.CheckInExtension("Spatial")
 print("Processing is complete. Median, Anomlay, valid pixel count bad year count and bad year ratio complete")
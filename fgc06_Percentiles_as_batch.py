@@ -3,59 +3,90 @@
 Created on Thu Sep  9 10:55:13 2021
 
 @author: Justin Laycock
+
+Calculates the statistics in lsStats (percentiles and moments) of every GeoTIFF in a directory for a Box and
+Whisker plot and writes them to a single table with one row per file and statistic (FileN, Stats, value).
+With strEngine = "histogram" each raster is read once, one block window at a time, into a histogram of its pixel
+values (see fgc_histogram.py), which gives every statistic exactly in constant memory.  Files are spread across
+intWorkers processes.  strEngine = "numpy" loads each whole raster into memory as the script originally did.
+If pathCube is a season cube built by fgc03 (see fgc_cube.py) the "histogram" engine summarises every season of
+the cube instead of the GeoTIFFs in directory, reading the aligned and masked .npy slices directly.
+With blnTimings = True the wall time, bytes read and written, block windows and peak memory of summarising each
+file are written as JSON lines to fgc06_timings.jsonl beside pathCsv (see fgc_instrument.py).  If pathProfile is
+given each file is also profiled with cProfile.
+The "histogram" engine summarises a raw AusCover dima2 GeoTIFF (lztmre_wa_*dima2.tif) in directory as its Total
+Vegetation Cover, found from Bands 2 and 3 as each block window is read (see fgc_common.FusedTVCBand).
 """
 import os
 import numpy as np
 import gdal
 from osgeo import gdal_array
 import csv
+import fgc_common
+import fgc_cube
+import fgc_histogram
+import fgc_instrument
 #import rioxarray as rxr
 
 directory = r'C:\Projects\Remote_Sensing_Resource_Condition\FGC\data\TVC_satellite\SW_TVC\Masked_Clipped'
 # mask = r'C:\Projects\Remote_Sensing_Resource_Condition\FGC\data\out\Percentile\arable'
 # dirsave = r'C:\Projects\Remote_Sensing_Resource_Condition\FGC\data\out\Percentile'
+# "histogram" = block streamed histogram (exact, constant memory), "numpy" = load the whole raster
+strEngine = "histogram"
+# Output table with one row per file and statistic
+pathCsv = 'mean5_95.csv'
+# Statistics to calculate.  Numbers are percentiles, names can be 'mean', 'max', 'min', 'STdev', 'count' or 'median'
+lsStats = ['mean', 'max', 'min', 'STdev', 5, 10, 25, 50, 75, 90, 95]
+# Number of worker processes used to summarise files in parallel ("histogram" engine only)
+intWorkers = 1
+# Folder of a season cube built by fgc03 to summarise instead of directory, or "" to read the GeoTIFFs ("histogram" engine only)
+pathCube = r""
+# Write the time, I/O and memory of summarising each file to fgc06_timings.jsonl beside pathCsv (True/False)
+blnTimings = True
+# Folder for cProfile statistics of each file.  "" = no profiling
+pathProfile = r""
 
 print(os.listdir(directory))
+lsFiles = [os.path.join(directory, filename) for filename in sorted(os.listdir(directory)) if filename.endswith(".tif")]
+if strEngine == "histogram" and len(pathCube) > 0:
+    lsFiles = fgc_cube.SeasonCube(pathCube).lsNames
 
-with open('mean5_95.csv', 'w', newline='') as csvfile:
-    for filename in os.listdir(directory):
-        if filename.endswith(".tif"):
-            rasterfile = os.path.join(directory, filename)
+# The __main__ test stops worker processes on Windows from starting the batch again
+if __name__ == "__main__":
+    runLog = fgc_instrument.RunLog(os.path.join(os.path.dirname(os.path.abspath(pathCsv)), 'fgc06_timings.jsonl') if blnTimings else '',
+                                   'fgc06', pathProfile)
+    if strEngine == "histogram" and len(pathCube) > 0:
+        # Each season is one contiguous .npy slice of the cube
+        lsResults = fgc_common.run_parallel(fgc_cube.season_statistics, [(pathCube, strName, lsStats) for strName in lsFiles],
+                                            intWorkers, lsLabels=lsFiles, runLog=runLog, strStage='statistics')
+    elif strEngine == "histogram":
+        # Every statistic for a file comes from one read of that file
+        lsResults = fgc_common.run_parallel(fgc_histogram.raster_statistics, [(rasterfile, lsStats) for rasterfile in lsFiles],
+                                            intWorkers, lsLabels=lsFiles, runLog=runLog, strStage='statistics')
+    else:
+        dicNumpy = {'mean': np.nanmean, 'max': np.nanmax, 'min': np.nanmin, 'STdev': np.nanstd,
+                    'count': lambda arr: np.count_nonzero(~np.isnan(arr)), 'median': np.nanmedian}
+        lsResults = []
+        for rasterfile in lsFiles:
             print('\nFull File Name & Path =  ' + rasterfile)
+            with runLog.stage('statistics', rasterfile):
             
-            rasterArray = gdal_array.LoadFile(rasterfile) #Read raster as numpy array
+                rasterArray = gdal_array.LoadFile(rasterfile).astype(np.float64) #Read raster as numpy array (float so it can hold nan)
     
-            ras = gdal.Open(rasterfile) # opening the raster file with its metadata
-            NoData = ras.GetRasterBand(1).GetNoDataValue() # reading the nodata value of the raster
-            print('nodata value is: '+str(NoData)) # printing the nodata value
-            
-            rasterArray[rasterArray==NoData] = np.nan # changing all nodata pixels values to nan
-            
-            # print('mean = {}'.format(np.nanmean(rasterArray)))
-            # print('median = {}'.format(np.nanmedian(rasterArray)))
-            # print('max = {}'.format(np.nanmax(rasterArray)))
-            # print('min = {}'.format(np.nanmin(rasterArray)))
-            # print('count = {}'.format(np.count_nonzero(np.isnan(rasterArray))))
-            # print('SDDev = {}'.format(np.nanstd(rasterArray)))
-        
-
-            fieldnames = ['FileN','Stats', 'value' ]
-            writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-        
-            writer.writeheader()
-            # writer.writerow({'FileN': rasterfile, 'Stats': 'mean', 'value': np.nanmean(rasterArray)})
-            # writer.writerow({'FileN': rasterfile, 'Stats': 'max', 'value': np.nanmax(rasterArray)})
-            # writer.writerow({'FileN': rasterfile, 'Stats': 'min', 'value': np.nanmin(rasterArray)})
-            # writer.writerow({'FileN': rasterfile, 'Stats': 'STdev', 'value': np.nanstd(rasterArray)})
-            
-            # writer.writerow({'FileN': rasterfile, 'Stats': '10pc', 'value': np.nanpercentile(rasterArray,10)})
-            # writer.writerow({'FileN': rasterfile, 'Stats': '25pc', 'value': np.nanpercentile(rasterArray,25)})
-            # writer.writerow({'FileN': rasterfile, 'Stats': '50pc', 'value': np.nanpercentile(rasterArray,50)})
-            # writer.writerow({'FileN': rasterfile, 'Stats': '75pc', 'value': np.nanpercentile(rasterArray,75)})
-            # writer.writerow({'FileN': rasterfile, 'Stats': '90pc', 'value': np.nanpercentile(rasterArray,90)})
-            ##### calculating the 5th and 95th percentiles
-            writer.writerow({'FileN': rasterfile, 'Stats': '5pc', 'value': np.nanpercentile(rasterArray,5)})
-            writer.writerow({'FileN': rasterfile, 'Stats': '95pc', 'value': np.nanpercentile(rasterArray,95)})
+                ras = gdal.Open(rasterfile) # opening the raster file with its metadata
+                NoData = ras.GetRasterBand(1).GetNoDataValue() # reading the nodata value of the raster
+                print('nodata value is: '+str(NoData)) # printing the nodata value
             
+                rasterArray[rasterArray==NoData] = np.nan # changing all nodata pixels values to nan
+                lsResults.append([(fgc_histogram.stat_name(stat), dicNumpy[stat](rasterArray) if isinstance(stat, str) else np.nanpercentile(rasterArray, stat))
+                                  for stat in lsStats])
             print('.._..')
-    print('__Complete__')    
+
+    with open(pathCsv, 'w', newline='') as csvfile:
+        fieldnames = ['FileN','Stats', 'value' ]
+        writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
+        writer.writeheader()
+        for rasterfile, lsFileStats in zip(lsFiles, lsResults):
+            for strStat, value in lsFileStats:
+                writer.writerow({'FileN': rasterfile, 'Stats': strStat, 'value': value})
+    print('__Complete__')
@@ -0,0 +1,300 @@
+"""
+Created For: Department of Primary Industries and Regional Development, Western Australia
+Date: October 2026
+Purpose: Benchmark the GDAL/numpy engines of fgc03 to fgc06 on synthetic inputs (see fgc_synthetic.py) so that
+         changes and engines can be compared on the same data.
+
+         For each grid size in lsSizes a set of synthetic inputs is written (or reused from an earlier run) and each
+         stage in lsStages is run in a new process.  The wall time, the number of input pixels processed per second
+         and the peak resident memory (RSS) of the process are printed and written to a table (pathResults) with one
+         row per size and stage.  Worker processes started by a stage are not part of the peak RSS of its own
+         process, so the largest peak RSS of one of them is also reported (peak_child_rss_mb, 0 without workers).
+         The threads of fgc05_dask are part of the stage's own process.  The stages are:
+                  fgc03                 convert every dima2 GeoTIFF to PVpc, NPVpc and TVCpc (with the mask)
+                  fgc03_cube            build the aligned season cube from the TVCpc GeoTIFFs
+                  fgc04                 rasterise the zones and tabulate every TVCpc GeoTIFF by zone
+                  fgc05                 every season's median, anomaly and year counts from the GeoTIFFs
+                  fgc05_cube            the same outputs read from the season cube (needs fgc03_cube)
+                  fgc05_climatology     build each season's climatology and find the outputs from it
+                  fgc05_climatology_update
+                                        add the latest year to each season's climatology (built from the earlier
+                                        years before the stage is timed, but within its peak memory) and find the
+                                        outputs from it, the quarterly update that replaces the fgc05 stage
+                  fgc05_fused           the fgc05 outputs read straight from the dima2 GeoTIFFs (no TVCpc GeoTIFFs)
+                  fgc05_dask            the fgc05 outputs as one dask task graph on intDaskWorkers threads (needs
+                                        dask and xarray, so it is not in the default lsStages)
+                  fgc06                 histogram statistics of every TVCpc GeoTIFF
+         Pixels are counted as the grid size squared times the number of images the stage reads.  Outputs are
+         written to a folder for each stage, which is emptied before the stage is run.
+
+NOTE:
+This script requires the osgeo (GDAL) and numpy packages and does not need arcpy.  Peak memory is read with the
+resource module so the script only runs on Linux (and other Unix systems).  Each stage starts from a fresh process,
+so the peak memory includes the imported packages (a little over 100 MB).
+
+This script is in development and care should be taken when using.
+
+No guarentees are given and users should do their own validation.
+"""
+#Import necessary packages
+import concurrent.futures
+import csv
+import json
+import multiprocessing
+import os
+import resource
+import shutil
+import tempfile
+import time
+
+from osgeo import gdal
+
+import fgc_climatology
+import fgc_common
+import fgc_cube
+import fgc_histogram
+import fgc_synthetic
+import fgc_temporal
+import fgc_zones
+
+#USER DEFINED VARIABLES
+##################################################################################################################
+#Folder where the synthetic inputs and stage outputs are written.  Leave empty to use fgc_benchmark in the temporary folder
+pathBench = r""
+#Width and height in pixels of the synthetic grids
+lsSizes = [512, 2048, 4096]
+#Number of years of synthetic seasons
+intYears = 10
+#Stages to run, in order
+lsStages = ["fgc03", "fgc03_cube", "fgc04", "fgc05", "fgc05_cube", "fgc05_climatology", "fgc05_climatology_update",
+            "fgc05_fused", "fgc06"]
+#Table of results.  Leave empty to write benchmark_results.csv in pathBench
+pathResults = r""
+#Worker threads of the fgc05_dask stage
+intDaskWorkers = 4
+#GDAL block cache of each stage process in megabytes
+intGdalCacheMB = 256
+#Random seed of the synthetic inputs
+intSeed = 0
+##################################################################################################################
+
+#Thresholds, class breaks and statistics used by the stages, the same as the defaults of the scripts
+lsThresholds = [50]
+lsTVCThreshold = [10, 20, 30, 40, 50, 60, 70, 80, 90]
+lsStats = ['mean', 'max', 'min', 'STdev', 5, 10, 25, 50, 75, 90, 95]
+
+
+def _pixels(dicInputs, strKey):
+    dsRef = gdal.Open(dicInputs[strKey][0])
+    return dsRef.RasterXSize * dsRef.RasterYSize * len(dicInputs[strKey])
+
+
+def _season_inputs(dicInputs, strKey="tvc"):
+    """The TVCpc (or dima2) GeoTIFFs of each season (every year but the last) and the anomaly image of each season (the last year)."""
+    dicSeasonRas = {}
+    dicAnomalyImage = {}
+    for strSeason, intMonth in fgc_synthetic.SEASON_MONTHS.items():
+        lsRas = [pathRas for pathRas in dicInputs[strKey] if int(fgc_common.tvc_name(pathRas)[11:13]) == intMonth]
+        if len(lsRas) == 0:
+            continue
+        dicSeasonRas[strSeason] = lsRas[:-1]
+        dicAnomalyImage[strSeason] = lsRas[-1]
+    return dicSeasonRas, dicAnomalyImage
+
+
+def _season_paths(pathOut, dicSeasonRas):
+    dicSeasonPaths = {}
+    for strSeason, lsRas in dicSeasonRas.items():
+        yearStart, yearEnd = int(fgc_common.tvc_name(lsRas[0])[7:11]), int(fgc_common.tvc_name(lsRas[-1])[7:11])
+        dicSeasonPaths[strSeason] = fgc_temporal.season_paths(pathOut, strSeason, yearStart, yearEnd, lsThresholds, len(lsRas) >= 3)
+    return dicSeasonPaths
+
+
+def stage_fgc03(dicInputs, pathOut):
+    for pathImg in dicInputs["dima2"]:
+        fgc_common.convert_fgc_season(pathImg, pathOut, dicInputs["mask"])
+    return _pixels(dicInputs, "dima2")
+
+
+def stage_fgc03_cube(dicInputs, pathOut):
+    fgc_cube.build_cube(dicInputs["cube"], dicInputs["tvc"], dicInputs["mask"])
+    return _pixels(dicInputs, "tvc")
+
+
+def stage_fgc04(dicInputs, pathOut):
+    pathCache = os.path.join(pathOut, "zone_cache")
+    pathZones, lsZoneNames = fgc_zones.cached_zones(dicInputs["zones"], "mu_name", dicInputs["tvc"][0], dicInputs["mask"], pathCache)
+    ls2 = fgc_zones.threshold_classes(lsTVCThreshold)
+    valCellArea = fgc_synthetic.CELL_SIZE * fgc_synthetic.CELL_SIZE
+    for pathTVC in dicInputs["tvc"]:
+        pathThreshold = os.path.join(pathOut, os.path.basename(pathTVC)[:-9] + "tvcth.tif")
+        fgc_zones.tabulate_season(pathTVC, pathZones, lsZoneNames, ls2, "mu_name", valCellArea, pathCache, pathThreshold)
+    return _pixels(dicInputs, "tvc")
+
+
+def stage_fgc05(dicInputs, pathOut):
+    dicSeasonRas, dicAnomalyImage = _season_inputs(dicInputs)
+    fgc_temporal.season_products(dicSeasonRas, lsThresholds, _season_paths(pathOut, dicSeasonRas), dicInputs["mask"], dicAnomalyImage)
+    return sum(_pixels({"tvc": lsRas}, "tvc") for lsRas in dicSeasonRas.values())
+
+
+def _built_cube(dicInputs):
+    """The season cube of the inputs.  It must exist and have been built from the current TVCpc GeoTIFFs of the inputs
+    (e.g. by the fgc03_cube stage), so a cube left from other inputs is never read."""
+    if not os.path.exists(os.path.join(dicInputs["cube"], fgc_cube.CUBE_INDEX)):
+        raise Exception("There is no season cube in {}.  Please run the fgc03_cube stage first".format(dicInputs["cube"]))
+    cube = fgc_cube.SeasonCube(dicInputs["cube"])
+    dicBuilt = {os.path.abspath(dicTime["path"]): dicTime["signature"] for dicTime in cube.lsTimes}
+    for pathTVC in dicInputs["tvc"]:
+        dicSignature = dicBuilt.pop(os.path.abspath(pathTVC), None)
+        statTVC = os.stat(pathTVC)
+        if dicSignature is None or dicSignature["size"] != statTVC.st_size or dicSignature["mtime"] != statTVC.st_mtime:
+            raise Exception("The season cube in {} was built from other inputs.  Please run the fgc03_cube stage first".format(dicInputs["cube"]))
+    if len(dicBuilt) > 0:
+        raise Exception("The season cube in {} was built from other inputs.  Please run the fgc03_cube stage first".format(dicInputs["cube"]))
+    return cube
+
+
+def stage_fgc05_cube(dicInputs, pathOut):
+    dicSeasonRas, dicAnomalyImage = _season_inputs(dicInputs)
+    fgc_temporal.season_products(dicSeasonRas, lsThresholds, _season_paths(pathOut, dicSeasonRas), "", dicAnomalyImage,
+                                 cube=_built_cube(dicInputs))
+    return sum(_pixels({"tvc": lsRas}, "tvc") for lsRas in dicSeasonRas.values())
+
+
+def stage_fgc05_climatology(dicInputs, pathOut):
+    dicSeasonRas, dicAnomalyImage = _season_inputs(dicInputs)
+    dicStore = {}
+    for strSeason, lsRas in dicSeasonRas.items():
+        fgc_climatology.update_climatology(pathOut, strSeason, lsRas, dicInputs["mask"])
+        dicStore[strSeason] = fgc_climatology.store_paths(pathOut, strSeason)[0]
+    fgc_climatology.climatology_products(dicStore, lsThresholds, _season_paths(pathOut, dicSeasonRas), dicAnomalyImage)
+    return sum(_pixels({"tvc": lsRas}, "tvc") for lsRas in dicSeasonRas.values())
+
+
+def setup_fgc05_climatology_update(dicInputs, pathOut):
+    dicSeasonRas, dicAnomalyImage = _season_inputs(dicInputs)
+    for strSeason, lsRas in dicSeasonRas.items():
+        fgc_climatology.update_climatology(pathOut, strSeason, lsRas[:-1], dicInputs["mask"])
+
+
+def stage_fgc05_climatology_update(dicInputs, pathOut):
+    dicSeasonRas, dicAnomalyImage = _season_inputs(dicInputs)
+    dicStore = {}
+    for strSeason, lsRas in dicSeasonRas.items():
+        fgc_climatology.update_climatology(pathOut, strSeason, lsRas, dicInputs["mask"])
+        dicStore[strSeason] = fgc_climatology.store_paths(pathOut, strSeason)[0]
+    fgc_climatology.climatology_products(dicStore, lsThresholds, _season_paths(pathOut, dicSeasonRas), dicAnomalyImage)
+    #Only the latest GeoTIFF of each season is read
+    return sum(_pixels({"tvc": lsRas[-1:]}, "tvc") for lsRas in dicSeasonRas.values())
+
+
+def stage_fgc05_fused(dicInputs, pathOut):
+    dicSeasonRas, dicAnomalyImage = _season_inputs(dicInputs, "dima2")
+    fgc_temporal.season_products(dicSeasonRas, lsThresholds, _season_paths(pathOut, dicSeasonRas), dicInputs["mask"], dicAnomalyImage)
+    return sum(_pixels({"dima2": lsRas}, "dima2") for lsRas in dicSeasonRas.values())
+
+
+def stage_fgc05_dask(dicInputs, pathOut):
+    import fgc_lazy
+    dicSeasonRas, dicAnomalyImage = _season_inputs(dicInputs)
+    fgc_lazy.lazy_season_products(dicSeasonRas, lsThresholds, _season_paths(pathOut, dicSeasonRas), dicInputs["mask"], dicAnomalyImage,
+                                  intWorkers=intDaskWorkers)
+    return sum(_pixels({"tvc": lsRas}, "tvc") for lsRas in dicSeasonRas.values())
+
+
+def stage_fgc06(dicInputs, pathOut):
+    for pathTVC in dicInputs["tvc"]:
+        fgc_histogram.raster_statistics(pathTVC, lsStats)
+    return _pixels(dicInputs, "tvc")
+
+
+#Function of each stage.  Each is given the dictionary of inputs and an empty output folder and returns the pixels read.
+STAGES = {"fgc03": stage_fgc03, "fgc03_cube": stage_fgc03_cube, "fgc04": stage_fgc04, "fgc05": stage_fgc05,
+          "fgc05_cube": stage_fgc05_cube, "fgc05_climatology": stage_fgc05_climatology,
+          "fgc05_climatology_update": stage_fgc05_climatology_update, "fgc05_fused": stage_fgc05_fused,
+          "fgc05_dask": stage_fgc05_dask, "fgc06": stage_fgc06}
+#Function run before a stage is timed, given the same arguments as the stage
+SETUPS = {"fgc05_climatology_update": setup_fgc05_climatology_update}
+
+
+def measure_stage(strStage, dicInputs, pathOut, intCacheMB):
+    """Run one stage and return (pixels, seconds, peak RSS in MB, largest peak RSS of a worker process in MB).  Called in
+    a new process for each stage.  The workers are only counted once they have finished, which is the case when a stage
+    returns (0 if the stage has no workers)."""
+    gdal.SetCacheMax(intCacheMB * 1024 * 1024)
+    if strStage in SETUPS:
+        SETUPS[strStage](dicInputs, pathOut)
+    timeStart = time.perf_counter()
+    intPixels = STAGES[strStage](dicInputs, pathOut)
+    valSeconds = time.perf_counter() - timeStart
+    #ru_maxrss is in kilobytes on Linux
+    return (intPixels, valSeconds, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0,
+            resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024.0)
+
+
+def synthetic_inputs(pathDir, intSize):
+    """Write the synthetic inputs for a size, or reuse them if they were written by an earlier run with the same settings."""
+    pathIndex = os.path.join(pathDir, "inputs.json")
+    dicSettings = {"size": intSize, "years": intYears, "seed": intSeed}
+    if os.path.exists(pathIndex):
+        with open(pathIndex, "r") as fin:
+            dicIndex = json.load(fin)
+        if dicIndex["settings"] == dicSettings:
+            return dicIndex["inputs"]
+    if os.path.exists(pathDir):
+        shutil.rmtree(pathDir)
+    timeStart = time.perf_counter()
+    dicInputs = fgc_synthetic.make_inputs(pathDir, intSize, intYears, intSeed=intSeed)
+    print("Wrote the {0} x {0} synthetic inputs in {1:.1f} s".format(intSize, time.perf_counter() - timeStart))
+    with open(pathIndex, "w") as fout:
+        json.dump({"settings": dicSettings, "inputs": dicInputs}, fout, indent=1)
+    return dicInputs
+
+
+if __name__ == "__main__":
+    for strStage in lsStages:
+        if strStage not in STAGES:
+            raise Exception("The stage {} is not recognised.  Please use some of {}".format(strStage, list(STAGES)))
+    if len(pathBench) == 0:
+        pathBench = os.path.join(tempfile.gettempdir(), "fgc_benchmark")
+    if len(pathResults) == 0:
+        pathResults = os.path.join(pathBench, "benchmark_results.csv")
+    if not os.path.exists(pathBench):
+        os.makedirs(pathBench)
+
+    lsRows = []
+    #A spawned process starts without the memory of this one, so its peak RSS is that of the stage alone
+    contextSpawn = multiprocessing.get_context("spawn")
+    for intSize in lsSizes:
+        pathSize = os.path.join(pathBench, "size_{}".format(intSize))
+        dicInputs = synthetic_inputs(os.path.join(pathSize, "inputs"), intSize)
+        dicInputs["cube"] = os.path.join(pathSize, "cube")
+        for strStage in lsStages:
+            pathStageOut = os.path.join(pathSize, strStage)
+            if os.path.exists(pathStageOut):
+                shutil.rmtree(pathStageOut)
+            os.makedirs(pathStageOut)
+            if strStage == "fgc03_cube" and os.path.exists(dicInputs["cube"]):
+                shutil.rmtree(dicInputs["cube"])
+            with concurrent.futures.ProcessPoolExecutor(max_workers=1, mp_context=contextSpawn) as pool:
+                try:
+                    intPixels, valSeconds, valPeakMB, valChildPeakMB = pool.submit(measure_stage, strStage, dicInputs, pathStageOut, intGdalCacheMB).result()
+                except Exception as error:
+                    print("{:>6} {:<18} FAILED: {}".format(intSize, strStage, error))
+                    lsRows.append({"size": intSize, "stage": strStage, "pixels": "", "seconds": "", "pixels_per_second": "",
+                                   "peak_rss_mb": "", "peak_child_rss_mb": "", "error": str(error)})
+                    continue
+            dicRow = {"size": intSize, "stage": strStage, "pixels": intPixels, "seconds": round(valSeconds, 3),
+                      "pixels_per_second": round(intPixels / valSeconds) if valSeconds > 0 else "",
+                      "peak_rss_mb": round(valPeakMB, 1), "peak_child_rss_mb": round(valChildPeakMB, 1), "error": ""}
+            print("{:>6} {:<18} {:>8.2f} s {:>14,.0f} pixels/s {:>9.1f} MB peak RSS {:>9.1f} MB worker peak RSS".format(
+                intSize, strStage, valSeconds, intPixels / max(valSeconds, 1e-9), valPeakMB, valChildPeakMB))
+            lsRows.append(dicRow)
+
+    with open(pathResults, "w", newline="") as csvfile:
+        writer = csv.DictWriter(csvfile, fieldnames=["size", "stage", "pixels", "seconds", "pixels_per_second", "peak_rss_mb",
+                                                    "peak_child_rss_mb", "error"])
+        writer.writeheader()
+        writer.writerows(lsRows)
+    print("Results written to", pathResults)
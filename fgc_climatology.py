@@ -0,0 +1,198 @@
+"""
+Created For: Department of Primary Industries and Regional Development, Western Australia
+Date: October 2026
+Purpose: A persistent per pixel climatology for fgc05, so that adding a new season does not mean reading every
+         earlier season again.
+
+         For each season (Summer, Autumn, Winter, Spring) the store holds, for every pixel, the number of years
+         at each TVC value from 0 to 100.  It is a 102 band unsigned 8 bit GeoTIFF, climatology_<season>.tif:
+                  bands 1 to 101 = count of years with TVC 0 to 100
+                  band 102       = 1 inside the mask, 0 outside
+         Most counts are 0 so the DEFLATE compressed store is small.  climatology_<season>.json beside it lists the
+         GeoTIFFs that have been added, with their size, modification time and content hash (see fgc_manifest).
+
+         update_climatology compares the GeoTIFFs selected for a season with those in the store.  New GeoTIFFs are
+         added and GeoTIFFs no longer selected (e.g. when yearStart moves forward) are removed, so only those
+         GeoTIFFs are read.  The store is updated in place and only the bands of the TVC values found in the added
+         or removed GeoTIFFs are read and written.  The store is rebuilt (to a temporary GeoTIFF that then replaces
+         it) from all of the selected GeoTIFFs if a stored GeoTIFF has changed or is missing, or the mask or grid is
+         different.
+
+         The valid year count, the bad year count and ratio for any threshold and the median (and so the anomaly)
+         are all found from the cumulative counts, without reading the seasonal GeoTIFFs.  The results are the
+         same as fgc_temporal.season_products.
+
+NOTE:
+This module requires the osgeo (GDAL) and numpy packages.  A season can hold at most 255 years.  GDAL appends the
+rewritten compressed blocks of an update to the end of the store, so the store grows by the blocks written at each
+update until it is rebuilt.
+
+This script is in development and care should be taken when using.
+
+No guarentees are given and users should do their own validation.
+"""
+#Import necessary packages
+import json
+import os
+
+import numpy as np
+from osgeo import gdal
+
+import fgc_common
+import fgc_manifest
+import fgc_temporal
+
+#Number of TVC values (0 to 100) counted for each pixel
+HIST_BINS = 101
+#Band of the store that holds the mask
+MASK_BAND = HIST_BINS + 1
+
+
+def store_paths(pathStore, strSeason):
+    """Return the pathways of the GeoTIFF and .json of the store for one season."""
+    return (os.path.join(pathStore, "climatology_" + strSeason + ".tif"),
+            os.path.join(pathStore, "climatology_" + strSeason + ".json"))
+
+
+def fold_season(arrHist, arrValues, blnAdd=True):
+    """Add (or remove) one season's uint8 values to the per pixel counts arrHist (bins, rows, columns) in place.
+    arrHist can be signed to hold the change in the counts.
+
+    Values above 100 (NoData) are not counted.
+    """
+    arrFlat = arrHist.reshape(HIST_BINS, -1)
+    arrValues = arrValues.ravel()
+    arrPixels = np.flatnonzero(arrValues < HIST_BINS)
+    #Each pixel has one value so no (bin, pixel) pair is repeated and fancy indexing can be used to add
+    if blnAdd:
+        arrFlat[arrValues[arrPixels], arrPixels] += 1
+    else:
+        arrFlat[arrValues[arrPixels], arrPixels] -= 1
+
+
+def histogram_statistics(arrHist, lsThreshold):
+    """Return (valid count, {threshold: bad count}, twice the unrounded median) from per pixel counts (bins, rows,
+    columns).
+
+    The median is the same as fgc_temporal.stack_median_sum: the value at a rank is the number of bins whose
+    cumulative count is not above the rank.
+    """
+    arrCumulative = np.cumsum(arrHist, axis=0, dtype=np.uint16)
+    arrValid = arrCumulative[-1]
+    dicBad = {intThreshold: arrCumulative[min(intThreshold, HIST_BINS - 1)] for intThreshold in lsThreshold}
+    arrLower = np.count_nonzero(arrCumulative <= ((np.maximum(arrValid, 1) - 1) // 2)[np.newaxis], axis=0)
+    arrUpper = np.count_nonzero(arrCumulative <= (arrValid // 2)[np.newaxis], axis=0)
+    arrMedianSum = (arrLower + arrUpper).astype(np.uint16)
+    arrMedianSum[arrValid == 0] = 2 * fgc_common.NODATA_U8
+    return arrValid, dicBad, arrMedianSum
+
+
+def _window_pixels():
+    return max(fgc_temporal.STACK_PIXELS // MASK_BAND, fgc_temporal.MIN_WINDOW_PIXELS)
+
+
+def update_climatology(pathStore, strSeason, lsPathRas, pathMask=""):
+    """Bring the store of one season up to date with the seasonal TVCpc GeoTIFFs in lsPathRas.
+
+    Returns (number of GeoTIFFs added, number removed).  Both are 0 if the store is already up to date.
+    """
+    pathHist, pathMeta = store_paths(pathStore, strSeason)
+    dicMeta = None
+    if os.path.exists(pathHist) and os.path.exists(pathMeta):
+        with open(pathMeta, "r") as fin:
+            dicMeta = json.load(fin)
+    dicOld = dicMeta["images"] if dicMeta is not None else {}
+
+    #GeoTIFFs in the store that are no longer selected are opened on the same grid so they can be removed
+    lsNames = [os.path.basename(pathRas) for pathRas in lsPathRas]
+    lsRemove = [strName for strName in dicOld if strName not in lsNames]
+    lsPathRemove = [dicOld[strName]["path"] for strName in lsRemove]
+    blnRebuild = dicMeta is None or not all(os.path.exists(pathRas) for pathRas in lsPathRemove)
+    stack = fgc_temporal.SeasonStack(list(lsPathRas) + ([] if blnRebuild else lsPathRemove), pathMask)
+    dicGrid = {"geotransform": list(fgc_common.window_geotransform(stack.dsRef.GetGeoTransform(), stack.window)),
+               "xsize": stack.window[2], "ysize": stack.window[3]}
+    dicMask = None
+    if len(pathMask) > 0:
+        dicMask = fgc_manifest.file_signature(pathMask, dicMeta.get("mask") if dicMeta is not None else None)
+    if dicMeta is not None and (dicMeta["grid"] != dicGrid or (dicMeta["mask"] or {}).get("sha256") != (dicMask or {}).get("sha256")):
+        blnRebuild = True
+
+    #A stored GeoTIFF that has changed can not be taken out of the counts, so the store is rebuilt
+    dicImages = {}
+    for strName, pathRas in zip(lsNames + lsRemove, list(lsPathRas) + lsPathRemove):
+        dicPrevious = dicOld[strName]["signature"] if strName in dicOld else None
+        dicImages[strName] = {"path": pathRas, "signature": fgc_manifest.file_signature(pathRas, dicPrevious)}
+        if dicPrevious is not None and dicImages[strName]["signature"]["sha256"] != dicPrevious["sha256"]:
+            blnRebuild = True
+    if blnRebuild:
+        if dicMeta is not None:
+            print("The {} climatology is being rebuilt from all {} GeoTIFFs".format(strSeason, len(lsPathRas)))
+        dicOld = {}
+        lsRemove = []
+    lsAdd = [intIndex for intIndex, strName in enumerate(lsNames) if strName not in dicOld]
+    if len(lsAdd) == 0 and len(lsRemove) == 0:
+        return 0, 0
+
+    lsFold = [(intIndex, True) for intIndex in lsAdd] + [(intIndex, False) for intIndex in range(len(lsPathRas), len(lsPathRas) + len(lsRemove))]
+    if blnRebuild:
+        #The store is written to a temporary GeoTIFF so a failed rebuild leaves the old store in place
+        pathTemp = pathHist[:-4] + "_tmp.tif"
+        dsHist = gdal.GetDriverByName("GTiff").Create(pathTemp, stack.window[2], stack.window[3], MASK_BAND, gdal.GDT_Byte,
+                                                      options=fgc_common.GTIFF_OPTIONS + ["INTERLEAVE=BAND"])
+        dsHist.SetGeoTransform(dicGrid["geotransform"])
+        dsHist.SetProjection(stack.dsRef.GetProjection())
+    else:
+        #Without the .json an update that fails part way leaves a store that is rebuilt at the next update
+        os.remove(pathMeta)
+        dsHist = gdal.Open(pathHist, gdal.GA_Update)
+    for intXOff, intYOff, intXSize, intYSize in stack.windows(_window_pixels()):
+        arrInside = stack.inside(intXOff, intYOff, intXSize, intYSize)
+        #Change in the count of each bin, so only the bins with a change are read and written
+        arrChange = np.zeros((HIST_BINS, intYSize, intXSize), dtype=np.int16)
+        for intIndex, blnAdd in lsFold:
+            arrValues = stack.read_band(intIndex, intXOff, intYOff, intXSize, intYSize)
+            arrValues[~arrInside] = fgc_common.NODATA_U8
+            fold_season(arrChange, arrValues, blnAdd)
+        for intBin in np.flatnonzero(arrChange.reshape(HIST_BINS, -1).any(axis=1)):
+            bandBin = dsHist.GetRasterBand(int(intBin) + 1)
+            if blnRebuild:
+                arrCount = arrChange[intBin]
+            else:
+                arrCount = bandBin.ReadAsArray(intXOff, intYOff, intXSize, intYSize).astype(np.int16) + arrChange[intBin]
+            bandBin.WriteArray(arrCount.astype(np.uint8), intXOff, intYOff)
+        if blnRebuild:
+            dsHist.GetRasterBand(MASK_BAND).WriteArray(arrInside.astype(np.uint8), intXOff, intYOff)
+    dsHist.FlushCache()
+    del dsHist, stack
+    if blnRebuild:
+        os.replace(pathTemp, pathHist)
+
+    dicMeta = {"season": strSeason, "grid": dicGrid, "mask": dicMask,
+               "images": {strName: dicImages[strName] for strName in lsNames}}
+    with open(pathMeta + ".tmp", "w") as fout:
+        json.dump(dicMeta, fout, indent=1, sort_keys=True)
+    os.replace(pathMeta + ".tmp", pathMeta)
+    return len(lsAdd), len(lsRemove)
+
+
+def climatology_products(dicStore, lsThreshold, dicSeasonPaths, dicAnomalyImage=None, dicClr=None):
+    """Write the fgc05 outputs of each season from its store (dicStore holds the store GeoTIFF of each season).
+
+    dicSeasonPaths, dicAnomalyImage and dicClr are as for fgc_temporal.season_products.  Only the stores (and the
+    anomaly images) are read.
+    """
+    if dicAnomalyImage is None:
+        dicAnomalyImage = {}
+    for strSeason, pathHist in dicStore.items():
+        dsHist = gdal.Open(pathHist)
+        lsWindow = (0, 0, dsHist.RasterXSize, dsHist.RasterYSize)
+        outputs = fgc_temporal.SeasonOutputs(dsHist, lsWindow, dicSeasonPaths[strSeason], lsThreshold, dicClr,
+                                             dicAnomalyImage.get(strSeason, ""))
+        intWidth, intHeight = fgc_common.window_shape(dsHist.GetRasterBand(1), _window_pixels())
+        for intXOff, intYOff, intXSize, intYSize in fgc_common.iter_windows(lsWindow[2], lsWindow[3], intWidth, intHeight):
+            arrStore = dsHist.ReadAsArray(intXOff, intYOff, intXSize, intYSize)
+            arrHist, arrInside = arrStore[:HIST_BINS], arrStore[HIST_BINS] > 0
+            arrValid, dicBad, arrMedianSum = histogram_statistics(arrHist, lsThreshold)
+            outputs.write(intXOff, intYOff, arrInside, arrValid, dicBad, arrMedianSum if outputs.blnMedian else None)
+        outputs.close()
+        del outputs, dsHist
@@ -0,0 +1,518 @@
+"""
+Created For: Department of Primary Industries and Regional Development, Western Australia
+Date: October 2026
+Purpose: Shared helpers for the GDAL/NumPy processing engines used by the fgc scripts.  The helpers read and
+         write rasters one block window at a time so that memory use stays bounded no matter how large the
+         input imagery is, and they do not need arcpy or a Spatial Analyst licence.
+
+         The helpers cover:
+                  iterating over block windows of a raster,
+                  resampling a mask data set (raster or polygon) to the grid of an input raster, which
+                  replaces arcpy.env.mask and arcpy.env.extent,
+                  creating unsigned 8 bit GeoTIFF outputs with NoData set to 255, which replaces
+                  arcpy.env.nodata = "MAXIMUM", compressed with DEFLATE or ZSTD and a predictor and optionally
+                  finished as Cloud Optimised GeoTIFFs (COG) with overviews and the .clr colour map as the palette,
+                  converting AusCover seasonal fractional cover bands to 0 to 100 percentages,
+                  reading the Total Vegetation Cover of a raw AusCover dima2 GeoTIFF on the fly (a "fused" read), so
+                  the analysis scripts can use the dima2 GeoTIFFs without fgc03 writing TVCpc GeoTIFFs first,
+                  running independent jobs (such as seasons) across a pool of worker processes, optionally
+                  recording the time and I/O of each job (see fgc_instrument.py).
+
+NOTE:
+This module requires the osgeo (GDAL) and numpy packages.
+
+This script is in development and care should be taken when using.
+
+No guarentees are given and users should do their own validation.
+"""
+#Import necessary packages
+import concurrent.futures
+import fnmatch
+import math
+import os
+import time
+import traceback
+
+import numpy as np
+from osgeo import gdal
+from osgeo import osr
+
+import fgc_instrument
+
+gdal.UseExceptions()
+
+#NoData value written to all unsigned 8 bit outputs (the same as arcpy.env.nodata = "MAXIMUM")
+NODATA_U8 = 255
+#Creation options for GeoTIFF outputs.  DEFLATE is the GDAL equivalent of the arcpy LZ77 compression.
+GTIFF_OPTIONS = ["COMPRESS=DEFLATE", "TILED=YES", "BIGTIFF=IF_SAFER"]
+#Compression methods offered for the outputs
+COMPRESS_METHODS = ("DEFLATE", "ZSTD")
+#Width and height in pixels of the internal tiles of COG outputs
+COG_BLOCK_SIZE = 512
+#Approximate number of pixels read in a single block window
+WINDOW_PIXELS = 1024 * 1024
+#Default GDAL block cache (in megabytes) for each worker process
+GDAL_CACHE_MB = 256
+#Offset that AusCover adds to every band of the seasonal fractional cover GeoTIFFs
+AUSCOVER_OFFSET = 100
+#File names of the raw AusCover seasonal fractional cover GeoTIFFs
+DIMA2_PATTERN = "lztmre_wa_*dima2.tif"
+
+#Compression of the outputs and whether they are finished as COGs (see set_output_format)
+_dicOutput = {"compress": "DEFLATE", "cog": False}
+
+
+def window_shape(band, intWindowPixels=WINDOW_PIXELS):
+    """Return a (width, height) for block windows that is a whole number of the band's internal blocks
+    and holds roughly intWindowPixels pixels."""
+    intBlockX, intBlockY = band.GetBlockSize()
+    intXSize, intYSize = band.XSize, band.YSize
+    if intBlockX >= intXSize:
+        intWidth = intXSize
+    else:
+        intWidth = min(intXSize, intBlockX * max(1, int(math.sqrt(intWindowPixels)) // intBlockX))
+    intHeight = min(intYSize, intBlockY * max(1, intWindowPixels // (intWidth * intBlockY)))
+    return intWidth, intHeight
+
+
+def iter_windows(intXSize, intYSize, intWidth, intHeight):
+    """Yield (xoff, yoff, xsize, ysize) block windows covering a raster of intXSize by intYSize pixels."""
+    for intYOff in range(0, intYSize, intHeight):
+        intRows = min(intHeight, intYSize - intYOff)
+        for intXOff in range(0, intXSize, intWidth):
+            fgc_instrument.count_block()
+            yield intXOff, intYOff, min(intWidth, intXSize - intXOff), intRows
+
+
+def bounds_to_window(lsGeoTransform, intXSize, intYSize, lsBounds):
+    """Snap (minx, miny, maxx, maxy) bounds to a raster grid and return the overlapping (xoff, yoff, xsize, ysize)."""
+    minX, minY, maxX, maxY = lsBounds
+    intX0 = int(math.floor((minX - lsGeoTransform[0]) / lsGeoTransform[1] + 1e-6))
+    intX1 = int(math.ceil((maxX - lsGeoTransform[0]) / lsGeoTransform[1] - 1e-6))
+    intY0 = int(math.floor((maxY - lsGeoTransform[3]) / lsGeoTransform[5] + 1e-6))
+    intY1 = int(math.ceil((minY - lsGeoTransform[3]) / lsGeoTransform[5] - 1e-6))
+    intX0, intX1 = max(intX0, 0), min(intX1, intXSize)
+    intY0, intY1 = max(intY0, 0), min(intY1, intYSize)
+    if intX1 <= intX0 or intY1 <= intY0:
+        raise Exception("The mask does not overlap the raster grid.  Please check the mask and its coordinate system.")
+    return intX0, intY0, intX1 - intX0, intY1 - intY0
+
+
+def window_geotransform(lsGeoTransform, lsWindow):
+    """Return the geotransform of a window (xoff, yoff, xsize, ysize) of a raster."""
+    intXOff, intYOff = lsWindow[0], lsWindow[1]
+    return (lsGeoTransform[0] + intXOff * lsGeoTransform[1] + intYOff * lsGeoTransform[2], lsGeoTransform[1], lsGeoTransform[2],
+            lsGeoTransform[3] + intXOff * lsGeoTransform[4] + intYOff * lsGeoTransform[5], lsGeoTransform[4], lsGeoTransform[5])
+
+
+def snap_bounds_to_grid(lsGeoTransform, lsBounds):
+    """Expand (minx, miny, maxx, maxy) bounds outwards to the cells of a raster grid (like arcpy.env.snapRaster).
+
+    Returns the (geotransform, xsize, ysize) of the snapped grid.  The grid need not lie inside the raster.
+    """
+    minX, minY, maxX, maxY = lsBounds
+    valResX, valResY = lsGeoTransform[1], lsGeoTransform[5]
+    intX0 = int(math.floor((minX - lsGeoTransform[0]) / valResX + 1e-6))
+    intX1 = int(math.ceil((maxX - lsGeoTransform[0]) / valResX - 1e-6))
+    intY0 = int(math.floor((maxY - lsGeoTransform[3]) / valResY + 1e-6))
+    intY1 = int(math.ceil((minY - lsGeoTransform[3]) / valResY - 1e-6))
+    lsSnapped = (lsGeoTransform[0] + intX0 * valResX, valResX, 0.0, lsGeoTransform[3] + intY0 * valResY, 0.0, valResY)
+    return lsSnapped, max(intX1 - intX0, 1), max(intY1 - intY0, 1)
+
+
+def open_on_grid(pathRaster, lsGeoTransform, intXSize, intYSize, strWkt):
+    """Open a raster resampled (nearest neighbour) to a target grid as a lazy VRT.
+
+    Pixels of the grid outside the raster are NoData (the raster's own NoData value, or 255 if it has none).  A
+    dima2 GeoTIFF is opened as its Total Vegetation Cover (see FusedTVCDataset).
+    """
+    dsIn = gdal.Open(pathRaster)
+    valNodata = dsIn.GetRasterBand(1).GetNoDataValue()
+    if valNodata is None:
+        valNodata = NODATA_U8
+    dsOut = gdal.Warp("", dsIn, format="VRT", dstSRS=strWkt or None, resampleAlg="near",
+                      outputBounds=(lsGeoTransform[0], lsGeoTransform[3] + intYSize * lsGeoTransform[5],
+                                    lsGeoTransform[0] + intXSize * lsGeoTransform[1], lsGeoTransform[3]),
+                      width=intXSize, height=intYSize, dstNodata=valNodata)
+    #The bands of a dima2 are resampled and its Total Vegetation Cover is found as it is read
+    return FusedTVCDataset(dsOut) if is_dima2(pathRaster) else dsOut
+
+
+def read_clr(pathClr):
+    """Read an ArcGIS .clr colour map (lines of "value red green blue") into a gdal.ColorTable."""
+    colourTable = gdal.ColorTable()
+    with open(pathClr, "r") as fin:
+        for line in fin:
+            lsParts = line.split()
+            if len(lsParts) < 4 or not lsParts[0].isdigit():
+                continue
+            colourTable.SetColorEntry(int(lsParts[0]), (int(lsParts[1]), int(lsParts[2]), int(lsParts[3]), 255))
+    return colourTable
+
+
+def _is_vector(pathData):
+    try:
+        dsVector = gdal.OpenEx(pathData, gdal.OF_VECTOR)
+    except RuntimeError:
+        return False
+    return dsVector is not None and dsVector.GetLayerCount() > 0
+
+
+def _transform_bounds(lsBounds, strSrcWkt, strDstWkt):
+    """Transform (minx, miny, maxx, maxy) bounds between coordinate systems using the four corners."""
+    if not strSrcWkt or not strDstWkt:
+        return lsBounds
+    source = osr.SpatialReference()
+    source.ImportFromWkt(strSrcWkt)
+    target = osr.SpatialReference()
+    target.ImportFromWkt(strDstWkt)
+    if source.IsSame(target):
+        return lsBounds
+    source.SetAxisMappingStrategy(osr.OAMS_TRADITIONAL_GIS_ORDER)
+    target.SetAxisMappingStrategy(osr.OAMS_TRADITIONAL_GIS_ORDER)
+    transform = osr.CoordinateTransformation(source, target)
+    minX, minY, maxX, maxY = lsBounds
+    lsCorners = [transform.TransformPoint(x, y)[:2] for x, y in ((minX, minY), (minX, maxY), (maxX, minY), (maxX, maxY))]
+    return (min(c[0] for c in lsCorners), min(c[1] for c in lsCorners),
+            max(c[0] for c in lsCorners), max(c[1] for c in lsCorners))
+
+
+def dataset_bounds(pathData, strWkt):
+    """Return the (minx, miny, maxx, maxy) extent of a raster or polygon data set in the coordinate system strWkt."""
+    if _is_vector(pathData):
+        layer = gdal.OpenEx(pathData, gdal.OF_VECTOR).GetLayer(0)
+        minX, maxX, minY, maxY = layer.GetExtent()
+        srsLayer = layer.GetSpatialRef()
+        return _transform_bounds((minX, minY, maxX, maxY), srsLayer.ExportToWkt() if srsLayer else "", strWkt)
+    dsIn = gdal.Open(pathData)
+    lsGeoTransform = dsIn.GetGeoTransform()
+    return _transform_bounds((lsGeoTransform[0], lsGeoTransform[3] + dsIn.RasterYSize * lsGeoTransform[5],
+                              lsGeoTransform[0] + dsIn.RasterXSize * lsGeoTransform[1], lsGeoTransform[3]),
+                             dsIn.GetProjection(), strWkt)
+
+
+class GridMask(object):
+    """A mask data set (raster or polygon) resampled on the fly to the grid of a reference raster.
+
+    Like arcpy.env.mask, pixels that are NoData in a raster mask, or outside the polygons of a polygon
+    mask, are excluded.  The mask's extent (window) is used like arcpy.env.extent.
+    """
+
+    def __init__(self, pathMask, dsRef):
+        self.pathMask = pathMask
+        self.lsGeoTransform = dsRef.GetGeoTransform()
+        self.strWkt = dsRef.GetProjection()
+        self.dsVector = None
+        self.dsRaster = None
+        if _is_vector(pathMask):
+            self.dsVector = gdal.OpenEx(pathMask, gdal.OF_VECTOR)
+        else:
+            #Warp lazily (VRT) to the whole reference grid.  The alpha band marks valid mask pixels.
+            lsRefGT = self.lsGeoTransform
+            self.dsRaster = gdal.Warp("", gdal.Open(pathMask), format="VRT", dstSRS=self.strWkt or None,
+                                      outputBounds=(lsRefGT[0], lsRefGT[3] + dsRef.RasterYSize * lsRefGT[5],
+                                                    lsRefGT[0] + dsRef.RasterXSize * lsRefGT[1], lsRefGT[3]),
+                                      width=dsRef.RasterXSize, height=dsRef.RasterYSize, resampleAlg="near", dstAlpha=True)
+        self.window = bounds_to_window(self.lsGeoTransform, dsRef.RasterXSize, dsRef.RasterYSize,
+                                       dataset_bounds(pathMask, self.strWkt))
+
+    def read(self, intXOff, intYOff, intXSize, intYSize):
+        """Return a boolean array that is True for pixels inside the mask.  Offsets are on the reference grid."""
+        if self.dsRaster is not None:
+            bandAlpha = self.dsRaster.GetRasterBand(self.dsRaster.RasterCount)
+            return bandAlpha.ReadAsArray(intXOff, intYOff, intXSize, intYSize) > 0
+        dsBlock = gdal.GetDriverByName("MEM").Create("", intXSize, intYSize, 1, gdal.GDT_Byte)
+        dsBlock.SetGeoTransform(window_geotransform(self.lsGeoTransform, (intXOff, intYOff)))
+        dsBlock.SetProjection(self.strWkt)
+        gdal.Rasterize(dsBlock, self.dsVector, burnValues=[1])
+        return dsBlock.GetRasterBand(1).ReadAsArray() > 0
+
+
+def set_output_format(strCompress="DEFLATE", blnCog=False):
+    """Set the compression ("DEFLATE" or "ZSTD") of the outputs of create_output and whether finish_output
+    rewrites them as Cloud Optimised GeoTIFFs.  Returns the previous (strCompress, blnCog).
+
+    The settings are copied to the worker processes of run_parallel.
+    """
+    strCompress = strCompress.upper()
+    if strCompress not in COMPRESS_METHODS:
+        raise Exception("The compression {} is not recognised.  Please use one of {}".format(strCompress, list(COMPRESS_METHODS)))
+    if strCompress not in (gdal.GetDriverByName("GTiff").GetMetadataItem("DMD_CREATIONOPTIONLIST") or ""):
+        raise Exception("This GDAL was built without {} compression.  Please use DEFLATE".format(strCompress))
+    if blnCog and gdal.GetDriverByName("COG") is None:
+        raise Exception("Cloud Optimised GeoTIFF outputs need GDAL 3.1 or later")
+    tupPrevious = output_format()
+    _dicOutput["compress"] = strCompress
+    _dicOutput["cog"] = blnCog
+    return tupPrevious
+
+
+def output_format():
+    """The (strCompress, blnCog) of the outputs, see set_output_format."""
+    return _dicOutput["compress"], _dicOutput["cog"]
+
+
+def output_options(intDataType=gdal.GDT_Byte):
+    """GeoTIFF creation options of an output: internally tiled, with the compression of set_output_format and the
+    horizontal differencing predictor (the floating point predictor for float outputs)."""
+    strPredictor = "3" if intDataType in (gdal.GDT_Float32, gdal.GDT_Float64) else "2"
+    return ["COMPRESS=" + _dicOutput["compress"], "PREDICTOR=" + strPredictor, "TILED=YES", "BIGTIFF=IF_SAFER"]
+
+
+def finish_output(pathOut):
+    """Rewrite a finished output as a Cloud Optimised GeoTIFF if set_output_format asked for COG outputs.
+
+    The COG has COG_BLOCK_SIZE internal tiles and nearest neighbour overviews (so the classes and palette colours
+    of the overviews are real pixel values), and keeps the NoData value and colour table of the GeoTIFF.  Every
+    dataset of pathOut must be closed first.  Does nothing for plain GeoTIFF outputs.
+    """
+    if not _dicOutput["cog"]:
+        return
+    pathTemp = pathOut[:-4] + "_cog.tif"
+    gdal.Translate(pathTemp, pathOut, format="COG",
+                   creationOptions=["COMPRESS=" + _dicOutput["compress"], "PREDICTOR=YES", "BLOCKSIZE={}".format(COG_BLOCK_SIZE),
+                                    "RESAMPLING=NEAREST", "OVERVIEWS=IGNORE_EXISTING", "BIGTIFF=IF_SAFER"])
+    os.replace(pathTemp, pathOut)
+
+
+def create_output(pathOut, dsRef, lsWindow, intDataType=gdal.GDT_Byte, valNodata=NODATA_U8, pathClr=""):
+    """Create a single band GeoTIFF covering a window (xoff, yoff, xsize, ysize) of the grid of dsRef.
+    If pathClr is given the .clr colour map is embedded as the colour table (like arcpy.AddColormap_management).
+    Once the GeoTIFF is written and closed pass pathOut to finish_output."""
+    dsOut = gdal.GetDriverByName("GTiff").Create(pathOut, lsWindow[2], lsWindow[3], 1, intDataType, options=output_options(intDataType))
+    dsOut.SetGeoTransform(window_geotransform(dsRef.GetGeoTransform(), lsWindow))
+    dsOut.SetProjection(dsRef.GetProjection())
+    bandOut = dsOut.GetRasterBand(1)
+    if valNodata is not None:
+        bandOut.SetNoDataValue(valNodata)
+    if len(pathClr) > 0 and os.path.exists(pathClr):
+        bandOut.SetRasterColorTable(read_clr(pathClr))
+        bandOut.SetRasterColorInterpretation(gdal.GCI_PaletteIndex)
+    return dsOut
+
+
+def fgc_to_percent(arrBand, arrValid):
+    """Remove the AusCover offset of 100 from a band and trim it to between 0 and 100 as uint8.
+    Pixels that are not valid are set to NoData (255)."""
+    arrOut = np.clip(arrBand.astype(np.int16) - AUSCOVER_OFFSET, 0, 100).astype(np.uint8)
+    arrOut[~arrValid] = NODATA_U8
+    return arrOut
+
+
+def tvc_from_percent(arrPV, arrNPV, arrValid):
+    """Sum trimmed PV and NPV percentages to Total Vegetative Cover, trimmed to a maximum of 100 as uint8."""
+    arrOut = np.minimum(arrPV.astype(np.uint16) + arrNPV, 100).astype(np.uint8)
+    arrOut[~arrValid] = NODATA_U8
+    return arrOut
+
+
+def valid_pixels(arrBand, valNodata):
+    """Return a boolean array that is True where a band is not NoData."""
+    if valNodata is None:
+        return np.ones(arrBand.shape, dtype=bool)
+    return arrBand != valNodata
+
+
+def is_dima2(pathRaster):
+    """True if pathRaster is a raw AusCover seasonal fractional cover GeoTIFF (lztmre_wa_*dima2.tif)."""
+    return fnmatch.fnmatch(os.path.basename(pathRaster), DIMA2_PATTERN)
+
+
+def tvc_name(pathRaster):
+    """Name of the TVCpc GeoTIFF that a raster stands for, e.g. lztmre_wa_m201903201905_dima2.tif ->
+    acfgcs_201903201905_TVCpc.tif.  Other rasters keep their own name."""
+    strName = os.path.basename(pathRaster)
+    if is_dima2(strName):
+        return "acfgcs_" + strName[11:23] + "_TVCpc.tif"
+    return strName
+
+
+class FusedTVCBand(object):
+    """The Total Vegetation Cover of a dima2 data set, found from Band 2 (PV) and Band 3 (NPV) each time a window
+    is read, exactly as convert_fgc_season writes it to the TVCpc GeoTIFF.  Values are uint8 with NoData 255.
+
+    Only the parts of a gdal.Band used by the fgc engines are offered (ReadAsArray, GetNoDataValue, GetBlockSize,
+    XSize, YSize and DataType).
+    """
+
+    DataType = gdal.GDT_Byte
+
+    def __init__(self, dsIn):
+        self.bandPV = dsIn.GetRasterBand(2)
+        self.bandNPV = dsIn.GetRasterBand(3)
+        self.valNodataPV = self.bandPV.GetNoDataValue()
+        self.valNodataNPV = self.bandNPV.GetNoDataValue()
+        self.XSize, self.YSize = self.bandPV.XSize, self.bandPV.YSize
+
+    def GetBlockSize(self):
+        return self.bandPV.GetBlockSize()
+
+    def GetNoDataValue(self):
+        return NODATA_U8
+
+    def ReadAsArray(self, xoff=0, yoff=0, win_xsize=None, win_ysize=None):
+        if win_xsize is None:
+            win_xsize = self.XSize - xoff
+        if win_ysize is None:
+            win_ysize = self.YSize - yoff
+        arrPV = self.bandPV.ReadAsArray(xoff, yoff, win_xsize, win_ysize)
+        arrNPV = self.bandNPV.ReadAsArray(xoff, yoff, win_xsize, win_ysize)
+        arrValidPV = valid_pixels(arrPV, self.valNodataPV)
+        arrValidNPV = valid_pixels(arrNPV, self.valNodataNPV)
+        return tvc_from_percent(fgc_to_percent(arrPV, arrValidPV), fgc_to_percent(arrNPV, arrValidNPV), arrValidPV & arrValidNPV)
+
+
+class FusedTVCDataset(object):
+    """A single band data set holding the FusedTVCBand of a dima2 data set (which may be a resampled VRT)."""
+
+    RasterCount = 1
+
+    def __init__(self, dsIn):
+        self.dsIn = dsIn
+        self.band = FusedTVCBand(dsIn)
+        self.RasterXSize, self.RasterYSize = dsIn.RasterXSize, dsIn.RasterYSize
+
+    def GetRasterBand(self, intBand):
+        if intBand != 1:
+            raise Exception("A fused Total Vegetation Cover data set only has band 1")
+        return self.band
+
+    def GetGeoTransform(self):
+        return self.dsIn.GetGeoTransform()
+
+    def GetProjection(self):
+        return self.dsIn.GetProjection()
+
+
+def open_tvc(pathRaster):
+    """Open a TVCpc GeoTIFF, or the Total Vegetation Cover of a dima2 GeoTIFF (see FusedTVCDataset)."""
+    dsIn = gdal.Open(pathRaster)
+    return FusedTVCDataset(dsIn) if is_dima2(pathRaster) else dsIn
+
+
+def convert_fgc_season(pathImg, pathOut, pathMask=""):
+    """Convert one AusCover seasonal fractional cover GeoTIFF (lztmre_wa_*dima2.tif) to the PVpc, NPVpc and
+    TVCpc GeoTIFFs written by fgc03.
+
+    Band 2 (PV) and Band 3 (NPV) are each read once per block window and all three outputs are computed and
+    written in the same pass.  Returns the list of output pathways.
+    """
+    strDate = os.path.basename(pathImg)[11:23]
+    dsIn = gdal.Open(pathImg)
+    bandPV = dsIn.GetRasterBand(2)
+    bandNPV = dsIn.GetRasterBand(3)
+    valNodataPV = bandPV.GetNoDataValue()
+    valNodataNPV = bandNPV.GetNoDataValue()
+
+    if len(pathMask) > 0:
+        mask = GridMask(pathMask, dsIn)
+        lsWindow = mask.window
+    else:
+        mask = None
+        lsWindow = (0, 0, dsIn.RasterXSize, dsIn.RasterYSize)
+
+    lsPathOut = [os.path.join(pathOut, "acfgcs_" + strDate + "_" + strProduct + ".tif") for strProduct in ("PVpc", "NPVpc", "TVCpc")]
+    lsDsOut = [create_output(pathProduct, dsIn, lsWindow) for pathProduct in lsPathOut]
+    lsBandOut = [dsOut.GetRasterBand(1) for dsOut in lsDsOut]
+
+    intWidth, intHeight = window_shape(bandPV)
+    for intXOff, intYOff, intXSize, intYSize in iter_windows(lsWindow[2], lsWindow[3], intWidth, intHeight):
+        intX, intY = lsWindow[0] + intXOff, lsWindow[1] + intYOff
+        arrPV = bandPV.ReadAsArray(intX, intY, intXSize, intYSize)
+        arrNPV = bandNPV.ReadAsArray(intX, intY, intXSize, intYSize)
+        arrValidPV = valid_pixels(arrPV, valNodataPV)
+        arrValidNPV = valid_pixels(arrNPV, valNodataNPV)
+        if mask is not None:
+            arrInside = mask.read(intX, intY, intXSize, intYSize)
+            arrValidPV &= arrInside
+            arrValidNPV &= arrInside
+        arrOutPV = fgc_to_percent(arrPV, arrValidPV)
+        arrOutNPV = fgc_to_percent(arrNPV, arrValidNPV)
+        arrOutTVC = tvc_from_percent(arrOutPV, arrOutNPV, arrValidPV & arrValidNPV)
+        for bandOut, arrOut in zip(lsBandOut, (arrOutPV, arrOutNPV, arrOutTVC)):
+            bandOut.WriteArray(arrOut, intXOff, intYOff)
+
+    for dsOut in lsDsOut:
+        dsOut.FlushCache()
+    del lsBandOut, lsDsOut, dsIn
+    for pathProduct in lsPathOut:
+        finish_output(pathProduct)
+    return lsPathOut
+
+
+def _init_worker(intCacheMB, tupOutput=None):
+    """Set the GDAL block cache limit (and the output format of the main process) of a worker process."""
+    gdal.SetCacheMax(intCacheMB * 1024 * 1024)
+    if tupOutput is not None:
+        set_output_format(*tupOutput)
+
+
+def _run_job(func, lsArgs):
+    """Run one job and return (True, result) or (False, (traceback text, record)) so that one failure does not stop
+    the pool.  The record is the fgc_instrument record of a measured job that failed, otherwise None."""
+    try:
+        return True, func(*lsArgs)
+    except Exception as error:
+        return False, (traceback.format_exc(), getattr(error, "dicRecord", None))
+
+
+def run_parallel(func, lsJobs, intWorkers=1, intCacheMB=GDAL_CACHE_MB, lsLabels=None, funcDone=None, runLog=None, strStage=""):
+    """Run func(*args) for every args tuple in lsJobs across intWorkers processes.
+
+    Each worker has its own GDAL block cache of intCacheMB megabytes.  Progress is printed as jobs finish and
+    a combined report is printed at the end.  If funcDone is given it is called in this process as
+    funcDone(index, result) as soon as each job succeeds.  Returns a list of results in the order of lsJobs.
+    If any job failed an Exception listing all of the failures is raised once every job has finished.
+    If runLog (a fgc_instrument.RunLog) is given each job is measured as the stage strStage for its label, in the
+    process that runs it, and the record is written to the log by this process.
+
+    NOTE: On Windows the calling script must only call this from inside an if __name__ == "__main__": block.
+    """
+    if lsLabels is None:
+        lsLabels = [str(lsArgs[0]) for lsArgs in lsJobs]
+    blnMeasure = runLog is not None and runLog.blnEnabled
+    if blnMeasure:
+        lsJobs = [(func, lsArgs, strStage or func.__name__, strLabel, runLog.pathProfile, runLog.strScript)
+                  for lsArgs, strLabel in zip(lsJobs, lsLabels)]
+        func = fgc_instrument.measure
+    intTotal = len(lsJobs)
+    lsResults = [None] * intTotal
+    lsErrors = []
+    timeStart = time.time()
+
+    def report(intIndex, tupOutcome, intDone):
+        blnOk, valOut = tupOutcome
+        if blnOk:
+            if blnMeasure:
+                valOut, dicRecord = valOut
+                runLog.write(dicRecord)
+            lsResults[intIndex] = valOut
+            print("[{}/{}] {} done".format(intDone, intTotal, lsLabels[intIndex]))
+            if funcDone is not None:
+                funcDone(intIndex, valOut)
+        else:
+            strTrace, dicRecord = valOut
+            #The failed job is written to the log too, so it shows which image failed
+            if blnMeasure and dicRecord is not None:
+                runLog.write(dicRecord)
+            lsErrors.append((lsLabels[intIndex], strTrace))
+            print("[{}/{}] {} FAILED".format(intDone, intTotal, lsLabels[intIndex]))
+
+    if intWorkers <= 1:
+        _init_worker(intCacheMB)
+        for intIndex, lsArgs in enumerate(lsJobs):
+            report(intIndex, _run_job(func, lsArgs), intIndex + 1)
+    else:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=intWorkers, initializer=_init_worker,
+                                                    initargs=(intCacheMB, output_format())) as executor:
+            dicFutures = {executor.submit(_run_job, func, lsArgs): intIndex for intIndex, lsArgs in enumerate(lsJobs)}
+            for intDone, future in enumerate(concurrent.futures.as_completed(dicFutures), 1):
+                report(dicFutures[future], future.result(), intDone)
+
+    print("{} of {} jobs completed in {:.1f} seconds using {} worker(s)".format(intTotal - len(lsErrors), intTotal,
+                                                                              time.time() - timeStart, max(intWorkers, 1)))
+    if len(lsErrors) > 0:
+        for strLabel, strTrace in lsErrors:
+            print("\nError processing {}:\n{}".format(strLabel, strTrace))
+        raise Exception("{} of {} jobs failed: {}".format(len(lsErrors), intTotal, ", ".join(e[0] for e in lsErrors)))
+    return lsResults
@@ -0,0 +1,264 @@
+"""
+Created For: Department of Primary Industries and Regional Development, Western Australia
+Date: October 2026
+Purpose: An aligned season cube of the Total Vegetation Cover percentage (TVCpc) GeoTIFFs that fgc04, fgc05 and
+         fgc06 can read instead of opening, decompressing, resampling and masking every GeoTIFF on each run.
+
+         build_cube resamples every season once to a common grid (the grid of the first GeoTIFF, cut to the extent
+         of the mask) and applies the mask.  Each season is stored as an uncompressed numpy .npy file of uint8
+         (rows, columns) with NoData as 255, so the cube (time, rows, columns) is read through numpy memory maps
+         and only the block windows that are used are read from disk.  The cube folder holds:
+                  cube.json        the grid, the mask signature and the time index (one entry per season, in date
+                                   order, with the GeoTIFF's size, modification time and content hash)
+                  mask.npy         1 inside the mask, 0 outside
+                  t_<name>.npy     one file for each season
+         Running build_cube again only adds seasons that are new or have changed and drops seasons that are no
+         longer listed (or, with blnPrune = False, keeps them so a cube can be added to one year range at a time).
+         The cube is rebuilt if the mask changes.  With blnPrune = False the seasons it keeps are rebuilt from the
+         GeoTIFFs they were first built from, and the rebuild stops if any of those GeoTIFFs no longer exist.
+
+NOTE:
+This module requires the osgeo (GDAL) and numpy packages.  The cube is not compressed, so it takes one byte per
+pixel per season of disk space.
+
+This script is in development and care should be taken when using.
+
+No guarentees are given and users should do their own validation.
+"""
+#Import necessary packages
+import json
+import os
+
+import numpy as np
+from osgeo import gdal
+
+import fgc_common
+import fgc_histogram
+import fgc_manifest
+import fgc_temporal
+
+#Name of the index file of a cube
+CUBE_INDEX = "cube.json"
+#Name of the mask file of a cube
+CUBE_MASK = "mask.npy"
+
+
+def slice_name(strName):
+    """File name of the .npy slice of a season, e.g. acfgcs_201903201905_TVCpc.tif -> t_acfgcs_201903201905_TVCpc.npy"""
+    return "t_" + os.path.splitext(strName)[0] + ".npy"
+
+
+def _reference(dicGrid):
+    """A band-less in memory dataset with the grid of a cube, used as the reference for outputs and masks."""
+    dsRef = gdal.GetDriverByName("MEM").Create("", dicGrid["xsize"], dicGrid["ysize"], 0, gdal.GDT_Byte)
+    dsRef.SetGeoTransform(dicGrid["geotransform"])
+    dsRef.SetProjection(dicGrid["wkt"])
+    return dsRef
+
+
+def cube_grid(pathTVCRef, pathMask=""):
+    """Return the grid of a cube: the grid of pathTVCRef cut to the extent of the mask (if there is one)."""
+    dsRef = gdal.Open(pathTVCRef)
+    lsWindow = fgc_common.GridMask(pathMask, dsRef).window if len(pathMask) > 0 else (0, 0, dsRef.RasterXSize, dsRef.RasterYSize)
+    return {"geotransform": list(fgc_common.window_geotransform(dsRef.GetGeoTransform(), lsWindow)),
+            "xsize": lsWindow[2], "ysize": lsWindow[3], "wkt": dsRef.GetProjection()}
+
+
+def _row_windows(intXSize, intYSize, intWindowPixels=fgc_common.WINDOW_PIXELS):
+    """Windows of whole rows, which are contiguous in a .npy slice."""
+    return fgc_common.iter_windows(intXSize, intYSize, intXSize, max(1, intWindowPixels // intXSize))
+
+
+def _save_index(pathCube, dicIndex):
+    pathIndex = os.path.join(pathCube, CUBE_INDEX)
+    with open(pathIndex + ".tmp", "w") as fout:
+        json.dump(dicIndex, fout, indent=1, sort_keys=True)
+    os.replace(pathIndex + ".tmp", pathIndex)
+
+
+def build_cube(pathCube, lsPathTVC, pathMask="", blnPrune=True):
+    """Build or update the cube in the folder pathCube from the TVCpc GeoTIFFs in lsPathTVC.  With blnPrune = False
+    seasons already in the cube that are not in lsPathTVC are kept rather than removed (and are read again from
+    their GeoTIFFs if the mask has changed).  Slices that are not in the updated cube are deleted.
+
+    Returns (number of seasons written, number of seasons kept from the existing cube).
+    """
+    if not os.path.exists(pathCube):
+        os.makedirs(pathCube)
+    lsPathTVC = sorted(lsPathTVC, key=os.path.basename)
+    if len(lsPathTVC) == 0:
+        raise Exception("No Total Vegetation Cover GeoTIFFs were given to build the cube {}".format(pathCube))
+    pathIndex = os.path.join(pathCube, CUBE_INDEX)
+    dicOld = None
+    if os.path.exists(pathIndex):
+        with open(pathIndex, "r") as fin:
+            dicOld = json.load(fin)
+    dicMask = None
+    if len(pathMask) > 0:
+        dicMask = fgc_manifest.file_signature(pathMask, dicOld["mask"] if dicOld is not None and dicOld["mask"] else None)
+    if dicOld is not None and (dicOld["mask"] or {}).get("sha256") != (dicMask or {}).get("sha256"):
+        print("The mask has changed so the cube {} is being rebuilt".format(pathCube))
+        if not blnPrune:
+            #The seasons of other years are kept by building them again from the GeoTIFFs they were built from
+            setListed = set(fgc_common.tvc_name(pathTVC) for pathTVC in lsPathTVC)
+            lsKept = [dicTime for dicTime in dicOld["times"] if dicTime["name"] not in setListed]
+            lsMissing = [dicTime["name"] for dicTime in lsKept if not os.path.exists(dicTime["path"])]
+            if len(lsMissing) > 0:
+                raise Exception("The mask has changed so the cube {} must be rebuilt, but these seasons in it would be lost as their "
+                                "GeoTIFFs no longer exist: {}.  Please give their GeoTIFFs or use blnPrune = True".format(pathCube, ", ".join(lsMissing)))
+            lsPathTVC = sorted(lsPathTVC + [dicTime["path"] for dicTime in lsKept], key=os.path.basename)
+        dicOld = None
+
+    #The grid of an existing cube is kept so that its seasons stay aligned with the new ones
+    dicGrid = dicOld["grid"] if dicOld is not None else cube_grid(lsPathTVC[0], pathMask)
+    dsRef = _reference(dicGrid)
+    intXSize, intYSize = dicGrid["xsize"], dicGrid["ysize"]
+    pathMaskSlice = os.path.join(pathCube, CUBE_MASK)
+    if dicOld is None or not os.path.exists(pathMaskSlice):
+        mask = fgc_common.GridMask(pathMask, dsRef) if len(pathMask) > 0 else None
+        arrMaskSlice = np.lib.format.open_memmap(pathMaskSlice, mode="w+", dtype=np.uint8, shape=(intYSize, intXSize))
+        for intXOff, intYOff, intXS, intYS in _row_windows(intXSize, intYSize):
+            arrMaskSlice[intYOff:intYOff + intYS] = 1 if mask is None else mask.read(intXOff, intYOff, intXS, intYS)
+        arrMaskSlice.flush()
+        del arrMaskSlice, mask
+    arrMaskSlice = np.load(pathMaskSlice, mmap_mode="r")
+
+    dicOldTimes = {dicTime["name"]: dicTime for dicTime in dicOld["times"]} if dicOld is not None else {}
+    lsTimes = []
+    intWritten = 0
+    for pathTVC in lsPathTVC:
+        strName = fgc_common.tvc_name(pathTVC)
+        dicPrevious = dicOldTimes.get(strName)
+        dicSignature = fgc_manifest.file_signature(pathTVC, dicPrevious["signature"] if dicPrevious else None)
+        pathSlice = os.path.join(pathCube, slice_name(strName))
+        lsTimes.append({"name": strName, "date": strName[7:19], "path": pathTVC, "signature": dicSignature, "file": slice_name(strName)})
+        if dicPrevious is not None and dicPrevious["signature"]["sha256"] == dicSignature["sha256"] and os.path.exists(pathSlice):
+            continue
+        #Resample the season to the cube grid once and store it with NoData and pixels outside the mask as 255
+        bandTVC = fgc_common.open_on_grid(pathTVC, dicGrid["geotransform"], intXSize, intYSize, dicGrid["wkt"]).GetRasterBand(1)
+        valNodata = bandTVC.GetNoDataValue()
+        pathTemp = pathSlice[:-4] + "_tmp.npy"
+        arrSlice = np.lib.format.open_memmap(pathTemp, mode="w+", dtype=np.uint8, shape=(intYSize, intXSize))
+        for intXOff, intYOff, intXS, intYS in _row_windows(intXSize, intYSize):
+            arrTVC = bandTVC.ReadAsArray(intXOff, intYOff, intXS, intYS)
+            arrOut = arrTVC.astype(np.uint8)
+            arrOut[~fgc_common.valid_pixels(arrTVC, valNodata) | (arrMaskSlice[intYOff:intYOff + intYS] == 0)] = fgc_common.NODATA_U8
+            arrSlice[intYOff:intYOff + intYS] = arrOut
+        arrSlice.flush()
+        del arrSlice, bandTVC
+        os.replace(pathTemp, pathSlice)
+        intWritten += 1
+        print("Added", strName, "to the cube")
+
+    #Seasons that are no longer listed are kept without blnPrune
+    if not blnPrune:
+        setNames = set(dicTime["name"] for dicTime in lsTimes)
+        for strName, dicTime in dicOldTimes.items():
+            if strName not in setNames and os.path.exists(os.path.join(pathCube, dicTime["file"])):
+                lsTimes.append(dicTime)
+    lsTimes.sort(key=lambda dicTime: dicTime["name"])
+    _save_index(pathCube, {"grid": dicGrid, "mask": dicMask, "times": lsTimes})
+    #Slices that are not in the index (seasons removed, or left from before the mask changed) are deleted
+    setFiles = set(dicTime["file"] for dicTime in lsTimes)
+    for strFile in os.listdir(pathCube):
+        if strFile.startswith("t_") and strFile.endswith(".npy") and strFile not in setFiles:
+            os.remove(os.path.join(pathCube, strFile))
+    return intWritten, len(lsTimes) - intWritten
+
+
+class SeasonCube(object):
+    """Read access to a cube built by build_cube.  Seasons are found by the name of their TVCpc GeoTIFF."""
+
+    def __init__(self, pathCube):
+        pathIndex = os.path.join(pathCube, CUBE_INDEX)
+        if not os.path.exists(pathIndex):
+            raise Exception("The folder {} does not hold a season cube.  Please build it first".format(pathCube))
+        with open(pathIndex, "r") as fin:
+            dicIndex = json.load(fin)
+        self.pathCube = pathCube
+        self.dicGrid = dicIndex["grid"]
+        self.lsTimes = dicIndex["times"]
+        self.lsNames = [dicTime["name"] for dicTime in self.lsTimes]
+        self.lsDates = [dicTime["date"] for dicTime in self.lsTimes]
+        self.dsRef = _reference(self.dicGrid)
+        self.arrMask = np.load(os.path.join(pathCube, CUBE_MASK), mmap_mode="r")
+        self.dicSlices = {}
+
+    def index(self, strName):
+        """Position in the time index of the season from the GeoTIFF strName (a name or a pathway).  A dima2
+        GeoTIFF is found by the name of its TVCpc GeoTIFF."""
+        strName = fgc_common.tvc_name(strName)
+        if strName not in self.lsNames:
+            raise Exception("The season {} is not in the cube {}.  Please build the cube again".format(strName, self.pathCube))
+        return self.lsNames.index(strName)
+
+    def slice(self, intIndex):
+        """The (rows, columns) memory map of one season."""
+        if intIndex not in self.dicSlices:
+            self.dicSlices[intIndex] = np.load(os.path.join(self.pathCube, self.lsTimes[intIndex]["file"]), mmap_mode="r")
+        return self.dicSlices[intIndex]
+
+    def stack(self, lsPathRas):
+        """A fgc_temporal.SeasonStack like reader of the seasons from the GeoTIFFs in lsPathRas."""
+        return CubeStack(self, [self.index(pathRas) for pathRas in lsPathRas])
+
+    def read_on_grid(self, intIndex, lsGeoTransform, intXOff, intYOff, intXSize, intYSize):
+        """Read a window of another grid from one season.  The grid must have the same cell size and be aligned
+        with the cube.  Pixels outside the cube are 255."""
+        lsCubeGT = self.dicGrid["geotransform"]
+        valCol = (lsGeoTransform[0] - lsCubeGT[0]) / lsCubeGT[1]
+        valRow = (lsGeoTransform[3] - lsCubeGT[3]) / lsCubeGT[5]
+        if (abs(lsGeoTransform[1] - lsCubeGT[1]) > 1e-6 * abs(lsCubeGT[1]) or abs(lsGeoTransform[5] - lsCubeGT[5]) > 1e-6 * abs(lsCubeGT[5])
+                or abs(valCol - round(valCol)) > 1e-3 or abs(valRow - round(valRow)) > 1e-3):
+            raise Exception("The grid is not aligned with the cube {}.  Please read the GeoTIFF instead".format(self.pathCube))
+        intX0, intY0 = int(round(valCol)) + intXOff, int(round(valRow)) + intYOff
+        arrOut = np.full((intYSize, intXSize), fgc_common.NODATA_U8, dtype=np.uint8)
+        intCX0, intCY0 = max(intX0, 0), max(intY0, 0)
+        intCX1, intCY1 = min(intX0 + intXSize, self.dicGrid["xsize"]), min(intY0 + intYSize, self.dicGrid["ysize"])
+        if intCX1 > intCX0 and intCY1 > intCY0:
+            arrOut[intCY0 - intY0:intCY1 - intY0, intCX0 - intX0:intCX1 - intX0] = self.slice(intIndex)[intCY0:intCY1, intCX0:intCX1]
+        return arrOut
+
+
+class CubeStack(fgc_temporal.SeasonStack):
+    """Seasons of a SeasonCube read in the same way as a fgc_temporal.SeasonStack.  The cube is already aligned
+    and masked so nothing is resampled."""
+
+    def __init__(self, cube, lsIndex):
+        if len(lsIndex) == 0:
+            raise Exception("At least one season is needed for a season stack")
+        self.cube = cube
+        self.lsIndex = list(lsIndex)
+        self.lsPathRas = [cube.lsNames[intIndex] for intIndex in self.lsIndex]
+        self.lsBands = self.lsIndex
+        self.dsRef = cube.dsRef
+        self.mask = None
+        self.window = (0, 0, cube.dicGrid["xsize"], cube.dicGrid["ysize"])
+
+    def open_on_grid(self, pathRas):
+        return fgc_common.open_on_grid(pathRas, self.cube.dicGrid["geotransform"], self.window[2], self.window[3],
+                                       self.cube.dicGrid["wkt"])
+
+    def windows(self, intWindowPixels=None):
+        if intWindowPixels is None:
+            intWindowPixels = max(fgc_temporal.STACK_PIXELS // len(self.lsIndex), fgc_temporal.MIN_WINDOW_PIXELS)
+        return _row_windows(self.window[2], self.window[3], intWindowPixels)
+
+    def inside(self, intXOff, intYOff, intXSize, intYSize):
+        intX, intY = self.window[0] + intXOff, self.window[1] + intYOff
+        return np.asarray(self.cube.arrMask[intY:intY + intYSize, intX:intX + intXSize]) > 0
+
+    def read_band(self, intIndex, intXOff, intYOff, intXSize, intYSize):
+        intX, intY = self.window[0] + intXOff, self.window[1] + intYOff
+        return np.array(self.cube.slice(self.lsIndex[intIndex])[intY:intY + intYSize, intX:intX + intXSize])
+
+
+def season_statistics(pathCube, strName, lsStats):
+    """Return a list of (name, value) for every statistic in lsStats of one season of a cube (see
+    fgc_histogram.summarise_histogram).  NoData and pixels outside the mask are not counted."""
+    cube = SeasonCube(pathCube)
+    arrSlice = cube.slice(cube.index(strName))
+    arrCounts = np.zeros(fgc_common.NODATA_U8 + 1, dtype=np.int64)
+    for intXOff, intYOff, intXSize, intYSize in _row_windows(cube.dicGrid["xsize"], cube.dicGrid["ysize"]):
+        arrCounts += np.bincount(np.asarray(arrSlice[intYOff:intYOff + intYSize]).ravel(), minlength=arrCounts.size)
+    return fgc_histogram.summarise_histogram(arrCounts[:fgc_common.NODATA_U8], lsStats)
@@ -0,0 +1,134 @@
+"""
+Created For: Department of Primary Industries and Regional Development, Western Australia
+Date: October 2026
+Purpose: Histogram based statistics for unsigned 8 bit rasters such as the Total Vegetation Cover percentage
+         (TVCpc) GeoTIFFs, where values are between 0 and 100 and NoData is 255.
+
+         A raster is read one block window at a time and the count of every pixel value is accumulated with
+         numpy.bincount, so memory use does not depend on the size of the raster.  Exact percentiles, the mean,
+         standard deviation, minimum, maximum and count are then calculated from the counts alone.  Percentiles
+         use the same linear interpolation as numpy.nanpercentile.
+
+NOTE:
+This module requires the osgeo (GDAL) and numpy packages.
+
+This script is in development and care should be taken when using.
+
+No guarentees are given and users should do their own validation.
+"""
+#Import necessary packages
+import numpy as np
+
+import fgc_common
+
+#Number of histogram bins needed for percentage rasters (values 0 to 100)
+PERCENT_BINS = 101
+
+
+def raster_histogram(pathRaster, intBins=PERCENT_BINS, intBand=1):
+    """Return a numpy int64 array with the count of each pixel value of a raster, ignoring NoData.
+
+    The array has at least intBins entries.  Only integer rasters with values of 0 or more are supported.  A raw
+    dima2 GeoTIFF is summarised as its Total Vegetation Cover (see fgc_common.FusedTVCDataset).
+    """
+    dsIn = fgc_common.open_tvc(pathRaster)
+    band = dsIn.GetRasterBand(intBand)
+    valNodata = band.GetNoDataValue()
+    arrCounts = np.zeros(intBins, dtype=np.int64)
+    intWidth, intHeight = fgc_common.window_shape(band)
+    for intXOff, intYOff, intXSize, intYSize in fgc_common.iter_windows(band.XSize, band.YSize, intWidth, intHeight):
+        arrBlock = band.ReadAsArray(intXOff, intYOff, intXSize, intYSize)
+        if arrBlock.dtype.kind not in "ui":
+            raise Exception("The raster {} is not an integer raster and can not be summarised with a histogram".format(pathRaster))
+        arrValues = arrBlock[fgc_common.valid_pixels(arrBlock, valNodata)]
+        if arrValues.size == 0:
+            continue
+        if arrValues.min() < 0:
+            raise Exception("The raster {} has negative values and can not be summarised with a histogram".format(pathRaster))
+        arrBlockCounts = np.bincount(arrValues.ravel(), minlength=intBins)
+        if arrBlockCounts.size > arrCounts.size:
+            arrCounts = np.concatenate([arrCounts, np.zeros(arrBlockCounts.size - arrCounts.size, dtype=np.int64)])
+        arrCounts[:arrBlockCounts.size] += arrBlockCounts
+    return arrCounts
+
+
+def hist_count(arrCounts):
+    """Number of valid pixels."""
+    return int(arrCounts.sum())
+
+
+def hist_min(arrCounts):
+    """Smallest value with a count, or NaN if there are no valid pixels."""
+    arrNonZero = np.flatnonzero(arrCounts)
+    return float(arrNonZero[0]) if arrNonZero.size > 0 else np.nan
+
+
+def hist_max(arrCounts):
+    """Largest value with a count, or NaN if there are no valid pixels."""
+    arrNonZero = np.flatnonzero(arrCounts)
+    return float(arrNonZero[-1]) if arrNonZero.size > 0 else np.nan
+
+
+def hist_mean(arrCounts):
+    """Mean of the values, or NaN if there are no valid pixels."""
+    intCount = hist_count(arrCounts)
+    if intCount == 0:
+        return np.nan
+    return float(np.dot(np.arange(arrCounts.size, dtype=np.float64), arrCounts) / intCount)
+
+
+def hist_std(arrCounts):
+    """Population standard deviation of the values (the same as numpy.nanstd), or NaN if there are no valid pixels."""
+    intCount = hist_count(arrCounts)
+    if intCount == 0:
+        return np.nan
+    arrValues = np.arange(arrCounts.size, dtype=np.float64)
+    valMean = np.dot(arrValues, arrCounts) / intCount
+    return float(np.sqrt(np.dot((arrValues - valMean) ** 2, arrCounts) / intCount))
+
+
+def hist_percentile(arrCounts, valPercentile):
+    """Exact percentile of the values using the linear interpolation of numpy.nanpercentile.
+
+    The sorted pixel at rank r is the first value whose cumulative count is greater than r, so no sorting is needed.
+    """
+    intCount = hist_count(arrCounts)
+    if intCount == 0:
+        return np.nan
+    valRank = (intCount - 1) * valPercentile / 100.0
+    intLower = int(np.floor(valRank))
+    intUpper = min(intLower + 1, intCount - 1)
+    arrCumulative = np.cumsum(arrCounts)
+    valLower, valUpper = np.searchsorted(arrCumulative, [intLower, intUpper], side="right")
+    return float(valLower + (valRank - intLower) * (valUpper - valLower))
+
+
+def stat_name(valStat):
+    """Name of a statistic as written to the Stats column, e.g. 5 -> '5pc', 'mean' -> 'mean'."""
+    if isinstance(valStat, str):
+        return valStat
+    return "{:g}pc".format(valStat)
+
+
+def summarise_histogram(arrCounts, lsStats):
+    """Return a list of (name, value) for each statistic in lsStats.
+
+    Numbers in lsStats are percentiles.  The names 'mean', 'STdev', 'min', 'max', 'count' and 'median' are also
+    recognised.
+    """
+    dicFunctions = {"mean": hist_mean, "STdev": hist_std, "min": hist_min, "max": hist_max, "count": hist_count,
+                    "median": lambda arr: hist_percentile(arr, 50)}
+    lsOut = []
+    for valStat in lsStats:
+        if isinstance(valStat, str):
+            if valStat not in dicFunctions:
+                raise Exception("The statistic {} is not recognised.  Use a percentile number or one of {}".format(valStat, sorted(dicFunctions)))
+            lsOut.append((valStat, dicFunctions[valStat](arrCounts)))
+        else:
+            lsOut.append((stat_name(valStat), hist_percentile(arrCounts, valStat)))
+    return lsOut
+
+
+def raster_statistics(pathRaster, lsStats):
+    """Read a raster once and return a list of (name, value) for every statistic in lsStats."""
+    return summarise_histogram(raster_histogram(pathRaster), lsStats)
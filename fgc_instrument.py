@@ -0,0 +1,211 @@
+"""
+Created For: Department of Primary Industries and Regional Development, Western Australia
+Date: October 2026
+Purpose: Per stage timing and I/O records for the fgc scripts, so that the slow steps of a run can be found from
+         numbers rather than from the times of printed messages.
+
+         A RunLog writes one JSON object per line (JSON lines) to a file next to the outputs, e.g.
+         fgc05_timings.jsonl in pathOut.  Each record is one stage of the run, or one stage for one image, with:
+                  run            the time the run started, the same for every record of a run
+                  script         the script that wrote the record
+                  stage, image   what was measured ("image" is empty for stages that are not for one image)
+                  start          the time the stage started
+                  seconds        wall time
+                  bytes_read     bytes the process caused to be read from storage during the stage, including
+                                 pages of memory mapped files such as the season cube (fgc_cube)
+                  bytes_written  bytes the process caused to be written to storage during the stage
+                  blocks         block windows processed (the windows of fgc_common.iter_windows)
+                  peak_rss_mb    peak resident memory of the process during the stage
+                  pid, ok        the process that ran the stage and whether it finished without an error
+         Stages run in worker processes by fgc_common.run_parallel are measured in the worker and the record is
+         written by the main process, so only one process writes to the file.
+
+         If pathProfile is given each stage is also run under cProfile and the statistics are saved to
+         <script>_<stage>_<image>.prof in pathProfile, which can be read with pstats or snakeviz.  Stages can be
+         nested (e.g. a whole run around the stages of each image), in which case the outer stage includes the inner
+         and only the outer stage is profiled.
+
+NOTE:
+This module only uses the Python standard library so it works with both the arcpy and GDAL engines.  Bytes read and
+written and the peak memory of a single stage come from /proc on Linux.  The bytes are read_bytes and write_bytes of
+/proc/self/io, so pipes and the pickled jobs of fgc_common.run_parallel are not counted, and nor are reads served
+from the operating system's file cache.  On Windows they come from the psutil package if it is installed, where the
+peak memory is the peak of the whole process so far.  Values that can not be found are written as null.
+
+This script is in development and care should be taken when using.
+
+No guarentees are given and users should do their own validation.
+"""
+#Import necessary packages
+import contextlib
+import cProfile
+import datetime
+import json
+import os
+import re
+import time
+
+#Count of block windows processed by this process (see count_block) and the number of stages being measured
+_dicCounters = {"blocks": 0, "depth": 0}
+
+
+def count_block(intBlocks=1):
+    """Add to the count of block windows processed by this process."""
+    _dicCounters["blocks"] += intBlocks
+
+
+def _io_bytes():
+    """Return (bytes read from, bytes written to) storage by this process so far, or (None, None)."""
+    try:
+        with open("/proc/self/io", "r") as fin:
+            dicIo = dict(line.split(":") for line in fin.read().splitlines() if ":" in line)
+        return int(dicIo["read_bytes"]), int(dicIo["write_bytes"])
+    except (OSError, KeyError, ValueError):
+        pass
+    try:
+        import psutil
+        ioCounters = psutil.Process().io_counters()
+        return ioCounters.read_bytes, ioCounters.write_bytes
+    except Exception:
+        return None, None
+
+
+def _reset_peak_rss():
+    """Reset the peak resident memory of this process so the next reading is the peak of one stage (Linux only)."""
+    try:
+        with open("/proc/self/clear_refs", "w") as fout:
+            fout.write("5")
+    except OSError:
+        pass
+
+
+def _peak_rss_mb():
+    """Peak resident memory of this process in megabytes, or None."""
+    try:
+        with open("/proc/self/status", "r") as fin:
+            valKb = re.search(r"VmHWM:\s+(\d+)\s+kB", fin.read())
+        if valKb is not None:
+            return int(valKb.group(1)) / 1024.0
+    except OSError:
+        pass
+    try:
+        import psutil
+        infoMemory = psutil.Process().memory_info()
+        return getattr(infoMemory, "peak_wset", infoMemory.rss) / (1024.0 * 1024.0)
+    except Exception:
+        return None
+
+
+def _file_part(strText):
+    return re.sub(r"[^A-Za-z0-9_.-]+", "_", strText)[:80]
+
+
+class StageTimer(object):
+    """Measures one stage of this process between start() and stop()."""
+
+    def __init__(self, strStage, strImage="", pathProfile="", strScript=""):
+        self.strStage = strStage
+        self.strImage = strImage
+        self.pathProfile = pathProfile
+        self.strScript = strScript
+        self.profile = None
+
+    def start(self):
+        #The peak is only reset (and the profile only made) by the outer stage, so it includes any inner stages
+        blnOuter = _dicCounters["depth"] == 0
+        if blnOuter:
+            _reset_peak_rss()
+        _dicCounters["depth"] += 1
+        self.valStart = time.time()
+        self.timeStart = time.perf_counter()
+        self.intRead, self.intWritten = _io_bytes()
+        self.intBlocks = _dicCounters["blocks"]
+        if blnOuter and len(self.pathProfile) > 0:
+            self.profile = cProfile.Profile()
+            self.profile.enable()
+        return self
+
+    def stop(self, blnOk=True):
+        """Return the record of the stage."""
+        _dicCounters["depth"] -= 1
+        if self.profile is not None:
+            self.profile.disable()
+            os.makedirs(self.pathProfile, exist_ok=True)
+            lsParts = [strPart for strPart in (self.strScript, self.strStage, os.path.basename(self.strImage)) if len(strPart) > 0]
+            self.profile.dump_stats(os.path.join(self.pathProfile, _file_part("_".join(lsParts)) + ".prof"))
+            self.profile = None
+        valSeconds = time.perf_counter() - self.timeStart
+        intRead, intWritten = _io_bytes()
+        valPeak = _peak_rss_mb()
+        return {"stage": self.strStage, "image": self.strImage,
+                "start": datetime.datetime.fromtimestamp(self.valStart).isoformat(timespec="seconds"),
+                "seconds": round(valSeconds, 4),
+                "bytes_read": intRead - self.intRead if intRead is not None and self.intRead is not None else None,
+                "bytes_written": intWritten - self.intWritten if intWritten is not None and self.intWritten is not None else None,
+                "blocks": _dicCounters["blocks"] - self.intBlocks,
+                "peak_rss_mb": round(valPeak, 1) if valPeak is not None else None,
+                "pid": os.getpid(), "ok": blnOk}
+
+
+def measure(func, lsArgs, strStage, strImage="", pathProfile="", strScript=""):
+    """Run func(*lsArgs) as one stage and return (result, record).  Used by fgc_common.run_parallel in workers.
+
+    If func raises an error the record of the failed stage is attached to the error as error.dicRecord.
+    """
+    timer = StageTimer(strStage, strImage, pathProfile, strScript).start()
+    try:
+        valOut = func(*lsArgs)
+    except Exception as error:
+        error.dicRecord = timer.stop(False)
+        raise
+    return valOut, timer.stop()
+
+
+class RunLog(object):
+    """JSON lines log of the stages of one run of a script.
+
+    pathLog is appended to, so the records of earlier runs are kept (each run has its own "run" value).  With
+    pathLog = "" nothing is measured or written, so scripts can call the log whether or not timings are wanted.
+    """
+
+    def __init__(self, pathLog, strScript, pathProfile=""):
+        self.pathLog = pathLog
+        self.strScript = strScript
+        self.pathProfile = pathProfile
+        self.blnEnabled = len(pathLog) > 0
+        self.strRun = datetime.datetime.now().isoformat(timespec="seconds")
+        if self.blnEnabled:
+            strDir = os.path.dirname(os.path.abspath(pathLog))
+            if not os.path.exists(strDir):
+                os.makedirs(strDir)
+
+    def start(self, strStage, strImage=""):
+        """Start measuring a stage.  Pass the returned timer to stop() at the end of the stage."""
+        if not self.blnEnabled:
+            return None
+        return StageTimer(strStage, strImage, self.pathProfile, self.strScript).start()
+
+    def stop(self, timer, blnOk=True):
+        """Finish measuring the stage of a timer from start() and write its record."""
+        if timer is not None:
+            self.write(timer.stop(blnOk))
+
+    def write(self, dicRecord):
+        """Append a record (from a StageTimer) to the log."""
+        if not self.blnEnabled:
+            return
+        dicLine = {"run": self.strRun, "script": self.strScript}
+        dicLine.update(dicRecord)
+        with open(self.pathLog, "a") as fout:
+            fout.write(json.dumps(dicLine) + "\n")
+
+    @contextlib.contextmanager
+    def stage(self, strStage, strImage=""):
+        """Measure the code in a with block as one stage, e.g. with runLog.stage("median"): ..."""
+        timer = self.start(strStage, strImage)
+        blnOk = False
+        try:
+            yield
+            blnOk = True
+        finally:
+            self.stop(timer, blnOk)
@@ -0,0 +1,201 @@
+"""
+Created For: Department of Primary Industries and Regional Development, Western Australia
+Date: October 2026
+Purpose: A lazily evaluated dask/xarray engine for fgc05, so the analysis scales with the cores and memory of the
+         computer it runs on without choosing window sizes or batches by hand.
+
+         The selected seasonal GeoTIFFs (and the anomaly images) are opened as one chunked (time, y, x) xarray
+         DataArray (season_stack).  Each chunk holds every GeoTIFF and is read with fgc_temporal.SeasonStack, so
+         GeoTIFFs on a different grid, dima2 GeoTIFFs and the mask are handled as in season_products.  Nothing is
+         read until the outputs are computed.
+
+         season_graph expresses every output of a season on such an array: the valid year count, the bad year count
+         and ratio for each threshold, the median and the anomaly.  The counts are reductions over time and the
+         median and ratio are fgc_temporal.stack_median_sum and fgc_temporal.bad_year_ratio mapped over the chunks, so the
+         outputs are the same as fgc_temporal.season_products.
+
+         lazy_season_products stores every output of every season with one dask.array.store call, so the whole run
+         is one task graph.  The dask scheduler reads each chunk once for all of the outputs, runs intWorkers
+         threads and writes the outputs of a chunk as soon as they are found, so memory use depends on the number of
+         threads and the chunk size but not on the size of the rasters.  GDAL and numpy release the GIL while they
+         read, decompress, compare and sort, so the threads use that many cores without copying the stack between
+         processes.
+
+NOTE:
+This module requires the osgeo (GDAL), numpy, dask and xarray packages.  The threads share the GDAL block cache of
+the process.
+
+This script is in development and care should be taken when using.
+
+No guarentees are given and users should do their own validation.
+"""
+#Import necessary packages
+import threading
+
+import dask.array as da
+import numpy as np
+import xarray as xr
+
+import fgc_common
+import fgc_temporal
+
+#SeasonStack of each thread, as a GDAL dataset can only be read by one thread at a time
+_threadStacks = threading.local()
+
+
+def _thread_stack(tupPathRas, pathMask):
+    """The SeasonStack of the GeoTIFFs for this thread, opened once and kept for the chunks the thread reads."""
+    tupKey = (tupPathRas, pathMask)
+    if getattr(_threadStacks, "tupKey", None) != tupKey:
+        _threadStacks.stack = fgc_temporal.SeasonStack(list(tupPathRas), pathMask)
+        _threadStacks.tupKey = tupKey
+    return _threadStacks.stack
+
+
+def _read_block(tupPathRas=(), pathMask="", block_info=None):
+    """Read the (time, y, x) block of the stack given by dask's block_info, see SeasonStack.read."""
+    (intYStart, intYEnd), (intXStart, intXEnd) = block_info[None]["array-location"][1:]
+    return _thread_stack(tupPathRas, pathMask).read(intXStart, intYStart, intXEnd - intXStart, intYEnd - intYStart)
+
+
+def _read_inside(tupPathRas=(), pathMask="", block_info=None):
+    """Read the (y, x) block of the mask given by dask's block_info, see SeasonStack.inside."""
+    (intYStart, intYEnd), (intXStart, intXEnd) = block_info[None]["array-location"]
+    return _thread_stack(tupPathRas, pathMask).inside(intXStart, intYStart, intXEnd - intXStart, intYEnd - intYStart)
+
+
+def _time_median_sum(arrStack):
+    """stack_median_sum of a stack with time as the last axis (as given by xarray.apply_ufunc)."""
+    return fgc_temporal.stack_median_sum(np.moveaxis(arrStack, -1, 0))
+
+
+class _OutputTarget(object):
+    """One output GeoTIFF of a fgc_temporal.SeasonOutputs as a target of dask.array.store."""
+
+    def __init__(self, outputs, key):
+        self.outputs = outputs
+        self.key = key
+
+    def __setitem__(self, tupRegion, arrChunk):
+        sliceY, sliceX = tupRegion
+        self.outputs.write_products(sliceX.start, sliceY.start, {self.key: arrChunk})
+
+
+def chunk_shape(stack, intChunkSize=0):
+    """Return the (width, height) of the chunks of a SeasonStack.  By default each chunk of the whole stack holds
+    about fgc_temporal.STACK_PIXELS values and is a whole number of the internal blocks of the first GeoTIFF."""
+    if intChunkSize > 0:
+        intWidth, intHeight = intChunkSize, intChunkSize
+    else:
+        intWindowPixels = max(fgc_temporal.STACK_PIXELS // len(stack.lsPathRas), fgc_temporal.MIN_WINDOW_PIXELS)
+        intWidth, intHeight = fgc_common.window_shape(stack.lsBands[0][1], intWindowPixels)
+    return min(intWidth, stack.window[2]), min(intHeight, stack.window[3])
+
+
+def season_stack(lsPathRas, pathMask="", intChunkSize=0):
+    """Open GeoTIFFs as a lazy, chunked (time, y, x) uint8 xarray DataArray with NoData (and pixels outside the mask)
+    as 255, on the grid and extent of fgc_temporal.SeasonStack.  Each chunk holds every GeoTIFF (see chunk_shape)
+    and is read by the thread that computes it.
+
+    Returns (arrStack, arrInside, stack) where arrInside is the (y, x) boolean DataArray of the mask and stack is the
+    SeasonStack, which gives the grid (stack.dsRef) and extent (stack.window).  The time coordinate is the period of
+    each GeoTIFF (e.g. 201903201905) and x and y are the coordinates of the pixel centres.
+    """
+    stack = fgc_temporal.SeasonStack(lsPathRas, pathMask)
+    intXSize, intYSize = stack.window[2], stack.window[3]
+    intWidth, intHeight = chunk_shape(stack, intChunkSize)
+    tupYChunks = tuple(min(intHeight, intYSize - intYOff) for intYOff in range(0, intYSize, intHeight))
+    tupXChunks = tuple(min(intWidth, intXSize - intXOff) for intXOff in range(0, intXSize, intWidth))
+    tupPathRas = tuple(lsPathRas)
+    arrData = da.map_blocks(_read_block, tupPathRas=tupPathRas, pathMask=pathMask, chunks=((len(tupPathRas),), tupYChunks, tupXChunks),
+                            dtype=np.uint8, meta=np.empty((0, 0, 0), dtype=np.uint8))
+    arrInsideData = da.map_blocks(_read_inside, tupPathRas=tupPathRas, pathMask=pathMask, chunks=(tupYChunks, tupXChunks),
+                                  dtype=bool, meta=np.empty((0, 0), dtype=bool))
+
+    lsGeoTransform = fgc_common.window_geotransform(stack.dsRef.GetGeoTransform(), stack.window)
+    dicCoords = {"y": lsGeoTransform[3] + (np.arange(intYSize) + 0.5) * lsGeoTransform[5],
+                 "x": lsGeoTransform[0] + (np.arange(intXSize) + 0.5) * lsGeoTransform[1]}
+    arrStack = xr.DataArray(arrData, dims=("time", "y", "x"), name="tvc",
+                            coords=dict(dicCoords, time=[fgc_common.tvc_name(pathRas)[7:19] for pathRas in lsPathRas]))
+    arrInside = xr.DataArray(arrInsideData, dims=("y", "x"), coords=dicCoords, name="inside")
+    return arrStack, arrInside, stack
+
+
+def season_graph(arrStack, arrInside, lsThreshold, blnMedian=True, arrImage=None):
+    """Return the lazy outputs of one season's (time, y, x) stack, keyed like fgc_temporal.SeasonOutputs.dicOut.
+
+    arrImage is the (y, x) anomaly image with NoData as 255.  The median and anomaly are only included with
+    blnMedian (and arrImage for the anomaly).
+    """
+    arrValid = (arrStack != fgc_common.NODATA_U8).sum("time")
+    dicProducts = {"valid": xr.where(arrInside, np.minimum(arrValid, fgc_common.NODATA_U8 - 1), fgc_common.NODATA_U8).astype(np.uint8)}
+    for intThreshold in lsThreshold:
+        arrBad = (arrStack <= intThreshold).sum("time")
+        dicProducts[("bad", intThreshold)] = xr.where(arrInside, np.minimum(arrBad, fgc_common.NODATA_U8 - 1),
+                                                      fgc_common.NODATA_U8).astype(np.uint8)
+        dicProducts[("ratio", intThreshold)] = xr.apply_ufunc(fgc_temporal.bad_year_ratio, arrBad, arrValid, dask="parallelized",
+                                                              output_dtypes=[np.uint8])
+    if not blnMedian:
+        return dicProducts
+    arrMedianSum = xr.apply_ufunc(_time_median_sum, arrStack, input_core_dims=[["time"]], dask="parallelized",
+                                  output_dtypes=[np.uint16])
+    arrMedian = (arrMedianSum // 2).astype(np.uint8)
+    arrHasMedian = arrMedian != fgc_common.NODATA_U8
+    dicProducts["median"] = xr.where(arrHasMedian, arrMedian, fgc_temporal.NODATA_I16).astype(np.int16)
+    dicProducts["median8Bit"] = arrMedian
+    if arrImage is not None:
+        arrHasAnomaly = arrHasMedian & (arrImage != fgc_common.NODATA_U8)
+        arrAnomaly, arrAnomaly8Bit = fgc_temporal.median_anomaly(arrImage, arrMedianSum)
+        dicProducts["anomaly"] = xr.where(arrHasAnomaly, arrAnomaly, fgc_temporal.NODATA_I16).astype(np.int16)
+        dicProducts["anomaly8Bit"] = xr.where(arrHasAnomaly, arrAnomaly8Bit, fgc_common.NODATA_U8).astype(np.uint8)
+    return dicProducts
+
+
+def lazy_season_products(dicSeasonRas, lsThreshold, dicSeasonPaths, pathMask="", dicAnomalyImage=None, dicClr=None,
+                         intWorkers=1, intChunkSize=0):
+    """Write the same outputs as fgc_temporal.season_products from one dask task graph over a season_stack.
+
+    The arguments are as for season_products.  The graph is run on intWorkers threads (in this thread with
+    intWorkers = 1) with chunks of intChunkSize pixels square, or sized from the number of GeoTIFFs with 0.
+    Returns the number of chunks.
+    """
+    if dicAnomalyImage is None:
+        dicAnomalyImage = {}
+    lsSeasons = list(dicSeasonRas)
+    lsPathRas = []
+    dicIndex = {}
+    for strSeason in lsSeasons:
+        dicIndex[strSeason] = list(range(len(lsPathRas), len(lsPathRas) + len(dicSeasonRas[strSeason])))
+        lsPathRas += dicSeasonRas[strSeason]
+    #The anomaly images are extra layers of the stack so they are read with the same chunks as the seasons
+    dicImageIndex = {}
+    for strSeason in lsSeasons:
+        if "anomaly" in dicSeasonPaths[strSeason] and len(dicAnomalyImage.get(strSeason, "")) > 0:
+            dicImageIndex[strSeason] = len(lsPathRas)
+            lsPathRas.append(dicAnomalyImage[strSeason])
+    arrStack, arrInside, stack = season_stack(lsPathRas, pathMask, intChunkSize)
+
+    dicOut = {}
+    lsSources = []
+    lsTargets = []
+    for strSeason in lsSeasons:
+        dicOut[strSeason] = fgc_temporal.SeasonOutputs(stack.dsRef, stack.window, dicSeasonPaths[strSeason], lsThreshold,
+                                                       dicClr, dicAnomalyImage.get(strSeason, ""))
+        arrImage = arrStack.isel(time=dicImageIndex[strSeason]) if strSeason in dicImageIndex else None
+        dicProducts = season_graph(arrStack.isel(time=dicIndex[strSeason]), arrInside, lsThreshold, dicOut[strSeason].blnMedian,
+                                   arrImage)
+        for key in dicOut[strSeason].dicOut:
+            lsSources.append(dicProducts[key].data)
+            lsTargets.append(_OutputTarget(dicOut[strSeason], key))
+
+    #The scheduler reads each chunk once for every output and writes the outputs of a chunk as soon as they are
+    #found, so only the chunks being worked on are held in memory.  The lock lets one thread write at a time.
+    if intWorkers > 1:
+        da.store(lsSources, lsTargets, lock=True, scheduler="threads", num_workers=intWorkers)
+    else:
+        da.store(lsSources, lsTargets, lock=True, scheduler="synchronous")
+    for outputs in dicOut.values():
+        outputs.close()
+    intChunks = arrInside.data.npartitions
+    del dicOut, stack, arrStack, arrInside
+    return intChunks
@@ -0,0 +1,89 @@
+"""
+Created For: Department of Primary Industries and Regional Development, Western Australia
+Date: October 2026
+Purpose: A small manifest that records, for every input data set, its size, modification time and content hash
+         along with the processing parameters and the outputs that were created from it.  Scripts use the manifest to
+         rebuild only the outputs whose inputs or parameters have changed since the last run, rather than
+         regenerating every output.
+
+         The manifest is a JSON text file stored with the outputs, e.g. {pathOut}\fgc03_manifest.json
+
+NOTE:
+This module only uses the Python standard library so it works with both the arcpy and GDAL engines.
+
+This script is in development and care should be taken when using.
+
+No guarentees are given and users should do their own validation.
+"""
+#Import necessary packages
+import hashlib
+import json
+import os
+
+#Bytes read at a time when hashing a file
+HASH_CHUNK = 4 * 1024 * 1024
+
+
+def file_hash(pathFile):
+    """Return the sha256 hex digest of the content of a file, read in chunks."""
+    hasher = hashlib.sha256()
+    with open(pathFile, "rb") as fin:
+        for chunk in iter(lambda: fin.read(HASH_CHUNK), b""):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+def file_signature(pathFile, dicPrevious=None):
+    """Return {"size", "mtime", "sha256"} for a file.
+
+    If dicPrevious (an earlier signature of the same file) has the same size and modification time its hash is
+    reused, so unchanged files are not read again.
+    """
+    stat = os.stat(pathFile)
+    dicSignature = {"size": stat.st_size, "mtime": stat.st_mtime}
+    if dicPrevious is not None and dicPrevious.get("size") == stat.st_size and dicPrevious.get("mtime") == stat.st_mtime:
+        dicSignature["sha256"] = dicPrevious["sha256"]
+    else:
+        dicSignature["sha256"] = file_hash(pathFile)
+    return dicSignature
+
+
+def load_manifest(pathManifest):
+    """Read a manifest, returning an empty manifest if the file does not exist yet."""
+    if not os.path.exists(pathManifest):
+        return {}
+    with open(pathManifest, "r") as fin:
+        return json.load(fin)
+
+
+def save_manifest(pathManifest, dicManifest):
+    """Write a manifest.  A temporary file is replaced so a crash never leaves a half written manifest."""
+    pathTemp = pathManifest + ".tmp"
+    with open(pathTemp, "w") as fout:
+        json.dump(dicManifest, fout, indent=1, sort_keys=True)
+    os.replace(pathTemp, pathManifest)
+
+
+def needs_rebuild(dicEntry, dicSignature, dicParams, lsPathOutputs):
+    """Return True if the outputs of an input must be regenerated.
+
+    This is the case when the input has no manifest entry, its content hash or size has changed, the processing
+    parameters differ from those recorded, or any of the expected outputs is missing.
+    """
+    if dicEntry is None:
+        return True
+    dicOld = dicEntry.get("input", {})
+    if dicOld.get("sha256") != dicSignature["sha256"] or dicOld.get("size") != dicSignature["size"]:
+        return True
+    if dicEntry.get("params") != dicParams:
+        return True
+    for pathOutput in lsPathOutputs:
+        if not os.path.exists(pathOutput):
+            return True
+    return False
+
+
+def record(dicManifest, strKey, dicSignature, dicParams, lsPathOutputs):
+    """Add or replace the manifest entry for an input."""
+    dicManifest[strKey] = {"input": dicSignature, "params": dicParams,
+                           "outputs": [os.path.basename(pathOutput) for pathOutput in lsPathOutputs]}
@@ -0,0 +1,220 @@
+"""
+Created For: Department of Primary Industries and Regional Development, Western Australia
+Date: October 2026
+Purpose: Synthetic AusCover like inputs for benchmarking the fgc scripts without downloading any imagery (see
+         fgc_benchmark.py).
+
+         Every data set is on a square grid of intSize by intSize 30 metre cells in Australian Albers (EPSG:3577)
+         and is written one block of rows at a time, so large sizes can be made without holding them in memory.
+         Cover varies smoothly across the grid (a sum of sine waves with random directions), changes with the
+         season and the year, and has random noise added.  Round patches of NoData stand in for cloud and
+         missing data.  The data sets are:
+                  lztmre_wa_m<period>_dima2.tif   4 band seasonal fractional cover (bare, PV, NPV, unmixing error)
+                                                  with the AusCover offset of 100 and NoData 0 (input of fgc03)
+                  acfgcs_<period>_TVCpc.tif       uint8 Total Vegetation Cover percentage, 0 to 100 with NoData 255
+                                                  (input of fgc04, fgc05 and fgc06)
+                  zones.shp                       rectangular polygons with a mu_name field (input of fgc04)
+                  mask.tif                        uint8 raster mask, 1 inside an ellipse and NoData outside
+         <period> is the start and end year and month of a season, e.g. 201903201905 for Autumn 2019.
+
+NOTE:
+This module requires the osgeo (GDAL) and numpy packages.  The inputs are random and only suitable for measuring
+speed and memory use, not for checking results.
+
+This script is in development and care should be taken when using.
+
+No guarentees are given and users should do their own validation.
+"""
+#Import necessary packages
+import os
+
+import numpy as np
+from osgeo import gdal
+from osgeo import ogr
+from osgeo import osr
+
+import fgc_common
+
+#Coordinate system of the synthetic grid (Australian Albers)
+SYNTH_EPSG = 3577
+#Cell size of the synthetic grid in metres
+CELL_SIZE = 30.0
+#Top left corner of the synthetic grid in Australian Albers metres (the south west of Western Australia)
+ORIGIN = (-1500000.0, -3300000.0)
+#Dictionary of Seasons and their start months, as in fgc05
+SEASON_MONTHS = dict([("Summer", 12), ("Autumn", 3), ("Winter", 6), ("Spring", 9)])
+#NoData of the dima2 bands
+NODATA_DIMA2 = 0
+#Number of round NoData patches in each image
+NODATA_PATCHES = 12
+
+
+def synthetic_grid(intSize):
+    """Return the (geotransform, wkt) of the synthetic grid."""
+    srs = osr.SpatialReference()
+    srs.ImportFromEPSG(SYNTH_EPSG)
+    return (ORIGIN[0], CELL_SIZE, 0.0, ORIGIN[1], 0.0, -CELL_SIZE), srs.ExportToWkt()
+
+
+def season_period(intYear, strSeason):
+    """The <period> of a season in a file name, e.g. (2019, "Autumn") -> "201903201905"."""
+    intMonth = SEASON_MONTHS[strSeason]
+    intEndYear, intEndMonth = (intYear + 1, intMonth - 10) if intMonth + 2 > 12 else (intYear, intMonth + 2)
+    return "{:04d}{:02d}{:04d}{:02d}".format(intYear, intMonth, intEndYear, intEndMonth)
+
+
+def _create(pathOut, intSize, intBands, intDataType=gdal.GDT_Byte, valNodata=None):
+    lsGeoTransform, strWkt = synthetic_grid(intSize)
+    dsOut = gdal.GetDriverByName("GTiff").Create(pathOut, intSize, intSize, intBands, intDataType,
+                                                 options=fgc_common.GTIFF_OPTIONS + ["INTERLEAVE=BAND"])
+    dsOut.SetGeoTransform(lsGeoTransform)
+    dsOut.SetProjection(strWkt)
+    if valNodata is not None:
+        for intBand in range(intBands):
+            dsOut.GetRasterBand(intBand + 1).SetNoDataValue(valNodata)
+    return dsOut
+
+
+def _row_blocks(intSize):
+    """(yoff, rows, column index, row index) for blocks of whole rows of the grid."""
+    intRows = max(1, fgc_common.WINDOW_PIXELS // intSize)
+    for intYOff in range(0, intSize, intRows):
+        intYSize = min(intRows, intSize - intYOff)
+        arrCol, arrRow = np.meshgrid(np.arange(intSize, dtype=np.float32), np.arange(intYOff, intYOff + intYSize, dtype=np.float32))
+        yield intYOff, intYSize, arrCol, arrRow
+
+
+def _field(arrCol, arrRow, intSize, intSeed, intWaves=6):
+    """Smooth field between 0 and 1 made of intWaves sine waves with random directions and wave lengths."""
+    rng = np.random.default_rng(intSeed)
+    arrField = np.zeros(arrCol.shape, dtype=np.float32)
+    for intWave in range(intWaves):
+        valAngle = rng.uniform(0, 2 * np.pi)
+        valFrequency = rng.uniform(1.0, 6.0) * 2 * np.pi / intSize
+        arrField += np.sin(valFrequency * (np.cos(valAngle) * arrCol + np.sin(valAngle) * arrRow) + rng.uniform(0, 2 * np.pi))
+    return (arrField / intWaves + 1) / 2
+
+
+def _patches(arrCol, arrRow, intSize, intSeed, intPatches=NODATA_PATCHES):
+    """Boolean array that is True inside intPatches random round patches (cloud and missing data)."""
+    rng = np.random.default_rng(intSeed)
+    arrPatch = np.zeros(arrCol.shape, dtype=bool)
+    for intPatch in range(intPatches):
+        valCol, valRow = rng.uniform(0, intSize, 2)
+        valRadius = rng.uniform(0.01, 0.06) * intSize
+        arrPatch |= (arrCol - valCol) ** 2 + (arrRow - valRow) ** 2 < valRadius ** 2
+    return arrPatch
+
+
+def _cover(arrCol, arrRow, intSize, intYear, strSeason, intSeed):
+    """Total cover between 0 and 1: a fixed landscape pattern with a seasonal cycle and a year to year change."""
+    arrLandscape = _field(arrCol, arrRow, intSize, intSeed)
+    valSeason = {"Summer": -0.15, "Autumn": -0.1, "Winter": 0.1, "Spring": 0.15}[strSeason]
+    valYear = 0.1 * np.sin(intYear * 1.7)
+    return np.clip(0.15 + 0.7 * arrLandscape + valSeason + valYear + 0.1 * (_field(arrCol, arrRow, intSize, intSeed + intYear) - 0.5), 0, 1)
+
+
+def write_dima2(pathDir, intSize, intYear, strSeason, intSeed=0):
+    """Write a 4 band AusCover seasonal fractional cover GeoTIFF.  Returns its pathway."""
+    pathOut = os.path.join(pathDir, "lztmre_wa_m" + season_period(intYear, strSeason) + "_dima2.tif")
+    dsOut = _create(pathOut, intSize, 4, valNodata=NODATA_DIMA2)
+    intImageSeed = intSeed * 100003 + intYear * 17 + SEASON_MONTHS[strSeason]
+    rng = np.random.default_rng(intImageSeed)
+    for intYOff, intYSize, arrCol, arrRow in _row_blocks(intSize):
+        arrCover = _cover(arrCol, arrRow, intSize, intYear, strSeason, intSeed)
+        arrGreen = _field(arrCol, arrRow, intSize, intImageSeed)
+        #Noise takes some fractions below 0 and above 100 so the trimming in fgc03 is used
+        arrPV = 100 * arrCover * arrGreen + rng.normal(0, 4, arrCover.shape)
+        arrNPV = 100 * arrCover * (1 - arrGreen) + rng.normal(0, 4, arrCover.shape)
+        arrBare = 100 - arrPV - arrNPV
+        arrError = np.abs(rng.normal(0, 6, arrCover.shape))
+        arrMissing = _patches(arrCol, arrRow, intSize, intImageSeed)
+        for intBand, arrBand in enumerate((arrBare, arrPV, arrNPV, arrError)):
+            arrOut = np.clip(np.rint(arrBand) + fgc_common.AUSCOVER_OFFSET, 1, 254).astype(np.uint8)
+            arrOut[arrMissing] = NODATA_DIMA2
+            dsOut.GetRasterBand(intBand + 1).WriteArray(arrOut, 0, intYOff)
+    dsOut.FlushCache()
+    del dsOut
+    return pathOut
+
+
+def write_tvc(pathDir, intSize, intYear, strSeason, intSeed=0):
+    """Write a uint8 Total Vegetation Cover percentage GeoTIFF.  Returns its pathway."""
+    pathOut = os.path.join(pathDir, "acfgcs_" + season_period(intYear, strSeason) + "_TVCpc.tif")
+    dsOut = _create(pathOut, intSize, 1, valNodata=fgc_common.NODATA_U8)
+    intImageSeed = intSeed * 100003 + intYear * 17 + SEASON_MONTHS[strSeason]
+    rng = np.random.default_rng(intImageSeed)
+    for intYOff, intYSize, arrCol, arrRow in _row_blocks(intSize):
+        arrTVC = 100 * _cover(arrCol, arrRow, intSize, intYear, strSeason, intSeed) + rng.normal(0, 3, arrCol.shape)
+        arrOut = np.clip(np.rint(arrTVC), 0, 100).astype(np.uint8)
+        arrOut[_patches(arrCol, arrRow, intSize, intImageSeed)] = fgc_common.NODATA_U8
+        dsOut.GetRasterBand(1).WriteArray(arrOut, 0, intYOff)
+    dsOut.FlushCache()
+    del dsOut
+    return pathOut
+
+
+def write_mask(pathDir, intSize):
+    """Write a uint8 raster mask that is 1 inside an ellipse covering most of the grid.  Returns its pathway."""
+    pathOut = os.path.join(pathDir, "mask.tif")
+    dsOut = _create(pathOut, intSize, 1, valNodata=0)
+    valCentre = intSize / 2.0
+    for intYOff, intYSize, arrCol, arrRow in _row_blocks(intSize):
+        arrInside = ((arrCol - valCentre) / (0.48 * intSize)) ** 2 + ((arrRow - valCentre) / (0.4 * intSize)) ** 2 < 1
+        dsOut.GetRasterBand(1).WriteArray(arrInside.astype(np.uint8), 0, intYOff)
+    dsOut.FlushCache()
+    del dsOut
+    return pathOut
+
+
+def write_zones(pathDir, intSize, intZonesPerSide=8, strFieldName="mu_name", intNames=20):
+    """Write a shapefile of intZonesPerSide by intZonesPerSide rectangles covering the grid.  Several rectangles
+    share each of the intNames values of strFieldName, so zones are made of more than one polygon.  Returns its
+    pathway."""
+    pathOut = os.path.join(pathDir, "zones.shp")
+    driver = ogr.GetDriverByName("ESRI Shapefile")
+    if os.path.exists(pathOut):
+        driver.DeleteDataSource(pathOut)
+    lsGeoTransform, strWkt = synthetic_grid(intSize)
+    srs = osr.SpatialReference()
+    srs.ImportFromWkt(strWkt)
+    dsOut = driver.CreateDataSource(pathOut)
+    layer = dsOut.CreateLayer("zones", srs=srs, geom_type=ogr.wkbPolygon)
+    layer.CreateField(ogr.FieldDefn(strFieldName, ogr.OFTString))
+    valStep = intSize * CELL_SIZE / intZonesPerSide
+    for intRow in range(intZonesPerSide):
+        for intCol in range(intZonesPerSide):
+            valX0, valY0 = lsGeoTransform[0] + intCol * valStep, lsGeoTransform[3] - intRow * valStep
+            ring = ogr.Geometry(ogr.wkbLinearRing)
+            for valX, valY in ((valX0, valY0), (valX0 + valStep, valY0), (valX0 + valStep, valY0 - valStep), (valX0, valY0 - valStep), (valX0, valY0)):
+                ring.AddPoint_2D(valX, valY)
+            polygon = ogr.Geometry(ogr.wkbPolygon)
+            polygon.AddGeometry(ring)
+            feature = ogr.Feature(layer.GetLayerDefn())
+            feature.SetGeometry(polygon)
+            feature.SetField(strFieldName, "zone_{:03d}".format((intRow * intZonesPerSide + intCol) % intNames))
+            layer.CreateFeature(feature)
+    del layer, dsOut
+    return pathOut
+
+
+def make_inputs(pathDir, intSize, intYears, yearStart=2000, lsSeasons=None, intSeed=0):
+    """Write a full set of synthetic inputs to pathDir and return a dictionary of their pathways:
+    "dima2" (the Autumn of each year), "tvc" (every season of each year), "zones" and "mask".
+
+    One extra year of TVC is written after the intYears so that fgc05 has an image to compare for the anomaly.
+    """
+    if lsSeasons is None:
+        lsSeasons = list(SEASON_MONTHS)
+    if not os.path.exists(pathDir):
+        os.makedirs(pathDir)
+    dicInputs = {"dima2": [], "tvc": []}
+    for intYear in range(yearStart, yearStart + intYears + 1):
+        if intYear < yearStart + intYears:
+            dicInputs["dima2"].append(write_dima2(pathDir, intSize, intYear, "Autumn", intSeed))
+        for strSeason in lsSeasons:
+            dicInputs["tvc"].append(write_tvc(pathDir, intSize, intYear, strSeason, intSeed))
+    dicInputs["tvc"].sort(key=os.path.basename)
+    dicInputs["zones"] = write_zones(pathDir, intSize)
+    dicInputs["mask"] = write_mask(pathDir, intSize)
+    return dicInputs
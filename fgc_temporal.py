@@ -0,0 +1,319 @@
+"""
+Created For: Department of Primary Industries and Regional Development, Western Australia
+Date: October 2026
+Purpose: GDAL/numpy engine for fgc05 (Time Series Analysis by Season).  It replaces the arcpy CellStatistics
+         MEDIAN, the anomaly map algebra and the Con/IsNull valid and bad year counts.
+
+         The seasonal TVCpc GeoTIFFs are treated as a stack (time, rows, columns) on the grid of the first
+         GeoTIFF.  Rather than loading the whole stack, the same block window is read from every GeoTIFF in turn,
+         so memory use depends on the number of seasons and the window size but not on the size of the rasters.
+         The window is made smaller as the number of seasons grows (see STACK_PIXELS).
+
+         The median of each pixel is found by sorting the window along time.  NoData (255) sorts after every
+         valid value (0 to 100), so the middle valid value(s) are picked from the count of valid seasons, the same
+         as CellStatistics with ignore_nodata="DATA".  With an even count the two middle values are averaged and
+         truncated to an integer, as happens when the arcpy median is copied to an integer GeoTIFF.  The anomaly
+         is found from the unrounded median (from the sum of the two middle values, see stack_median_sum), as the
+         arcpy Int(Float(final - median)) is, so with a median of x.5 it is not simply final minus median_.
+
+         The count of seasons with a valid pixel, the count of seasons at or below the threshold and the ratio of the
+         two are counted from the same block window, so no temporary GeoTIFFs are written.
+
+         season_products writes all of these outputs for any number of seasons and thresholds in a single pass.
+         Each block window of each GeoTIFF is read once and used for every output of its season, so a full
+         matrix of seasons and thresholds costs the same reading as a single run.
+
+NOTE:
+This module requires the osgeo (GDAL) and numpy packages.
+
+This script is in development and care should be taken when using.
+
+No guarentees are given and users should do their own validation.
+"""
+#Import necessary packages
+import os
+
+import numpy as np
+from osgeo import gdal
+
+import fgc_common
+
+#NoData value of signed 16 bit outputs (the same as arcpy.env.nodata = "MAXIMUM")
+NODATA_I16 = 32767
+#Approximate number of stack values (seasons x pixels) read in a single block window
+STACK_PIXELS = 32 * 1024 * 1024
+#Smallest number of pixels in a block window, however many seasons there are
+MIN_WINDOW_PIXELS = 256 * 256
+
+
+class SeasonStack(object):
+    """A list of seasonal TVCpc GeoTIFFs read as a (time, rows, columns) uint8 stack one block window at a time.
+
+    The grid is that of the first GeoTIFF.  Other GeoTIFFs on a different grid are resampled (nearest neighbour)
+    to it.  Raw dima2 GeoTIFFs can be given in place of TVCpc GeoTIFFs and their TVC is found as they are read.
+    If pathMask is given its extent is used as the extent of the outputs and pixels outside the mask are NoData
+    (like arcpy.env.mask and arcpy.env.extent).  NoData of every input is returned as 255.
+    """
+
+    def __init__(self, lsPathRas, pathMask=""):
+        if len(lsPathRas) == 0:
+            raise Exception("At least one Total Vegetation Cover GeoTIFF is needed for a season stack")
+        self.lsPathRas = list(lsPathRas)
+        self.dsRef = gdal.Open(self.lsPathRas[0])
+        self.lsBands = []
+        self.lsNodata = []
+        for pathRas in self.lsPathRas:
+            dsRas = self.open_on_grid(pathRas)
+            self.lsBands.append((dsRas, dsRas.GetRasterBand(1)))
+            self.lsNodata.append(dsRas.GetRasterBand(1).GetNoDataValue())
+        if len(pathMask) > 0:
+            self.mask = fgc_common.GridMask(pathMask, self.dsRef)
+            self.window = self.mask.window
+        else:
+            self.mask = None
+            self.window = (0, 0, self.dsRef.RasterXSize, self.dsRef.RasterYSize)
+
+    def open_on_grid(self, pathRas):
+        """Open a raster on the grid of the stack, resampling it only if its grid is different.  A dima2 GeoTIFF is
+        opened as its Total Vegetation Cover (see fgc_common.FusedTVCDataset)."""
+        dsRas = fgc_common.open_tvc(pathRas)
+        if (dsRas.GetGeoTransform() == self.dsRef.GetGeoTransform() and dsRas.RasterXSize == self.dsRef.RasterXSize
+                and dsRas.RasterYSize == self.dsRef.RasterYSize):
+            return dsRas
+        return fgc_common.open_on_grid(pathRas, self.dsRef.GetGeoTransform(), self.dsRef.RasterXSize,
+                                       self.dsRef.RasterYSize, self.dsRef.GetProjection())
+
+    def windows(self, intWindowPixels=None):
+        """Yield (xoff, yoff, xsize, ysize) block windows of the output extent.  Offsets are relative to the extent.
+
+        By default the windows are sized so that a window of the whole stack holds about STACK_PIXELS values.
+        """
+        if intWindowPixels is None:
+            intWindowPixels = max(STACK_PIXELS // len(self.lsPathRas), MIN_WINDOW_PIXELS)
+        intWidth, intHeight = fgc_common.window_shape(self.lsBands[0][1], intWindowPixels)
+        return fgc_common.iter_windows(self.window[2], self.window[3], intWidth, intHeight)
+
+    def inside(self, intXOff, intYOff, intXSize, intYSize):
+        """Boolean array that is True inside the mask (or everywhere with no mask) for a window of the extent."""
+        if self.mask is None:
+            return np.ones((intYSize, intXSize), dtype=bool)
+        return self.mask.read(self.window[0] + intXOff, self.window[1] + intYOff, intXSize, intYSize)
+
+    def read_band(self, intIndex, intXOff, intYOff, intXSize, intYSize):
+        """Read a window of the extent from one GeoTIFF as uint8 with NoData as 255 (the mask is not applied)."""
+        arrBand = self.lsBands[intIndex][1].ReadAsArray(self.window[0] + intXOff, self.window[1] + intYOff, intXSize, intYSize)
+        arrOut = arrBand.astype(np.uint8)
+        arrOut[~fgc_common.valid_pixels(arrBand, self.lsNodata[intIndex])] = fgc_common.NODATA_U8
+        return arrOut
+
+    def clip(self, lsTile):
+        """Limit the output extent to a tile (xoff, yoff, xsize, ysize) of the current extent."""
+        self.window = (self.window[0] + lsTile[0], self.window[1] + lsTile[1], lsTile[2], lsTile[3])
+
+    def read(self, intXOff, intYOff, intXSize, intYSize, lsIndex=None, arrInside=None):
+        """Read a window of the extent from every GeoTIFF (or those at the positions in lsIndex) as a
+        (time, rows, columns) uint8 stack.
+
+        NoData and pixels outside the mask are 255.  arrInside can be passed if the mask of the window has
+        already been read.
+        """
+        if lsIndex is None:
+            lsIndex = range(len(self.lsBands))
+        if arrInside is None:
+            arrInside = self.inside(intXOff, intYOff, intXSize, intYSize)
+        arrStack = np.empty((len(lsIndex), intYSize, intXSize), dtype=np.uint8)
+        for intLayer, intIndex in enumerate(lsIndex):
+            arrStack[intLayer] = self.read_band(intIndex, intXOff, intYOff, intXSize, intYSize)
+        arrStack[:, ~arrInside] = fgc_common.NODATA_U8
+        return arrStack
+
+
+def stack_median_sum(arrStack):
+    """Per pixel sum of the two middle values along time (axis 0) of a uint8 stack, ignoring NoData (255), which
+    is twice the unrounded median (the middle value is counted twice with an odd number of valid values).
+
+    Pixels without any valid value are 510, so halving the sum (with integer division) gives the median written to
+    median_ and median8Bit_ with NoData as 255.  Returns a uint16 array.
+    """
+    arrCount = np.count_nonzero(arrStack != fgc_common.NODATA_U8, axis=0)
+    arrSorted = np.sort(arrStack, axis=0)
+    arrLower = np.take_along_axis(arrSorted, (np.maximum(arrCount, 1) - 1)[np.newaxis] // 2, axis=0)[0]
+    arrUpper = np.take_along_axis(arrSorted, (arrCount // 2)[np.newaxis], axis=0)[0]
+    arrMedianSum = arrLower.astype(np.uint16) + arrUpper
+    arrMedianSum[arrCount == 0] = 2 * fgc_common.NODATA_U8
+    return arrMedianSum
+
+
+def median_anomaly(arrImage, arrMedianSum):
+    """Return the (anomaly, anomaly8Bit) int16 arrays of the final image from twice the unrounded median (see
+    stack_median_sum), as arcpy Int(Float(final - median)) and Int(Float(final - median + 100)).
+
+    Both truncate towards zero, so with a median of x.5 and a final image below it anomaly8Bit is not anomaly + 100.
+    NoData is not handled.  Only arithmetic is used, so numpy and xarray arrays can be given.
+    """
+    arrTwice = arrImage.astype(np.int16) * 2 - arrMedianSum.astype(np.int16)
+    return (arrTwice / 2).astype(np.int16), ((arrTwice + 200) / 2).astype(np.int16)
+
+
+def bad_year_ratio(arrBad, arrValid):
+    """Integer percentage of valid seasons that were bad, Int(Float(bad) / Float(valid) * 100) as in arcpy.
+
+    The division is done in 32 bit floating point like the arcpy Float rasters so the truncation matches.
+    Pixels without a valid season are 255.
+    """
+    arrRatio = np.full(arrValid.shape, fgc_common.NODATA_U8, dtype=np.uint8)
+    arrHasData = arrValid > 0
+    arrRatio[arrHasData] = (arrBad[arrHasData].astype(np.float32) / arrValid[arrHasData].astype(np.float32)
+                            * np.float32(100)).astype(np.uint8)
+    return arrRatio
+
+
+def _count_output(arrCount, arrInside):
+    """Counts as uint8 (at most 254) with NoData outside the mask."""
+    arrOut = np.minimum(arrCount, fgc_common.NODATA_U8 - 1).astype(np.uint8)
+    arrOut[~arrInside] = fgc_common.NODATA_U8
+    return arrOut
+
+
+def season_paths(pathOut, strSeason, yearStart, yearEnd, lsThreshold, blnMedian=True, blnAnomaly=True):
+    """Return a dictionary of the output pathways written by fgc05 for one season.
+
+    The keys are "valid", "bad" and "ratio" (the last two are dictionaries keyed by threshold) and, when asked for,
+    "median", "median8Bit", "anomaly" and "anomaly8Bit".  The bad year count only has the threshold in its name
+    when there is more than one threshold, so single threshold runs keep their original names.
+    """
+    strSuffix = strSeason + str(yearStart) + "_to_" + str(yearEnd) + ".tif"
+    dicPaths = {"valid": os.path.join(pathOut, "validpixelcount_" + strSuffix), "bad": {}, "ratio": {}}
+    for intThreshold in lsThreshold:
+        strBadThreshold = "{}pc_".format(intThreshold) if len(lsThreshold) > 1 else ""
+        dicPaths["bad"][intThreshold] = os.path.join(pathOut, "badyearcount_" + strBadThreshold + strSuffix)
+        dicPaths["ratio"][intThreshold] = os.path.join(pathOut, "badyearratio_" + str(intThreshold) + "pc_" + strSuffix)
+    if blnMedian:
+        dicPaths["median"] = os.path.join(pathOut, "median_" + strSuffix)
+        dicPaths["median8Bit"] = os.path.join(pathOut, "median8Bit_" + strSuffix)
+        if blnAnomaly:
+            dicPaths["anomaly"] = os.path.join(pathOut, "anomaly_" + str(yearEnd + 1) + strSuffix)
+            dicPaths["anomaly8Bit"] = os.path.join(pathOut, "Anomaly8Bit_" + str(yearEnd + 1) + strSuffix)
+    return dicPaths
+
+
+class SeasonOutputs(object):
+    """The fgc05 output GeoTIFFs of one season, written one block window at a time.
+
+    The outputs cover the window lsWindow (xoff, yoff, xsize, ysize) of the grid of dsRef.  dicPaths is from
+    season_paths.  If pathAnomalyImage is given (and dicPaths has "anomaly") it is resampled to the grid when needed
+    and compared with the median.
+    """
+
+    def __init__(self, dsRef, lsWindow, dicPaths, lsThreshold, dicClr=None, pathAnomalyImage=""):
+        if dicClr is None:
+            dicClr = {}
+        self.lsWindow = lsWindow
+        self.lsThreshold = list(lsThreshold)
+        self.dicOut = {"valid": fgc_common.create_output(dicPaths["valid"], dsRef, lsWindow, pathClr=dicClr.get("valid", ""))}
+        for intThreshold in self.lsThreshold:
+            self.dicOut[("bad", intThreshold)] = fgc_common.create_output(dicPaths["bad"][intThreshold], dsRef, lsWindow)
+            self.dicOut[("ratio", intThreshold)] = fgc_common.create_output(dicPaths["ratio"][intThreshold], dsRef, lsWindow,
+                                                                           pathClr=dicClr.get("ratio", ""))
+        self.blnMedian = "median" in dicPaths
+        if self.blnMedian:
+            self.dicOut["median"] = fgc_common.create_output(dicPaths["median"], dsRef, lsWindow, gdal.GDT_Int16, NODATA_I16)
+            self.dicOut["median8Bit"] = fgc_common.create_output(dicPaths["median8Bit"], dsRef, lsWindow, pathClr=dicClr.get("median", ""))
+        self.bandImage = None
+        if self.blnMedian and "anomaly" in dicPaths and len(pathAnomalyImage) > 0:
+            self.dsImage = fgc_common.open_tvc(pathAnomalyImage)
+            if (self.dsImage.GetGeoTransform() != dsRef.GetGeoTransform() or self.dsImage.RasterXSize != dsRef.RasterXSize
+                    or self.dsImage.RasterYSize != dsRef.RasterYSize):
+                self.dsImage = fgc_common.open_on_grid(pathAnomalyImage, dsRef.GetGeoTransform(), dsRef.RasterXSize,
+                                                       dsRef.RasterYSize, dsRef.GetProjection())
+            self.bandImage = self.dsImage.GetRasterBand(1)
+            self.dicOut["anomaly"] = fgc_common.create_output(dicPaths["anomaly"], dsRef, lsWindow, gdal.GDT_Int16, NODATA_I16)
+            self.dicOut["anomaly8Bit"] = fgc_common.create_output(dicPaths["anomaly8Bit"], dsRef, lsWindow,
+                                                                 pathClr=dicClr.get("anomaly", ""))
+
+    def _write(self, key, arrOut, intXOff, intYOff):
+        self.dicOut[key].GetRasterBand(1).WriteArray(arrOut, intXOff, intYOff)
+
+    def write(self, intXOff, intYOff, arrInside, arrValid, dicBad, arrMedianSum=None):
+        """Write one block window (offsets relative to lsWindow) from the count of valid seasons, the counts of bad
+        seasons keyed by threshold and twice the unrounded median (see stack_median_sum)."""
+        self._write("valid", _count_output(arrValid, arrInside), intXOff, intYOff)
+        for intThreshold in self.lsThreshold:
+            self._write(("bad", intThreshold), _count_output(dicBad[intThreshold], arrInside), intXOff, intYOff)
+            self._write(("ratio", intThreshold), bad_year_ratio(dicBad[intThreshold], arrValid), intXOff, intYOff)
+        if not self.blnMedian:
+            return
+        arrMedian = (arrMedianSum // 2).astype(np.uint8)
+        arrHasMedian = arrMedian != fgc_common.NODATA_U8
+        self._write("median", np.where(arrHasMedian, arrMedian, NODATA_I16).astype(np.int16), intXOff, intYOff)
+        self._write("median8Bit", arrMedian, intXOff, intYOff)
+        if self.bandImage is not None:
+            intYSize, intXSize = arrMedian.shape
+            arrImage = self.bandImage.ReadAsArray(self.lsWindow[0] + intXOff, self.lsWindow[1] + intYOff, intXSize, intYSize)
+            arrHasAnomaly = arrHasMedian & fgc_common.valid_pixels(arrImage, self.bandImage.GetNoDataValue())
+            arrAnomaly, arrAnomaly8Bit = median_anomaly(arrImage, arrMedianSum)
+            self._write("anomaly", np.where(arrHasAnomaly, arrAnomaly, NODATA_I16).astype(np.int16), intXOff, intYOff)
+            self._write("anomaly8Bit", np.where(arrHasAnomaly, arrAnomaly8Bit, fgc_common.NODATA_U8).astype(np.uint8),
+                        intXOff, intYOff)
+
+    def write_products(self, intXOff, intYOff, dicProducts):
+        """Write one block window of outputs that have already been found (e.g. by fgc_lazy), keyed like dicOut:
+        "valid", ("bad", threshold), ("ratio", threshold), "median", "median8Bit", "anomaly" and "anomaly8Bit"."""
+        for key, arrOut in dicProducts.items():
+            self._write(key, arrOut, intXOff, intYOff)
+
+    def close(self):
+        lsPathOut = [dsOut.GetDescription() for dsOut in self.dicOut.values()]
+        for dsOut in self.dicOut.values():
+            dsOut.FlushCache()
+        self.dicOut = {}
+        self.bandImage = None
+        for pathOut in lsPathOut:
+            fgc_common.finish_output(pathOut)
+
+
+def season_products(dicSeasonRas, lsThreshold, dicSeasonPaths, pathMask="", dicAnomalyImage=None, dicClr=None, cube=None,
+                    lsTile=None):
+    """Write every fgc05 output for several seasons and thresholds in one pass over the TVCpc GeoTIFFs.
+
+    dicSeasonRas holds the list of GeoTIFF pathways of each season and dicSeasonPaths the output pathways of each
+    season (see season_paths).  The median (and the anomaly of dicAnomalyImage[season] from it) is only written for
+    seasons whose paths include "median".  dicClr holds the .clr colour maps keyed by "median", "anomaly", "valid"
+    and "ratio".
+
+    All seasons share the grid of the first GeoTIFF.  Each block window of each GeoTIFF is read once and used for
+    every output of its season: the valid count, the bad count and ratio for every threshold, the median and the
+    anomaly.  Pixels outside the mask are NoData in all outputs.
+
+    If cube (a fgc_cube.SeasonCube) is given the seasons are read from it, on its grid and mask, and pathMask is
+    not used.  If lsTile (xoff, yoff, xsize, ysize) is given only that tile of the extent is written (see
+    fgc_tiles.py).
+    """
+    if dicAnomalyImage is None:
+        dicAnomalyImage = {}
+    lsSeasons = list(dicSeasonRas)
+    lsPathRas = []
+    dicIndex = {}
+    for strSeason in lsSeasons:
+        dicIndex[strSeason] = list(range(len(lsPathRas), len(lsPathRas) + len(dicSeasonRas[strSeason])))
+        lsPathRas += dicSeasonRas[strSeason]
+    stack = cube.stack(lsPathRas) if cube is not None else SeasonStack(lsPathRas, pathMask)
+    if lsTile is not None:
+        stack.clip(lsTile)
+    dicOut = {strSeason: SeasonOutputs(stack.dsRef, stack.window, dicSeasonPaths[strSeason], lsThreshold, dicClr,
+                                       dicAnomalyImage.get(strSeason, "")) for strSeason in lsSeasons}
+
+    #Windows are sized so the stack of the season with the most GeoTIFFs holds about STACK_PIXELS values
+    intMostRas = max(len(lsIndex) for lsIndex in dicIndex.values())
+    for intXOff, intYOff, intXSize, intYSize in stack.windows(max(STACK_PIXELS // intMostRas, MIN_WINDOW_PIXELS)):
+        arrInside = stack.inside(intXOff, intYOff, intXSize, intYSize)
+        for strSeason in lsSeasons:
+            arrStack = stack.read(intXOff, intYOff, intXSize, intYSize, dicIndex[strSeason], arrInside)
+            arrValid = np.count_nonzero(arrStack != fgc_common.NODATA_U8, axis=0)
+            dicBad = {intThreshold: np.count_nonzero(arrStack <= intThreshold, axis=0) for intThreshold in lsThreshold}
+            arrMedianSum = stack_median_sum(arrStack) if dicOut[strSeason].blnMedian else None
+            dicOut[strSeason].write(intXOff, intYOff, arrInside, arrValid, dicBad, arrMedianSum)
+
+    for outputs in dicOut.values():
+        outputs.close()
+    del dicOut, stack
@@ -0,0 +1,188 @@
+"""
+Created For: Department of Primary Industries and Regional Development, Western Australia
+Date: October 2026
+Purpose: A tiled, checkpointed scheduler for the fgc05 GDAL/numpy engine, so that state wide runs do not have to
+         finish in one go on one workstation.
+
+         The analysis extent (the extent of the mask on the grid of the first GeoTIFF, or the grid of a season
+         cube) is split into square tiles of intTileSize pixels.  Each tile is an independent job that writes every
+         fgc05 output for its part of the extent (fgc_temporal.season_products with lsTile) to its own folder, and
+         the tiles are spread across intWorkers processes.  As each tile finishes it is recorded in a checkpoint
+         (checkpoint.json in the tiles folder), so a run that is interrupted, or has a tile that fails, starts
+         again from the tiles that are not yet done.  When every tile is done the tiles of each output are
+         mosaicked into the final GeoTIFF and the tiles folder is removed.
+
+         The checkpoint records the inputs (with their size, modification time and content hash, see
+         fgc_manifest), seasons, thresholds, extent and tile size.  If any of these change the completed tiles are
+         discarded and every tile is run again.
+
+NOTE:
+This module requires the osgeo (GDAL) and numpy packages.  Scripts that call tiled_season_products with
+intWorkers > 1 must do so from inside an if __name__ == "__main__": block.
+
+This script is in development and care should be taken when using.
+
+No guarentees are given and users should do their own validation.
+"""
+#Import necessary packages
+import os
+import shutil
+
+from osgeo import gdal
+
+import fgc_common
+import fgc_cube
+import fgc_instrument
+import fgc_manifest
+import fgc_temporal
+
+#Default width and height of a tile in pixels
+TILE_SIZE = 4096
+#Name of the checkpoint in the tiles folder
+CHECKPOINT = "checkpoint.json"
+
+
+def tile_name(lsTile, intTileSize):
+    """Name of the folder of a tile, e.g. tile_r0002_c0005."""
+    return "tile_r{:04d}_c{:04d}".format(lsTile[1] // intTileSize, lsTile[0] // intTileSize)
+
+
+def analysis_window(pathRasRef, pathMask="", cube=None):
+    """Return the (xoff, yoff, xsize, ysize) extent that fgc_temporal.season_products writes."""
+    if cube is not None:
+        return (0, 0, cube.dicGrid["xsize"], cube.dicGrid["ysize"])
+    dsRef = gdal.Open(pathRasRef)
+    if len(pathMask) > 0:
+        return tuple(fgc_common.GridMask(pathMask, dsRef).window)
+    return (0, 0, dsRef.RasterXSize, dsRef.RasterYSize)
+
+
+def flat_paths(dicPaths):
+    """Return every output pathway in a (nested) dictionary of pathways such as fgc_temporal.season_paths."""
+    lsPaths = []
+    for value in dicPaths.values():
+        lsPaths += flat_paths(value) if isinstance(value, dict) else [value]
+    return lsPaths
+
+
+def tile_paths(dicPaths, pathTile):
+    """The same (nested) dictionary of pathways with every output moved into the folder pathTile."""
+    return {key: tile_paths(value, pathTile) if isinstance(value, dict) else os.path.join(pathTile, os.path.basename(value))
+            for key, value in dicPaths.items()}
+
+
+def run_tile(dicSeasonRas, lsThreshold, dicTilePaths, pathMask, dicAnomalyImage, dicClr, lsTile, pathCube=""):
+    """Write every output of one tile.  Returns the list of output pathways of the tile."""
+    for dicPaths in dicTilePaths.values():
+        for pathDir in set(os.path.dirname(pathTile) for pathTile in flat_paths(dicPaths)):
+            if not os.path.exists(pathDir):
+                os.makedirs(pathDir)
+    cube = fgc_cube.SeasonCube(pathCube) if len(pathCube) > 0 else None
+    #The tiles are only read by mosaic_tiles so they are not made into COGs, only the mosaics are
+    tupOutput = fgc_common.set_output_format(fgc_common.output_format()[0], False)
+    try:
+        fgc_temporal.season_products(dicSeasonRas, lsThreshold, dicTilePaths, pathMask, dicAnomalyImage, dicClr, cube, lsTile)
+    finally:
+        fgc_common.set_output_format(*tupOutput)
+    return [pathTile for dicPaths in dicTilePaths.values() for pathTile in flat_paths(dicPaths)]
+
+
+def mosaic_tiles(pathOut, lsPathTiles, lsTiles):
+    """Mosaic single band tile GeoTIFFs into pathOut.  lsTiles holds the (xoff, yoff, xsize, ysize) of each tile
+    in the mosaic and the first tile must be at (0, 0).  The data type, NoData and colour table of the first tile
+    are used.  The mosaic is finished as a COG if fgc_common.set_output_format asked for COG outputs."""
+    dsFirst = gdal.Open(lsPathTiles[0])
+    bandFirst = dsFirst.GetRasterBand(1)
+    intXSize = max(lsTile[0] + lsTile[2] for lsTile in lsTiles)
+    intYSize = max(lsTile[1] + lsTile[3] for lsTile in lsTiles)
+    dsOut = gdal.GetDriverByName("GTiff").Create(pathOut, intXSize, intYSize, 1, bandFirst.DataType,
+                                                 options=fgc_common.output_options(bandFirst.DataType))
+    dsOut.SetGeoTransform(dsFirst.GetGeoTransform())
+    dsOut.SetProjection(dsFirst.GetProjection())
+    bandOut = dsOut.GetRasterBand(1)
+    if bandFirst.GetNoDataValue() is not None:
+        bandOut.SetNoDataValue(bandFirst.GetNoDataValue())
+    if bandFirst.GetRasterColorTable() is not None:
+        bandOut.SetRasterColorTable(bandFirst.GetRasterColorTable())
+        bandOut.SetRasterColorInterpretation(gdal.GCI_PaletteIndex)
+    for pathTile, lsTile in zip(lsPathTiles, lsTiles):
+        bandTile = gdal.Open(pathTile).GetRasterBand(1)
+        intWidth, intHeight = fgc_common.window_shape(bandTile)
+        for intXOff, intYOff, intXS, intYS in fgc_common.iter_windows(lsTile[2], lsTile[3], intWidth, intHeight):
+            bandOut.WriteArray(bandTile.ReadAsArray(intXOff, intYOff, intXS, intYS), lsTile[0] + intXOff, lsTile[1] + intYOff)
+    dsOut.FlushCache()
+    del bandOut, dsOut, bandFirst, dsFirst
+    fgc_common.finish_output(pathOut)
+
+
+def tiled_season_products(dicSeasonRas, lsThreshold, dicSeasonPaths, pathTiles, pathMask="", dicAnomalyImage=None,
+                          dicClr=None, pathCube="", intTileSize=TILE_SIZE, intWorkers=1, intCacheMB=fgc_common.GDAL_CACHE_MB,
+                          runLog=None):
+    """Write the same outputs as fgc_temporal.season_products one tile at a time, resuming from the checkpoint
+    in pathTiles, then mosaic the tiles into the pathways of dicSeasonPaths.  If runLog (a fgc_instrument.RunLog)
+    is given each tile and the mosaic are recorded in it.
+
+    Returns the number of tiles that were run (0 if every tile was already done).
+    """
+    if dicAnomalyImage is None:
+        dicAnomalyImage = {}
+    if runLog is None:
+        runLog = fgc_instrument.RunLog("", "")
+    if not os.path.exists(pathTiles):
+        os.makedirs(pathTiles)
+    lsPathRas = [pathRas for strSeason in dicSeasonRas for pathRas in dicSeasonRas[strSeason]]
+    cube = fgc_cube.SeasonCube(pathCube) if len(pathCube) > 0 else None
+    lsWindow = analysis_window(lsPathRas[0], pathMask, cube)
+    lsTiles = list(fgc_common.iter_windows(lsWindow[2], lsWindow[3], intTileSize, intTileSize))
+    lsNames = [tile_name(lsTile, intTileSize) for lsTile in lsTiles]
+
+    #The checkpoint is only used if it was written for the same inputs and settings
+    pathCheckpoint = os.path.join(pathTiles, CHECKPOINT)
+    dicCheckpoint = fgc_manifest.load_manifest(pathCheckpoint)
+    dicOldInputs = dicCheckpoint.get("inputs", {})
+    lsInputs = lsPathRas + [pathImage for pathImage in dicAnomalyImage.values() if len(pathImage) > 0]
+    if len(pathMask) > 0 and cube is None:
+        lsInputs.append(pathMask)
+    if cube is not None:
+        lsInputs.append(os.path.join(pathCube, fgc_cube.CUBE_INDEX))
+    dicInputs = {pathInput: fgc_manifest.file_signature(pathInput, dicOldInputs.get(pathInput)) for pathInput in lsInputs}
+    dicParams = {"seasons": {strSeason: [os.path.basename(pathRas) for pathRas in lsRas] for strSeason, lsRas in dicSeasonRas.items()},
+                 "thresholds": list(lsThreshold), "window": list(lsWindow), "tile": intTileSize,
+                 "outputs": sorted(os.path.basename(pathOut) for dicPaths in dicSeasonPaths.values() for pathOut in flat_paths(dicPaths)),
+                 "hashes": {pathInput: dicInputs[pathInput]["sha256"] for pathInput in lsInputs}}
+    dicDone = dicCheckpoint.get("done", {})
+    if len(dicDone) > 0 and dicCheckpoint.get("params") != dicParams:
+        print("The inputs or settings have changed since the tiles in {} were written so every tile will be run again".format(pathTiles))
+        dicDone = {}
+    dicCheckpoint = {"params": dicParams, "inputs": dicInputs, "done": dicDone}
+    fgc_manifest.save_manifest(pathCheckpoint, dicCheckpoint)
+
+    lsJobs = []
+    lsRun = []
+    for intIndex, (lsTile, strName) in enumerate(zip(lsTiles, lsNames)):
+        dicTilePaths = {strSeason: tile_paths(dicPaths, os.path.join(pathTiles, strName)) for strSeason, dicPaths in dicSeasonPaths.items()}
+        lsPathTile = [pathTile for dicPaths in dicTilePaths.values() for pathTile in flat_paths(dicPaths)]
+        if strName in dicDone and all(os.path.exists(pathTile) for pathTile in lsPathTile):
+            continue
+        lsJobs.append((dicSeasonRas, lsThreshold, dicTilePaths, pathMask, dicAnomalyImage, dicClr, lsTile, pathCube))
+        lsRun.append(strName)
+    print("{} of {} tiles to run ({} already done)".format(len(lsJobs), len(lsTiles), len(lsTiles) - len(lsJobs)))
+
+    def record_tile(intIndex, lsPathTile):
+        #The checkpoint is saved as soon as each tile finishes so an interruption loses at most the running tiles
+        dicCheckpoint["done"][lsRun[intIndex]] = [os.path.basename(pathTile) for pathTile in lsPathTile]
+        fgc_manifest.save_manifest(pathCheckpoint, dicCheckpoint)
+
+    fgc_common.run_parallel(run_tile, lsJobs, intWorkers, intCacheMB, lsLabels=lsRun, funcDone=record_tile, runLog=runLog,
+                            strStage="tile")
+
+    #Every tile is done so the outputs can be mosaicked
+    for dicPaths in dicSeasonPaths.values():
+        for pathOut in flat_paths(dicPaths):
+            with runLog.stage("mosaic", os.path.basename(pathOut)):
+                mosaic_tiles(pathOut, [os.path.join(pathTiles, strName, os.path.basename(pathOut)) for strName in lsNames], lsTiles)
+            print("Mosaicked", len(lsTiles), "tiles to", pathOut)
+    for strName in lsNames:
+        shutil.rmtree(os.path.join(pathTiles, strName), ignore_errors=True)
+    os.remove(pathCheckpoint)
+    return len(lsJobs)
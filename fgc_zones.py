@@ -0,0 +1,330 @@
+"""
+Created For: Department of Primary Industries and Regional Development, Western Australia
+Date: October 2026
+Purpose: GDAL/numpy engine for fgc04 (TVC Threshold by Zone).  It replaces the arcpy PolygonToRaster_conversion,
+         Reclassify and TabulateArea steps.
+
+         The polygons are rasterised once to a zone grid that is snapped to the TVC rasters (zone ids 1..n, 0 = no
+         zone) with a lookup of zone id to the value of the nominated field.  Each TVC raster is then read one block
+         window at a time together with the zone grid and the pixels of every zone and TVC value (0 to 100) are
+         counted in one step from the keys zone * 102 + value.  Only the keys present in a block window are
+         counted (numpy.unique), so the work of a window does not grow with the number of zones.
+         The per zone histograms are saved, so any set of threshold classes is found by summing histogram bins
+         (through a 256 entry lookup table) without reading the rasters again.  The class counts are converted to
+         the same VALUE_n, total_area, ImageDate and a<lo>_<hi>ha columns written by the arcpy process.
+
+         tabulate_season does all of this for one TVC raster so that seasons can be run in a pool of processes
+         (fgc_common.run_parallel).  Each season's table is written straight to its own partition of a Parquet
+         store, pathStore/ImageDate=<date>/part.parquet, which can be read back as one table with pandas.read_parquet.
+
+         The zone grid is cached (see cached_zones) in a compressed GeoTIFF holding the zone ids (band 1) and the
+         mask resampled to the zone grid (band 2), with the zone id to field value lookup in a .json file beside it.
+         The cache is keyed by the content of the polygon and mask files, the field name and the snapped grid, so
+         later runs against the same zones reuse it rather than rasterising the polygons again.
+
+         The TVC rasters can also be read from an aligned season cube (fgc_cube.py) when the zone grid is aligned
+         with it, which saves decompressing and resampling each GeoTIFF.
+
+NOTE:
+Polygons are rasterised using the polygon that covers the centre of each cell, rather than the "MAXIMUM_AREA"
+cell assignment used by arcpy, so areas along polygon boundaries can differ slightly.
+
+This module requires the osgeo (GDAL), numpy and pandas packages.  Writing the Parquet store also needs pyarrow.
+
+This script is in development and care should be taken when using.
+
+No guarentees are given and users should do their own validation.
+"""
+#Import necessary packages
+import hashlib
+import json
+import os
+
+import numpy as np
+import pandas
+from osgeo import gdal
+from osgeo import ogr
+
+import fgc_common
+import fgc_cube
+import fgc_manifest
+
+#NoData value of the zone grid (cells that are not inside any polygon)
+ZONE_NODATA = 0
+#Number of TVC values (0 to 100) in a zone histogram
+HIST_BINS = 101
+
+
+def threshold_classes(lsTVCThreshold):
+    """Build the [lower, upper, class] remap table used by fgc04 from a list of class breaks.
+
+    The first class always starts at 0 and the last always ends at 100, e.g. [50,70] gives
+    [[0,50,1], [50,70,2], [70,100,3]].
+    """
+    lsBreaks = [0] + list(lsTVCThreshold) + [100]
+    return [[lsBreaks[i], lsBreaks[i + 1], i + 1] for i in range(len(lsBreaks) - 1)]
+
+
+def class_lookup(ls2):
+    """Return a 256 entry uint8 lookup table of TVC value to class number (0 = not in any class).
+
+    As with the arcpy RemapRange a value equal to a class break belongs to the lower class, so [50,70] gives the
+    classes 0-50, 51-70 and 71-100.
+    """
+    arrLut = np.zeros(256, dtype=np.uint8)
+    for intLower, intUpper, intClass in reversed(ls2):
+        arrLut[intLower:intUpper + 1] = intClass
+    return arrLut
+
+
+def zone_grid(pathPoly, pathTVCRef):
+    """Return the (geotransform, xsize, ysize, wkt) of the grid snapped to pathTVCRef covering the polygons."""
+    dsRef = gdal.Open(pathTVCRef)
+    strWkt = dsRef.GetProjection()
+    lsGeoTransform, intXSize, intYSize = fgc_common.snap_bounds_to_grid(dsRef.GetGeoTransform(),
+                                                                        fgc_common.dataset_bounds(pathPoly, strWkt))
+    return lsGeoTransform, intXSize, intYSize, strWkt
+
+
+def rasterise_zones(pathPoly, strFieldName, pathTVCRef, pathZones, pathMask=""):
+    """Rasterise the polygons of pathPoly to a zone grid GeoTIFF (pathZones) snapped to the grid of pathTVCRef.
+
+    The extent of the zone grid is the extent of the polygons (like arcpy.env.extent = pathPoly).  Each distinct
+    value of strFieldName is given a zone id from 1 in sorted order.  If pathMask is given it is resampled to the
+    zone grid and stored as band 2 (1 = inside the mask).  Returns a list of the field values where position i
+    holds the value of zone id i (position 0 is None).
+    """
+    lsGeoTransform, intXSize, intYSize, strWkt = zone_grid(pathPoly, pathTVCRef)
+    dsPoly = gdal.OpenEx(pathPoly, gdal.OF_VECTOR)
+    layer = dsPoly.GetLayer(0)
+    lsValues = sorted(set(feature.GetField(strFieldName) for feature in layer if feature.GetField(strFieldName) is not None))
+    dicZoneIds = {value: intId + 1 for intId, value in enumerate(lsValues)}
+
+    #Copy the polygons to an in memory layer with an integer zone id to burn in
+    dsMem = ogr.GetDriverByName("Memory").CreateDataSource("")
+    layerMem = dsMem.CreateLayer("zones", srs=layer.GetSpatialRef(), geom_type=ogr.wkbMultiPolygon)
+    layerMem.CreateField(ogr.FieldDefn("zone_id", ogr.OFTInteger))
+    layer.ResetReading()
+    for feature in layer:
+        value = feature.GetField(strFieldName)
+        if value is None or feature.GetGeometryRef() is None:
+            continue
+        featureMem = ogr.Feature(layerMem.GetLayerDefn())
+        featureMem.SetGeometry(feature.GetGeometryRef())
+        featureMem.SetField("zone_id", dicZoneIds[value])
+        layerMem.CreateFeature(featureMem)
+
+    intDataType = gdal.GDT_UInt16 if len(lsValues) < 65535 else gdal.GDT_UInt32
+    intBands = 2 if len(pathMask) > 0 else 1
+    dsZones = gdal.GetDriverByName("GTiff").Create(pathZones, intXSize, intYSize, intBands, intDataType,
+                                                   options=fgc_common.GTIFF_OPTIONS + ["PREDICTOR=2", "INTERLEAVE=BAND"])
+    dsZones.SetGeoTransform(lsGeoTransform)
+    dsZones.SetProjection(strWkt)
+    dsZones.GetRasterBand(1).SetNoDataValue(ZONE_NODATA)
+    gdal.RasterizeLayer(dsZones, [1], layerMem, options=["ATTRIBUTE=zone_id"])
+    if len(pathMask) > 0:
+        mask = fgc_common.GridMask(pathMask, dsZones)
+        bandMask = dsZones.GetRasterBand(2)
+        intWidth, intHeight = fgc_common.window_shape(dsZones.GetRasterBand(1))
+        for intXOff, intYOff, intXS, intYS in fgc_common.iter_windows(intXSize, intYSize, intWidth, intHeight):
+            bandMask.WriteArray(mask.read(intXOff, intYOff, intXS, intYS).astype(np.uint8), intXOff, intYOff)
+        del bandMask, mask
+    dsZones.FlushCache()
+    del dsZones, dsMem, dsPoly
+    return [None] + lsValues
+
+
+def _data_files(pathData):
+    """The files that make up a data set, e.g. the .shp, .shx, .dbf and .prj of a shapefile."""
+    strDir, strName = os.path.split(os.path.abspath(pathData))
+    strStem = os.path.splitext(strName)[0].lower()
+    return sorted(os.path.join(strDir, strFile) for strFile in os.listdir(strDir)
+                  if os.path.splitext(strFile)[0].lower() == strStem and os.path.isfile(os.path.join(strDir, strFile)))
+
+
+def zone_cache_key(pathPoly, strFieldName, pathTVCRef, pathMask):
+    """Return a hex key that changes whenever the polygon or mask content, field name or snapped grid changes."""
+    lsGeoTransform, intXSize, intYSize, strWkt = zone_grid(pathPoly, pathTVCRef)
+    dicKey = {"poly": [[os.path.basename(pathFile), fgc_manifest.file_hash(pathFile)] for pathFile in _data_files(pathPoly)],
+              "field": strFieldName,
+              "grid": [list(lsGeoTransform), intXSize, intYSize, strWkt],
+              "mask": [[os.path.basename(pathFile), fgc_manifest.file_hash(pathFile)] for pathFile in _data_files(pathMask)]
+                      if len(pathMask) > 0 else None}
+    return hashlib.sha256(json.dumps(dicKey, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def cached_zones(pathPoly, strFieldName, pathTVCRef, pathMask, pathCache):
+    """Return (pathZones, lsZoneNames) for the polygons, rasterising them only if they are not already cached.
+
+    The zone grid is stored as pathCache/zones_<key>.tif and the zone id lookup as pathCache/zones_<key>.json.
+    """
+    if not os.path.exists(pathCache):
+        os.makedirs(pathCache)
+    strKey = zone_cache_key(pathPoly, strFieldName, pathTVCRef, pathMask)[:20]
+    pathZones = os.path.join(pathCache, "zones_" + strKey + ".tif")
+    pathLookup = os.path.join(pathCache, "zones_" + strKey + ".json")
+    if os.path.exists(pathZones) and os.path.exists(pathLookup):
+        print("Using the cached zone grid", pathZones)
+        with open(pathLookup, "r") as fin:
+            return pathZones, json.load(fin)["zones"]
+    #Write under temporary names so an interrupted run never leaves a partial cache entry
+    pathTemp = os.path.join(pathCache, "zones_" + strKey + "_tmp.tif")
+    lsZoneNames = rasterise_zones(pathPoly, strFieldName, pathTVCRef, pathTemp, pathMask)
+    os.replace(pathTemp, pathZones)
+    with open(pathLookup + ".tmp", "w") as fout:
+        json.dump({"poly": pathPoly, "field": strFieldName, "mask": pathMask, "zones": lsZoneNames}, fout)
+    os.replace(pathLookup + ".tmp", pathLookup)
+    return pathZones, lsZoneNames
+
+
+def zone_histogram(pathTVC, pathZones, intZones, pathMask="", ls2=None, pathThreshold="", pathClr="", pathCube=""):
+    """Count the pixels of every zone at every TVC value (0 to 100) for one TVC raster.
+
+    The TVC raster is resampled to the zone grid and read together with the zone grid and mask one block window
+    at a time.  The mask is band 2 of the zone grid when it has one, otherwise pathMask (if given).  If pathThreshold
+    is given the raster classified with the remap table ls2 is written to it in the same pass, coloured with pathClr.
+    If pathCube is given the season is read from that aligned season cube (see fgc_cube.py) rather than the GeoTIFF.
+    Returns an int64 array of shape (intZones + 1, 101) where [zone, value] is a pixel count (row 0 is pixels
+    outside any zone).  NoData, masked pixels and values above 100 are not counted.
+    """
+    dsZones = gdal.Open(pathZones)
+    bandZones = dsZones.GetRasterBand(1)
+    lsGeoTransform = dsZones.GetGeoTransform()
+    intXSize, intYSize = dsZones.RasterXSize, dsZones.RasterYSize
+    if len(pathCube) > 0:
+        cube = fgc_cube.SeasonCube(pathCube)
+        intCubeIndex = cube.index(pathTVC)
+        bandTVC = None
+    else:
+        bandTVC = fgc_common.open_on_grid(pathTVC, lsGeoTransform, intXSize, intYSize, dsZones.GetProjection()).GetRasterBand(1)
+    bandMask = dsZones.GetRasterBand(2) if dsZones.RasterCount > 1 else None
+    mask = fgc_common.GridMask(pathMask, dsZones) if bandMask is None and len(pathMask) > 0 else None
+
+    #Values above 100 (including NoData) and masked pixels go to an extra bin that is dropped at the end,
+    #which is cheaper than selecting the valid pixels of every block
+    intBins = HIST_BINS + 1
+    arrBin = np.minimum(np.arange(256), HIST_BINS).astype(np.int64)
+    arrCounts = np.zeros((intZones + 1) * intBins, dtype=np.int64)
+    if len(pathThreshold) > 0:
+        arrLut = class_lookup(ls2)
+        dsThreshold = fgc_common.create_output(pathThreshold, dsZones, (0, 0, intXSize, intYSize), pathClr=pathClr)
+        bandThreshold = dsThreshold.GetRasterBand(1)
+    else:
+        dsThreshold = bandThreshold = None
+
+    intWidth, intHeight = fgc_common.window_shape(bandZones)
+    for intXOff, intYOff, intXS, intYS in fgc_common.iter_windows(intXSize, intYSize, intWidth, intHeight):
+        if bandTVC is None:
+            arrValue = arrBin[cube.read_on_grid(intCubeIndex, lsGeoTransform, intXOff, intYOff, intXS, intYS)]
+        else:
+            arrValue = arrBin[bandTVC.ReadAsArray(intXOff, intYOff, intXS, intYS)]
+        if bandMask is not None:
+            arrValue[bandMask.ReadAsArray(intXOff, intYOff, intXS, intYS) == 0] = HIST_BINS
+        elif mask is not None:
+            arrValue[~mask.read(intXOff, intYOff, intXS, intYS)] = HIST_BINS
+        if bandThreshold is not None:
+            #The lookup gives class 0 for the extra bin (101) so NoData and masked pixels are NoData
+            arrClass = arrLut[arrValue]
+            bandThreshold.WriteArray(np.where(arrClass > 0, arrClass, fgc_common.NODATA_U8).astype(np.uint8), intXOff, intYOff)
+        arrZone = bandZones.ReadAsArray(intXOff, intYOff, intXS, intYS).astype(np.int64)
+        #Only the keys in the window are counted, rather than a bincount the length of every zone and value
+        arrKeys, arrKeyCounts = np.unique((arrZone * intBins + arrValue).ravel(), return_counts=True)
+        arrCounts[arrKeys] += arrKeyCounts
+
+    if dsThreshold is not None:
+        dsThreshold.FlushCache()
+    del bandThreshold, dsThreshold, bandTVC, bandMask, bandZones, dsZones
+    if len(pathThreshold) > 0:
+        fgc_common.finish_output(pathThreshold)
+    return arrCounts.reshape(intZones + 1, intBins)[:, :HIST_BINS]
+
+
+def cached_zone_histogram(pathTVC, pathZones, intZones, pathCache, ls2=None, pathThreshold="", pathClr="", pathCube=""):
+    """Return the zone_histogram of a TVC raster, reading the raster only when it is needed.
+
+    Histograms are kept in pathCache as hist_<zone grid>_<image>.npz with the size, modification time and content
+    hash of the TVC raster.  The saved histogram is reused when the raster is unchanged and no threshold raster
+    (pathThreshold) has to be written, so new class breaks can be tabulated without reading any rasters.
+    """
+    strZoneStem = os.path.splitext(os.path.basename(pathZones))[0]
+    strImageStem = os.path.splitext(os.path.basename(pathTVC))[0]
+    pathHist = os.path.join(pathCache, "hist_" + strZoneStem + "_" + strImageStem + ".npz")
+    dicPrevious = None
+    if os.path.exists(pathHist):
+        with np.load(pathHist) as npzHist:
+            dicPrevious = json.loads(str(npzHist["meta"]))
+            arrHist = npzHist["hist"]
+    dicSignature = fgc_manifest.file_signature(pathTVC, dicPrevious)
+    blnCurrent = dicPrevious is not None and dicPrevious["sha256"] == dicSignature["sha256"] and dicPrevious["size"] == dicSignature["size"]
+    if blnCurrent and len(pathThreshold) == 0:
+        if dicPrevious["mtime"] != dicSignature["mtime"]:
+            _save_histogram(pathHist, arrHist, dicSignature)
+        return arrHist
+    arrHist = zone_histogram(pathTVC, pathZones, intZones, ls2=ls2, pathThreshold=pathThreshold, pathClr=pathClr, pathCube=pathCube)
+    _save_histogram(pathHist, arrHist, dicSignature)
+    return arrHist
+
+
+def _save_histogram(pathHist, arrHist, dicSignature):
+    pathTemp = pathHist[:-4] + "_tmp.npz"
+    np.savez_compressed(pathTemp, hist=arrHist, meta=np.array(json.dumps(dicSignature)))
+    os.replace(pathTemp, pathHist)
+
+
+def histogram_classes(arrHist, ls2):
+    """Sum the 0 to 100 value bins of zone histograms into the threshold classes of the remap table ls2.
+
+    Returns an int64 array of shape (zones + 1, number of classes + 1) where [zone, class] is a pixel count.
+    """
+    arrLut = class_lookup(ls2)[:HIST_BINS]
+    arrOneHot = np.zeros((HIST_BINS, len(ls2) + 1), dtype=np.int64)
+    arrOneHot[np.arange(HIST_BINS), arrLut] = 1
+    return arrHist.astype(np.int64) @ arrOneHot
+
+
+def zone_table(arrCounts, lsZoneNames, ls2, strFieldName, strImageDate, valCellArea):
+    """Convert the zone by class pixel counts of histogram_classes to the fgc04 table.
+
+    Columns are strFieldName, VALUE_1..VALUE_n (square metres), total_area, ImageDate and a<lo>_<hi>ha (hectares).
+    Only zones that have pixels in at least one class are included.
+    """
+    arrArea = arrCounts[1:, 1:].astype(np.float64) * valCellArea
+    arrKeep = arrCounts[1:, 1:].sum(axis=1) > 0
+    dicColumns = {strFieldName: lsZoneNames[1:]}
+    for intLower, intUpper, intClass in ls2:
+        dicColumns["VALUE_" + str(intClass)] = arrArea[:, intClass - 1]
+    dfTable = pandas.DataFrame(dicColumns)
+    dfTable["total_area"] = arrArea.sum(axis=1)
+    dfTable["ImageDate"] = strImageDate
+    for intLower, intUpper, intClass in ls2:
+        dfTable["a{}_{}ha".format(intLower, intUpper)] = arrArea[:, intClass - 1] / 10000
+    return dfTable[arrKeep].reset_index(drop=True)
+
+
+def write_partition(dfTable, pathStore, strImageDate):
+    """Write one season's table to its ImageDate partition of a Parquet store (replacing any earlier partition).
+
+    The ImageDate column is held by the partition folder name, as is usual for partitioned Parquet data sets.
+    """
+    pathPartition = os.path.join(pathStore, "ImageDate=" + strImageDate)
+    if not os.path.exists(pathPartition):
+        os.makedirs(pathPartition)
+    pathPart = os.path.join(pathPartition, "part.parquet")
+    dfTable.drop(columns="ImageDate").to_parquet(pathPart + ".tmp", index=False)
+    os.replace(pathPart + ".tmp", pathPart)
+    return pathPart
+
+
+def tabulate_season(pathTVC, pathZones, lsZoneNames, ls2, strFieldName, valCellArea, pathCache,
+                    pathThreshold="", pathClr="", pathStore="", pathCube=""):
+    """Tabulate the area of each threshold class in each zone for one TVC raster and return the table.
+
+    If pathStore is given the table is also written to the season's partition of the Parquet store.  If pathCube
+    is given the TVC raster is read from that aligned season cube.
+    """
+    strImageDate = fgc_common.tvc_name(pathTVC)[:-9][5:-1]
+    arrHist = cached_zone_histogram(pathTVC, pathZones, len(lsZoneNames) - 1, pathCache, ls2, pathThreshold, pathClr, pathCube)
+    dfTable = zone_table(histogram_classes(arrHist, ls2), lsZoneNames, ls2, strFieldName, strImageDate, valCellArea)
+    if len(pathStore) > 0:
+        write_partition(dfTable, pathStore, strImageDate)
+    return dfTable